@@ -0,0 +1,112 @@
+-- 001_partitioned_holdings.sql
+--
+-- Migrates a database created with the original schema.sql to the partitioned layout:
+--   * "Quarterly_Holdings" becomes a table range-partitioned by report_date (one partition
+--     per year), with its primary key widened to (id, report_date) and the single-column
+--     indexes replaced by a covering (report_date, cusip) index. Existing rows and ids are
+--     kept, and the id sequence carries on where it was.
+--   * "Insider_Transactions" gets BRIN indexes on its date columns in place of the B-tree
+--     on transaction_date, and its key moves from accession_no alone, which allowed one
+--     transaction per Form 4, to (accession_no, transaction_no). Existing rows were each
+--     their filing's first transaction and get transaction_no 0; reload the filings to
+--     add the others.
+--   * The "Latest_Holdings" materialized view is created.
+--
+-- Runs in a single transaction holding an exclusive lock on "Quarterly_Holdings"; the
+-- copy takes roughly as long as a full table rewrite. Usage:
+--   psql "$DSN" -v ON_ERROR_STOP=1 -f migrations/001_partitioned_holdings.sql
+
+BEGIN;
+
+LOCK TABLE "Quarterly_Holdings" IN ACCESS EXCLUSIVE MODE;
+
+-- Move the old table and its constraint names out of the way.
+ALTER TABLE "Quarterly_Holdings" RENAME TO "Quarterly_Holdings_unpartitioned";
+ALTER TABLE "Quarterly_Holdings_unpartitioned" RENAME CONSTRAINT "Quarterly_Holdings_pkey" TO "Quarterly_Holdings_unpartitioned_pkey";
+ALTER TABLE "Quarterly_Holdings_unpartitioned" RENAME CONSTRAINT uq_holding TO uq_holding_unpartitioned;
+DROP INDEX IF EXISTS idx_quarterly_holdings_fund_cik;
+DROP INDEX IF EXISTS idx_quarterly_holdings_report_date;
+DROP INDEX IF EXISTS idx_quarterly_holdings_cusip;
+
+-- Same columns as before. The keys are added after the copy, which is faster than
+-- maintaining them row by row.
+CREATE TABLE "Quarterly_Holdings" (
+    "id" BIGINT NOT NULL DEFAULT nextval('"Quarterly_Holdings_id_seq"'),
+    "fund_cik" VARCHAR(10) NOT NULL REFERENCES "Funds"("cik") ON DELETE CASCADE,
+    "report_date" DATE NOT NULL,
+    "filing_date" TIMESTAMP WITH TIME ZONE NOT NULL,
+    "cusip" VARCHAR(9) NOT NULL,
+    "company_name" VARCHAR(255) NOT NULL,
+    "shares" BIGINT NOT NULL CHECK ("shares" >= 0),
+    "value_usd" BIGINT NOT NULL CHECK ("value_usd" >= 0),
+    "raw_json" JSONB NOT NULL
+) PARTITION BY RANGE ("report_date");
+
+CREATE OR REPLACE FUNCTION create_holdings_partitions(first_year INT, last_year INT) RETURNS VOID AS $$
+BEGIN
+    FOR year IN first_year..last_year LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF "Quarterly_Holdings" FOR VALUES FROM (%L) TO (%L)',
+            'Quarterly_Holdings_' || year, make_date(year, 1, 1), make_date(year + 1, 1, 1));
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_holdings_partitions(1993, 2040);
+CREATE TABLE "Quarterly_Holdings_default" PARTITION OF "Quarterly_Holdings" DEFAULT;
+
+INSERT INTO "Quarterly_Holdings" ("id", "fund_cik", "report_date", "filing_date", "cusip", "company_name",
+                                  "shares", "value_usd", "raw_json")
+SELECT "id", "fund_cik", "report_date", "filing_date", "cusip", "company_name", "shares", "value_usd", "raw_json"
+FROM "Quarterly_Holdings_unpartitioned";
+
+ALTER TABLE "Quarterly_Holdings" ADD PRIMARY KEY ("id", "report_date");
+ALTER TABLE "Quarterly_Holdings" ADD CONSTRAINT uq_holding UNIQUE ("fund_cik", "report_date", "cusip");
+CREATE INDEX idx_quarterly_holdings_date_cusip ON "Quarterly_Holdings" ("report_date", "cusip")
+    INCLUDE ("fund_cik", "shares", "value_usd");
+CREATE INDEX idx_quarterly_holdings_cusip ON "Quarterly_Holdings" ("cusip");
+
+-- The sequence belonged to the old id column; keep it (and the ids handed out so far).
+ALTER SEQUENCE "Quarterly_Holdings_id_seq" OWNED BY "Quarterly_Holdings"."id";
+DROP TABLE "Quarterly_Holdings_unpartitioned";
+
+COMMENT ON TABLE "Quarterly_Holdings" IS 'Stores asset holdings data from quarterly 13F filings for the tracked funds. Partitioned by year of report_date.';
+COMMENT ON COLUMN "Quarterly_Holdings"."id" IS 'Identifier for the holding record; the primary key is (id, report_date).';
+COMMENT ON COLUMN "Quarterly_Holdings"."fund_cik" IS 'Foreign key referencing the CIK of the fund in the Funds table.';
+COMMENT ON COLUMN "Quarterly_Holdings"."report_date" IS 'The end-of-quarter date for which the holdings are reported. Partition key.';
+COMMENT ON COLUMN "Quarterly_Holdings"."filing_date" IS 'The timestamp when the 13F form was filed.';
+COMMENT ON COLUMN "Quarterly_Holdings"."cusip" IS 'The CUSIP identifier of the reported security.';
+COMMENT ON COLUMN "Quarterly_Holdings"."shares" IS 'The number of shares held.';
+COMMENT ON COLUMN "Quarterly_Holdings"."value_usd" IS 'The total market value of the position in US dollars.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_json" IS 'Stores the original, complete JSON API response for archival and reprocessing.';
+
+-- Insider_Transactions: a key that allows several transactions per filing.
+ALTER TABLE "Insider_Transactions" ADD COLUMN "transaction_no" INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE "Insider_Transactions" ALTER COLUMN "transaction_no" DROP DEFAULT;
+ALTER TABLE "Insider_Transactions" DROP CONSTRAINT "Insider_Transactions_accession_no_key";
+ALTER TABLE "Insider_Transactions" ADD CONSTRAINT uq_insider_transaction UNIQUE ("accession_no", "transaction_no");
+COMMENT ON COLUMN "Insider_Transactions"."accession_no" IS 'The accession number of the filing; with transaction_no, the natural key.';
+COMMENT ON COLUMN "Insider_Transactions"."transaction_no" IS 'Position of the transaction within its filing, counting from 0.';
+
+-- Insider_Transactions: BRIN indexes for the date columns.
+DROP INDEX IF EXISTS idx_insider_transactions_transaction_date;
+CREATE INDEX idx_insider_transactions_transaction_date ON "Insider_Transactions" USING BRIN ("transaction_date");
+CREATE INDEX IF NOT EXISTS idx_insider_transactions_filing_date ON "Insider_Transactions" USING BRIN ("filing_date");
+
+CREATE MATERIALIZED VIEW "Latest_Holdings" AS
+SELECT h."fund_cik", h."report_date", h."filing_date", h."cusip", h."company_name", h."shares", h."value_usd"
+FROM "Funds" f
+CROSS JOIN LATERAL (
+    SELECT max(q."report_date") AS "report_date" FROM "Quarterly_Holdings" q WHERE q."fund_cik" = f."cik"
+) latest
+JOIN "Quarterly_Holdings" h ON h."fund_cik" = f."cik" AND h."report_date" = latest."report_date";
+
+COMMENT ON MATERIALIZED VIEW "Latest_Holdings" IS 'Each tracked fund''s holdings from its most recent 13F report.';
+
+CREATE UNIQUE INDEX uq_latest_holdings ON "Latest_Holdings" ("fund_cik", "cusip");
+CREATE INDEX idx_latest_holdings_cusip ON "Latest_Holdings" ("cusip") INCLUDE ("fund_cik", "shares", "value_usd");
+
+COMMIT;
+
+ANALYZE "Quarterly_Holdings";
+ANALYZE "Insider_Transactions";
@@ -0,0 +1,41 @@
+-- 002_raw_store_refs.sql
+--
+-- Moves the per-row raw_json copies out of the database, for databases created before
+-- the raw document store: "Quarterly_Holdings" and "Insider_Transactions" get the
+-- raw_sha256 / raw_offset(s) / raw_parser_version references that the loader now writes,
+-- and raw_json becomes nullable so new rows no longer carry it.
+--
+-- Existing raw_json values are kept; they can't be mapped to store entries without the
+-- original filings. Re-run the parser over the filings with --raw-store DIR --load-db to
+-- fill in the references (the loader's merge updates the existing rows), then reclaim the
+-- space with:
+--   ALTER TABLE "Quarterly_Holdings" DROP COLUMN "raw_json";
+--   ALTER TABLE "Insider_Transactions" DROP COLUMN "raw_json";
+--   VACUUM FULL "Quarterly_Holdings", "Insider_Transactions";
+-- Usage:
+--   psql "$DSN" -v ON_ERROR_STOP=1 -f migrations/002_raw_store_refs.sql
+
+BEGIN;
+
+ALTER TABLE "Quarterly_Holdings"
+    ALTER COLUMN "raw_json" DROP NOT NULL,
+    ADD COLUMN "raw_sha256" CHAR(64),
+    ADD COLUMN "raw_offsets" INTEGER[],
+    ADD COLUMN "raw_parser_version" SMALLINT;
+
+ALTER TABLE "Insider_Transactions"
+    ALTER COLUMN "raw_json" DROP NOT NULL,
+    ADD COLUMN "raw_sha256" CHAR(64),
+    ADD COLUMN "raw_offset" INTEGER,
+    ADD COLUMN "raw_parser_version" SMALLINT;
+
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_json" IS 'Deprecated: superseded by raw_sha256/raw_offsets; drop once the references are filled in.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_sha256" IS 'sha256 of the original filing, kept once (zstd-compressed) in the raw document store for archival and reprocessing.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_offsets" IS 'Offsets of the information table lines summed into this holding, among the records parsed from the raw filing.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_parser_version" IS 'parsers.PARSER_VERSION when raw_offsets were taken; RawStore.record() refuses offsets from another version.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_json" IS 'Deprecated: superseded by raw_sha256/raw_offset; drop once the references are filled in.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_sha256" IS 'sha256 of the original filing, kept once (zstd-compressed) in the raw document store for archival and reprocessing.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_offset" IS 'Offset of this transaction among the records parsed from the raw filing.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_parser_version" IS 'parsers.PARSER_VERSION when raw_offset was taken; RawStore.record() refuses offsets from another version.';
+
+COMMIT;
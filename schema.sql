@@ -3,10 +3,14 @@
 -- This script defines the complete database schema for the Dual-Signal 'Smart Money' Tracker project.
 -- It creates the necessary tables, columns, constraints, and indexes to store data on
 -- curated funds, their quarterly holdings (from 13F filings), and insider transactions (from Form 4 filings).
--- The schema is designed for PostgreSQL and leverages its advanced features like JSONB and MVCC.
+-- The schema is designed for PostgreSQL and leverages its advanced features like partitioning and MVCC.
+-- Original filings are not stored in the database: each is kept once, compressed, in a content-addressed
+-- raw document store (sec_parser/raw_store.py), and rows reference it by hash and record offset.
 
 -- Drop existing tables in reverse order of dependency to avoid foreign key conflicts
 -- This allows the script to be re-run on an existing database for a clean setup.
+DROP TABLE IF EXISTS "Ingest_Checkpoints";
+DROP MATERIALIZED VIEW IF EXISTS "Latest_Holdings";
 DROP TABLE IF EXISTS "Insider_Transactions";
 DROP TABLE IF EXISTS "Quarterly_Holdings";
 DROP TABLE IF EXISTS "Funds";
@@ -34,8 +38,12 @@ COMMENT ON COLUMN "Funds"."strategy" IS 'Primary investment strategy archetype(s
 -- ================================================================================= --
 -- Stores the holdings data extracted from the quarterly 13F filings of the tracked funds.
 -- Each row represents a specific asset held by a fund at the end of a quarter.
+-- The table is range-partitioned by report_date, one partition per calendar year, so a
+-- query for a quarter only touches that year's partition and old years can be detached
+-- or archived whole. Partitioned tables require every unique key (including the primary
+-- key) to contain report_date.
 CREATE TABLE "Quarterly_Holdings" (
-    "id" BIGSERIAL PRIMARY KEY, -- Unique identifier for each holding record.
+    "id" BIGSERIAL, -- Unique identifier for each holding record (together with report_date).
     "fund_cik" VARCHAR(10) NOT NULL REFERENCES "Funds"("cik") ON DELETE CASCADE, -- Foreign key linking to the fund.
     "report_date" DATE NOT NULL, -- The "as of" date for the holding report (end of the quarter).
     "filing_date" TIMESTAMP WITH TIME ZONE NOT NULL, -- The date the 13F form was filed with the SEC.
@@ -43,29 +51,76 @@ CREATE TABLE "Quarterly_Holdings" (
     "company_name" VARCHAR(255) NOT NULL, -- The name of the company whose stock is held.
     "shares" BIGINT NOT NULL CHECK ("shares" >= 0), -- The number of shares held.
     "value_usd" BIGINT NOT NULL CHECK ("value_usd" >= 0), -- The total market value of the shares held, in USD.
-    "raw_json" JSONB NOT NULL, -- The complete, original JSON response from the API for this holding.
+    "raw_sha256" CHAR(64), -- Content hash of the original filing in the raw document store.
+    "raw_offsets" INTEGER[], -- Positions of the holding's lines among the filing's parsed records.
+    "raw_parser_version" SMALLINT, -- Parser version the raw_offsets were produced by.
 
+    PRIMARY KEY ("id", "report_date"),
     -- A fund cannot report the same security twice for the same reporting period.
+    -- Its index also serves "holdings of fund F on date D" and "latest report of fund F".
     CONSTRAINT uq_holding UNIQUE ("fund_cik", "report_date", "cusip")
-);
+) PARTITION BY RANGE ("report_date");
 
 -- Add comments to the table and columns.
-COMMENT ON TABLE "Quarterly_Holdings" IS 'Stores asset holdings data from quarterly 13F filings for the tracked funds.';
-COMMENT ON COLUMN "Quarterly_Holdings"."id" IS 'Unique identifier for the holding record.';
+COMMENT ON TABLE "Quarterly_Holdings" IS 'Stores asset holdings data from quarterly 13F filings for the tracked funds. Partitioned by year of report_date.';
+COMMENT ON COLUMN "Quarterly_Holdings"."id" IS 'Identifier for the holding record; the primary key is (id, report_date).';
 COMMENT ON COLUMN "Quarterly_Holdings"."fund_cik" IS 'Foreign key referencing the CIK of the fund in the Funds table.';
-COMMENT ON COLUMN "Quarterly_Holdings"."report_date" IS 'The end-of-quarter date for which the holdings are reported.';
+COMMENT ON COLUMN "Quarterly_Holdings"."report_date" IS 'The end-of-quarter date for which the holdings are reported. Partition key.';
 COMMENT ON COLUMN "Quarterly_Holdings"."filing_date" IS 'The timestamp when the 13F form was filed.';
 COMMENT ON COLUMN "Quarterly_Holdings"."cusip" IS 'The CUSIP identifier of the reported security.';
 COMMENT ON COLUMN "Quarterly_Holdings"."shares" IS 'The number of shares held.';
 COMMENT ON COLUMN "Quarterly_Holdings"."value_usd" IS 'The total market value of the position in US dollars.';
-COMMENT ON COLUMN "Quarterly_Holdings"."raw_json" IS 'Stores the original, complete JSON API response for archival and reprocessing.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_sha256" IS 'sha256 of the original filing, kept once (zstd-compressed) in the raw document store for archival and reprocessing.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_offsets" IS 'Offsets of the information table lines summed into this holding, among the records parsed from the raw filing.';
+COMMENT ON COLUMN "Quarterly_Holdings"."raw_parser_version" IS 'parsers.PARSER_VERSION when raw_offsets were taken; RawStore.record() refuses offsets from another version.';
+
+-- Creates the yearly partitions of Quarterly_Holdings for first_year..last_year that
+-- don't exist yet, e.g. SELECT create_holdings_partitions(2041, 2045);
+CREATE OR REPLACE FUNCTION create_holdings_partitions(first_year INT, last_year INT) RETURNS VOID AS $$
+BEGIN
+    FOR year IN first_year..last_year LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF "Quarterly_Holdings" FOR VALUES FROM (%L) TO (%L)',
+            'Quarterly_Holdings_' || year, make_date(year, 1, 1), make_date(year + 1, 1, 1));
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
 
--- Create indexes to optimize query performance for common lookup patterns.
-CREATE INDEX idx_quarterly_holdings_fund_cik ON "Quarterly_Holdings" ("fund_cik");
-CREATE INDEX idx_quarterly_holdings_report_date ON "Quarterly_Holdings" ("report_date");
+-- EDGAR's electronic filings start in 1993. Dates outside the yearly partitions land in
+-- the default partition; move them out before creating a partition covering them.
+SELECT create_holdings_partitions(1993, 2040);
+CREATE TABLE "Quarterly_Holdings_default" PARTITION OF "Quarterly_Holdings" DEFAULT;
+
+-- Indexes matching the watchlist queries (created on every partition).
+-- "Which funds hold CUSIP X this quarter" is answered from this index alone (an index-only scan).
+CREATE INDEX idx_quarterly_holdings_date_cusip ON "Quarterly_Holdings" ("report_date", "cusip")
+    INCLUDE ("fund_cik", "shares", "value_usd");
+-- A CUSIP's history across quarters.
 CREATE INDEX idx_quarterly_holdings_cusip ON "Quarterly_Holdings" ("cusip");
 
 
+-- ================================================================================= --
+-- MATERIALIZED VIEW: Latest_Holdings
+-- ================================================================================= --
+-- Each fund's holdings as of its most recent report, the snapshot the watchlist is built
+-- from. The latest report date of each fund is found through uq_holding's index instead of
+-- scanning the history. Refresh after loading new 13F filings with
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY "Latest_Holdings" (which needs the unique index
+-- below and doesn't block readers).
+CREATE MATERIALIZED VIEW "Latest_Holdings" AS
+SELECT h."fund_cik", h."report_date", h."filing_date", h."cusip", h."company_name", h."shares", h."value_usd"
+FROM "Funds" f
+CROSS JOIN LATERAL (
+    SELECT max(q."report_date") AS "report_date" FROM "Quarterly_Holdings" q WHERE q."fund_cik" = f."cik"
+) latest
+JOIN "Quarterly_Holdings" h ON h."fund_cik" = f."cik" AND h."report_date" = latest."report_date";
+
+COMMENT ON MATERIALIZED VIEW "Latest_Holdings" IS 'Each tracked fund''s holdings from its most recent 13F report.';
+
+CREATE UNIQUE INDEX uq_latest_holdings ON "Latest_Holdings" ("fund_cik", "cusip");
+CREATE INDEX idx_latest_holdings_cusip ON "Latest_Holdings" ("cusip") INCLUDE ("fund_cik", "shares", "value_usd");
+
+
 -- ================================================================================= --
 -- TABLE: Insider_Transactions
 -- ================================================================================= --
@@ -73,7 +128,8 @@ CREATE INDEX idx_quarterly_holdings_cusip ON "Quarterly_Holdings" ("cusip");
 -- This table captures the "trigger" events for the dual-signal strategy.
 CREATE TABLE "Insider_Transactions" (
     "id" BIGSERIAL PRIMARY KEY, -- Unique identifier for each transaction record.
-    "accession_no" VARCHAR(255) NOT NULL UNIQUE, -- The unique accession number of the SEC filing. A reliable unique key.
+    "accession_no" VARCHAR(255) NOT NULL, -- The accession number of the SEC filing.
+    "transaction_no" INTEGER NOT NULL, -- Position of the transaction within the filing; one Form 4 can report several.
     "issuer_cik" VARCHAR(10) NOT NULL, -- The CIK of the company whose shares were transacted.
     "issuer_ticker" VARCHAR(10), -- The stock ticker of the issuer.
     "insider_cik" VARCHAR(10), -- The CIK of the insider (reporting person).
@@ -85,12 +141,16 @@ CREATE TABLE "Insider_Transactions" (
     "shares" BIGINT NOT NULL, -- The number of shares transacted. Can be negative for dispositions.
     "price_per_share" NUMERIC(18, 4), -- The price per share of the transaction.
     "shares_owned_after" BIGINT CHECK ("shares_owned_after" >= 0), -- Total shares owned by the insider after the transaction.
-    "raw_json" JSONB NOT NULL -- The complete, original JSON response from the API for this filing.
+    "raw_sha256" CHAR(64), -- Content hash of the original filing in the raw document store.
+    "raw_offset" INTEGER, -- Position of the transaction among the filing's parsed records.
+    "raw_parser_version" SMALLINT, -- Parser version the raw_offset was produced by.
+    CONSTRAINT uq_insider_transaction UNIQUE ("accession_no", "transaction_no") -- A filing's transactions, each once.
 );
 
 -- Add comments to the table and columns.
 COMMENT ON TABLE "Insider_Transactions" IS 'Stores insider transaction data from SEC Form 4 filings.';
-COMMENT ON COLUMN "Insider_Transactions"."accession_no" IS 'The unique accession number of the filing, acting as a natural key.';
+COMMENT ON COLUMN "Insider_Transactions"."accession_no" IS 'The accession number of the filing; with transaction_no, the natural key.';
+COMMENT ON COLUMN "Insider_Transactions"."transaction_no" IS 'Position of the transaction within its filing, counting from 0.';
 COMMENT ON COLUMN "Insider_Transactions"."issuer_cik" IS 'The CIK of the company (the issuer).';
 COMMENT ON COLUMN "Insider_Transactions"."issuer_ticker" IS 'The stock ticker of the company.';
 COMMENT ON COLUMN "Insider_Transactions"."insider_name" IS 'The name of the corporate insider who made the transaction.';
@@ -99,11 +159,32 @@ COMMENT ON COLUMN "Insider_Transactions"."filing_date" IS 'The timestamp when th
 COMMENT ON COLUMN "Insider_Transactions"."transaction_date" IS 'The date on which the transaction occurred.';
 COMMENT ON COLUMN "Insider_Transactions"."transaction_code" IS 'SEC code for the transaction type (P=Purchase, S=Sale).';
 COMMENT ON COLUMN "Insider_Transactions"."shares_owned_after" IS 'Number of shares beneficially owned after the transaction.';
-COMMENT ON COLUMN "Insider_Transactions"."raw_json" IS 'Stores the original, complete JSON API response for archival and reprocessing.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_sha256" IS 'sha256 of the original filing, kept once (zstd-compressed) in the raw document store for archival and reprocessing.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_offset" IS 'Offset of this transaction among the records parsed from the raw filing.';
+COMMENT ON COLUMN "Insider_Transactions"."raw_parser_version" IS 'parsers.PARSER_VERSION when raw_offset was taken; RawStore.record() refuses offsets from another version.';
 
 -- Create indexes to optimize queries for finding triggers, which are often based on the
 -- issuer, transaction date, and transaction code.
 CREATE INDEX idx_insider_transactions_issuer_cik ON "Insider_Transactions" ("issuer_cik");
 CREATE INDEX idx_insider_transactions_issuer_ticker ON "Insider_Transactions" ("issuer_ticker");
-CREATE INDEX idx_insider_transactions_transaction_date ON "Insider_Transactions" ("transaction_date");
 CREATE INDEX idx_insider_transactions_transaction_code ON "Insider_Transactions" ("transaction_code");
+-- Rows arrive roughly in date order, so the date columns are well correlated with the
+-- physical order and small BRIN indexes (a few pages, against a B-tree's one entry per
+-- row) are enough for date-range scans.
+CREATE INDEX idx_insider_transactions_transaction_date ON "Insider_Transactions" USING BRIN ("transaction_date");
+CREATE INDEX idx_insider_transactions_filing_date ON "Insider_Transactions" USING BRIN ("filing_date");
+
+
+-- ================================================================================= --
+-- TABLE: Ingest_Checkpoints
+-- ================================================================================= --
+-- The filings whose rows a pipelined ingest run (sec_parser.main --pipeline) has committed.
+-- A filing's checkpoint is written in the same transaction as its holdings or transactions,
+-- so an interrupted run resumes by skipping exactly the filings listed here.
+CREATE TABLE "Ingest_Checkpoints" (
+    "accession_no" VARCHAR(255) PRIMARY KEY, -- The accession number of the committed filing.
+    "path" TEXT, -- The filing's path relative to the ingest root.
+    "committed_at" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now() -- When its rows were committed.
+);
+
+COMMENT ON TABLE "Ingest_Checkpoints" IS 'Filings committed by pipelined ingest runs, for resuming an interrupted run.';
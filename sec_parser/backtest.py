@@ -0,0 +1,357 @@
+import argparse
+import bisect
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from . import store
+from .triggers import EXECUTIVE_ROLES, PURCHASE_CODE
+from .utils import share_positions
+from .watchlist import SIGNIFICANT_INCREASE_PCT, MIN_CLUSTER_FUNDS
+from .xref import CrossReference
+
+# --- CONFIGURATION ---
+# A fund's new position or increase stays "fresh" for this long after the 13F is filed.
+SIGNAL_MAX_AGE_DAYS = 180
+# Forward return horizons (calendar days after the Form 4 became public).
+RETURN_HORIZONS_DAYS = (30, 90)
+
+DEFAULT_GRID = {
+    'increase_pct': [SIGNIFICANT_INCREASE_PCT, 50.0, 100.0],
+    'cluster_size': [2, 3],
+    'buy_window_days': [14, 30],
+    'role_filter': ['executive', 'any'],
+}
+# Role filters: which single purchases count as a trigger without a cluster.
+ROLE_FILTERS = ('executive', 'any', 'none')
+
+def _strip_cik(values: pd.Series) -> pd.Series:
+    return values.astype('string').str.strip().str.lstrip('0')
+
+def _timestamps(values: pd.Series) -> pd.Series:
+    """Datetimes at one resolution, as merge_asof requires matching key dtypes."""
+    return pd.to_datetime(values).astype('datetime64[ns]')
+
+def _issuer_map(cusip_map: Union[pd.DataFrame, CrossReference]) -> pd.DataFrame:
+    """cusip -> issuer_cik, from a CrossReference or a DataFrame with those columns."""
+    if isinstance(cusip_map, CrossReference):
+        cusip_map = cusip_map.to_frame().rename(columns={'cik': 'issuer_cik'})
+    mapping = cusip_map[['cusip', 'issuer_cik']].astype({'cusip': 'string'})
+    mapping = mapping.assign(issuer_cik=_strip_cik(mapping['issuer_cik']))
+    mapping = mapping[(mapping['cusip'] != '') & (mapping['issuer_cik'] != '')]
+    return mapping.dropna().drop_duplicates('cusip')
+
+def _filing_links(filings: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each filing of `filings` (in filing order): the filing it's compared
+    with, i.e. the latest one for the fund's previous quarter as known when it
+    was filed (-1 if none); and when it stopped being the fund's current 13F
+    (NaT while it still is; -1 / NaT too for a filing that never was, e.g. a
+    late amendment of an older quarter).
+    """
+    base = np.full(len(filings), -1, dtype=np.int64)
+    current_from = np.full(len(filings), np.datetime64('NaT'), dtype='datetime64[ns]')
+    current_until = np.full(len(filings), np.datetime64('NaT'), dtype='datetime64[ns]')
+    quarters: Dict[str, List[np.datetime64]] = {}
+    latest: Dict[Tuple[str, np.datetime64], int] = {}
+    current: Dict[str, int] = {}
+    report_dates = filings['report_date'].to_numpy()
+    filing_dates = filings['filing_date'].to_numpy()
+    for i, fund in enumerate(filings['fund_cik'].tolist()):
+        report_date = report_dates[i]
+        known = quarters.setdefault(fund, [])
+        position = bisect.bisect_left(known, report_date)
+        if position:
+            base[i] = latest[fund, known[position - 1]]
+        if position == len(known) or known[position] != report_date:
+            known.insert(position, report_date)
+        # A later filing for the same quarter (an amendment) replaces the earlier one.
+        latest[fund, report_date] = i
+        previous = current.get(fund)
+        if previous is None or report_date >= report_dates[previous]:
+            if previous is not None:
+                current_until[previous] = filing_dates[i]
+            current[fund] = i
+            current_from[i] = filing_dates[i]
+    return base, np.stack([current_from, current_until])
+
+def holdings_events(holdings: pd.DataFrame, cusip_map) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Turns normalize_13f_data() holdings into two point-in-time streams keyed by
+    `visible_at`, the 13F's filing_date (never report_date, which would leak a
+    quarter-end position before anyone could see it):
+
+    - signals: a fund's new position or share increase in an issuer, with
+      pct_change (inf for new positions);
+    - holders: the number of tracked funds holding each issuer, as of each time
+      it changes.
+
+    Every filing is its own event, compared with the fund's previous quarter
+    as known when it was filed. An amendment (13F-HR/A) is a new filing,
+    visible from its own filing_date, whose positions replace the earlier
+    filing's for that quarter from then on; its shares are never added to
+    the original's. Option and principal-amount lines are left out (see
+    utils.share_positions()).
+    """
+    mapping = _issuer_map(cusip_map)
+    holdings = holdings[share_positions(holdings)]
+    accession_nos = holdings['accession_no'] if 'accession_no' in holdings else pd.Series(None, index=holdings.index)
+    h = pd.DataFrame({
+        'fund_cik': holdings['fund_cik'].astype('string'),
+        'report_date': _timestamps(holdings['report_date']),
+        'filing_date': _timestamps(holdings['filing_date']),
+        'accession_no': accession_nos.astype('string').fillna(''),
+        'cusip': holdings['cusip'].astype('string'),
+        'shares': holdings['shares'],
+    }).dropna(subset=['fund_cik', 'report_date', 'filing_date'])
+
+    filing_keys = ['fund_cik', 'report_date', 'filing_date', 'accession_no']
+    filings = h[filing_keys].drop_duplicates().sort_values(['filing_date', 'accession_no'], ignore_index=True)
+    base, (current_from, current_until) = _filing_links(filings)
+    filings = filings.assign(filing_id=np.arange(len(filings)), base_id=base,
+                             current_from=current_from, current_until=current_until)
+
+    positions = (h.merge(mapping, on='cusip', how='inner').merge(filings, on=filing_keys)
+                 .groupby(['filing_id', 'issuer_cik'], as_index=False)['shares'].sum(min_count=1))
+    positions = positions[positions['shares'].fillna(0) > 0].merge(
+        filings[['filing_id', 'fund_cik', 'filing_date', 'base_id', 'current_from', 'current_until']], on='filing_id')
+
+    previous = positions[['filing_id', 'issuer_cik', 'shares']].rename(
+        columns={'filing_id': 'base_id', 'shares': 'previous_shares'})
+    changes = positions[positions['base_id'] >= 0].merge(previous, on=['base_id', 'issuer_cik'], how='left')
+    before = changes['previous_shares'].astype('Float64')
+    pct_change = ((changes['shares'].astype('Float64') - before) / before * 100).fillna(np.inf)
+    changes = changes.assign(pct_change=pct_change.astype(float), visible_at=changes['filing_date'])
+    signals = changes[changes['pct_change'] > 0][['issuer_cik', 'visible_at', 'fund_cik', 'pct_change']]
+
+    # Each held position counts while its filing is the fund's current 13F.
+    deltas = pd.concat([
+        pd.DataFrame({'issuer_cik': positions['issuer_cik'], 'visible_at': positions['current_from'], 'delta': 1}),
+        pd.DataFrame({'issuer_cik': positions['issuer_cik'], 'visible_at': positions['current_until'], 'delta': -1}),
+    ]).dropna(subset=['visible_at'])
+    holders = deltas.groupby(['issuer_cik', 'visible_at'], as_index=False)['delta'].sum()
+    holders['funds_holding'] = holders.groupby('issuer_cik')['delta'].cumsum()
+    return (signals.sort_values('visible_at', ignore_index=True),
+            holders[['issuer_cik', 'visible_at', 'funds_holding']].sort_values('visible_at', ignore_index=True))
+
+def _strongest_signals(stream: pd.DataFrame, signals: pd.DataFrame, max_age_days: int) -> np.ndarray:
+    """
+    For each purchase in `stream`, the largest pct_change among its issuer's
+    signals visible in the `max_age_days` up to and including its filing_date
+    (NaN if there are none).
+
+    Two as-of joins find the first and last such signal in an array sorted by
+    issuer and time, and one np.maximum.reduceat takes the max of each range.
+    """
+    result = np.full(len(stream), np.nan)
+    if signals.empty or stream.empty:
+        return result
+    signals = signals.sort_values(['issuer_cik', 'visible_at'], ignore_index=True)
+    signals = signals.assign(position=np.arange(len(signals))).sort_values('visible_at', kind='stable')
+    keys = signals[['issuer_cik', 'visible_at', 'position']]
+    purchases = pd.DataFrame({'issuer_cik': stream['issuer_cik'], 'filing_date': stream['filing_date'],
+                              'window_start': stream['filing_date'] - pd.Timedelta(days=max_age_days),
+                              'row': np.arange(len(stream))})
+    last = pd.merge_asof(purchases.sort_values('filing_date'), keys, left_on='filing_date', right_on='visible_at',
+                         by='issuer_cik').set_index('row')['position'].reindex(purchases['row'])
+    first = pd.merge_asof(purchases.sort_values('window_start'), keys, left_on='window_start', right_on='visible_at',
+                          by='issuer_cik', direction='forward').set_index('row')['position'].reindex(purchases['row'])
+    first, last = first.to_numpy(float), last.to_numpy(float)
+    found = ~np.isnan(first) & ~np.isnan(last) & (first <= last)
+    values = np.append(signals.sort_values('position')['pct_change'].to_numpy(float), 0.0)
+    bounds = np.column_stack([np.where(found, first, 0), np.where(found, last + 1, 1)]).astype(np.int64).ravel()
+    result[found] = np.maximum.reduceat(values, bounds)[::2][found]
+    return result
+
+def build_event_stream(holdings: pd.DataFrame, transactions: pd.DataFrame, cusip_map,
+                       prices: Optional[pd.DataFrame] = None,
+                       signal_max_age_days: int = SIGNAL_MAX_AGE_DAYS) -> pd.DataFrame:
+    """
+    Replays holdings and insider transactions in filing-time order and returns
+    one row per open-market purchase with everything the signal rules need, as
+    known when the Form 4 was filed: the strongest fresh 13F signal for the
+    issuer (signal_pct), how many tracked funds held it (funds_holding), and
+    whether the buyer is an executive. Built with as-of joins, once, and then
+    shared by every parameter set in run_grid().
+
+    `prices` (optional) has columns date, close and issuer_cik or ticker; with
+    it the stream also carries forward returns per RETURN_HORIZONS_DAYS.
+    """
+    signals, holders = holdings_events(holdings, cusip_map)
+
+    buys = transactions[transactions['transaction_code'].astype('string') == PURCHASE_CODE]
+    stream = pd.DataFrame({
+        'issuer_cik': _strip_cik(buys['issuer_cik']),
+        'issuer_ticker': buys['issuer_ticker'].astype('string').str.strip().str.upper(),
+        'insider': buys['insider_cik'].astype('string').fillna(buys['insider_name'].astype('string')),
+        'is_executive': buys['insider_relation'].astype('string').str.contains(EXECUTIVE_ROLES).fillna(False),
+        'accession_no': buys['accession_no'].astype('string'),
+        'filing_date': _timestamps(buys['filing_date']),
+        'transaction_date': _timestamps(buys['transaction_date']),
+        'shares': buys['shares'],
+        'price_per_share': buys['price_per_share'],
+    }).dropna(subset=['issuer_cik', 'filing_date']).sort_values('filing_date', ignore_index=True)
+
+    stream['signal_pct'] = _strongest_signals(stream, signals, signal_max_age_days)
+    stream = pd.merge_asof(stream, holders.drop(columns='visible_at').assign(holders_at=holders['visible_at']),
+                           left_on='filing_date', right_on='holders_at', by='issuer_cik')
+    stream['signal_pct'] = stream['signal_pct'].fillna(0.0)
+    stream['funds_holding'] = stream['funds_holding'].fillna(0).astype('int64')
+    stream = stream.drop(columns=['holders_at'])
+
+    if prices is not None:
+        stream = _attach_returns(stream, prices)
+    return stream
+
+def _attach_returns(stream: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+    """Entry is the first close after the filing date (the Form 4 may be filed after the close)."""
+    key = 'issuer_cik' if 'issuer_cik' in prices else 'issuer_ticker'
+    prices = prices.rename(columns={'ticker': 'issuer_ticker'})
+    prices = prices.assign(date=_timestamps(prices['date']))
+    if key == 'issuer_cik':
+        prices['issuer_cik'] = _strip_cik(prices['issuer_cik'])
+    else:
+        prices['issuer_ticker'] = prices['issuer_ticker'].astype('string').str.upper()
+    prices = prices[[key, 'date', 'close']].dropna().sort_values('date')
+
+    stream['row'] = np.arange(len(stream))
+    sides = stream.dropna(subset=[key])[['row', key, 'filing_date']]
+    entry = pd.merge_asof(sides.sort_values('filing_date'), prices, left_on='filing_date', right_on='date',
+                          by=key, direction='forward', allow_exact_matches=False)
+    closes = {'entry_close': entry.set_index('row')['close']}
+    for days in RETURN_HORIZONS_DAYS:
+        exit_at = sides.assign(exit_at=sides['filing_date'] + pd.Timedelta(days=days)).sort_values('exit_at')
+        exit_prices = pd.merge_asof(exit_at, prices, left_on='exit_at', right_on='date', by=key, direction='forward')
+        closes[f'exit_close_{days}d'] = exit_prices.set_index('row')['close']
+    entry_close = closes['entry_close'].reindex(stream['row']).to_numpy()
+    for days in RETURN_HORIZONS_DAYS:
+        exit_close = closes[f'exit_close_{days}d'].reindex(stream['row']).to_numpy()
+        stream[f'return_{days}d'] = exit_close / entry_close - 1
+    return stream.drop(columns='row')
+
+def cluster_sizes(stream: pd.DataFrame, window_days: int) -> np.ndarray:
+    """
+    For each purchase, the number of distinct insiders who bought the same
+    issuer in the `window_days` up to and including its filing date.
+    """
+    sizes = np.zeros(len(stream), dtype=np.int64)
+    window = np.timedelta64(window_days, 'D')
+    for _, rows in stream.groupby('issuer_cik', sort=False).indices.items():
+        dates = stream['filing_date'].to_numpy()[rows]
+        insiders = stream['insider'].to_numpy()[rows]
+        counts: Dict[Any, int] = {}
+        start = 0
+        # Rows are in filing-date order (build_event_stream sorts the stream).
+        for end in range(len(rows)):
+            while dates[start] < dates[end] - window:
+                counts[insiders[start]] -= 1
+                if not counts[insiders[start]]:
+                    del counts[insiders[start]]
+                start += 1
+            counts[insiders[end]] = counts.get(insiders[end], 0) + 1
+            sizes[rows[end]] = len(counts)
+    return sizes
+
+def evaluate(stream: pd.DataFrame, params: Dict[str, Any], min_funds: int = MIN_CLUSTER_FUNDS,
+             _cluster_cache: Optional[Dict[int, np.ndarray]] = None) -> Dict[str, Any]:
+    """Applies one parameter set to the event stream and summarizes the dual signals it fires."""
+    role_filter = params['role_filter']
+    if role_filter not in ROLE_FILTERS:
+        raise ValueError(f"role_filter must be one of {ROLE_FILTERS}, not {role_filter!r}")
+    window = params['buy_window_days']
+    if _cluster_cache is not None and window in _cluster_cache:
+        clusters = _cluster_cache[window]
+    else:
+        clusters = cluster_sizes(stream, window)
+        if _cluster_cache is not None:
+            _cluster_cache[window] = clusters
+
+    on_watchlist = (stream['signal_pct'].to_numpy() >= params['increase_pct']) | \
+                   (stream['funds_holding'].to_numpy() >= min_funds)
+    if role_filter == 'executive':
+        role_ok = stream['is_executive'].to_numpy(bool)
+    else:
+        role_ok = np.full(len(stream), role_filter == 'any')
+    fired = on_watchlist & (role_ok | (clusters >= params['cluster_size']))
+    # One signal per issuer per day, however many Form 4s fired it.
+    signals = stream[fired].drop_duplicates(['issuer_cik', 'filing_date'])
+
+    result = dict(params, signals=len(signals), issuers=signals['issuer_cik'].nunique())
+    for days in RETURN_HORIZONS_DAYS:
+        column = f'return_{days}d'
+        if column in signals:
+            returns = signals[column].dropna()
+            result[f'mean_{column}'] = float(returns.mean()) if len(returns) else np.nan
+            result[f'hit_rate_{days}d'] = float((returns > 0).mean()) if len(returns) else np.nan
+    return result
+
+def param_grid(**axes: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Every combination of the given parameter values, e.g. param_grid(**DEFAULT_GRID)."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+# The event stream is sent to each worker once, through the pool initializer.
+_worker_stream: Optional[pd.DataFrame] = None
+_worker_clusters: Dict[int, np.ndarray] = {}
+
+def _init_worker(stream: pd.DataFrame):
+    global _worker_stream
+    _worker_stream = stream
+    _worker_clusters.clear()
+
+def _evaluate_in_worker(params: Dict[str, Any]) -> Dict[str, Any]:
+    return evaluate(_worker_stream, params, _cluster_cache=_worker_clusters)
+
+def run_grid(stream: pd.DataFrame, grid: List[Dict[str, Any]], workers: int = 1) -> pd.DataFrame:
+    """Evaluates every parameter set, serially or over a process pool. Rows follow `grid` order."""
+    if workers <= 1 or len(grid) <= 1:
+        cache: Dict[int, np.ndarray] = {}
+        return pd.DataFrame([evaluate(stream, params, _cluster_cache=cache) for params in grid])
+    # Grouping by window lets each worker reuse its cluster sizes.
+    order = sorted(range(len(grid)), key=lambda i: grid[i]['buy_window_days'])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stream,)) as executor:
+        results = list(executor.map(_evaluate_in_worker, [grid[i] for i in order],
+                                    chunksize=max(1, len(grid) // (workers * 4))))
+    ordered: List[Optional[Dict[str, Any]]] = [None] * len(grid)
+    for i, result in zip(order, results):
+        ordered[i] = result
+    return pd.DataFrame(ordered)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Point-in-time backtest of the dual-signal strategy.")
+    parser.add_argument('--store', required=True, metavar='DIR', help="Parquet store written by main.py --store")
+    parser.add_argument('--xref', required=True, metavar='DIR', help="Cross-reference index (see xref.py)")
+    parser.add_argument('--prices', metavar='CSV', help="Daily closes: date, close and issuer_cik or ticker")
+    parser.add_argument('--start', help="First filing date to replay")
+    parser.add_argument('--end', help="Last filing date to replay")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--out', metavar='CSV', help="Write the grid results to CSV")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    start_time = time.perf_counter()
+    holdings = store.read_holdings(args.store, columns=['fund_cik', 'report_date', 'filing_date', 'cusip', 'shares',
+                                                        'share_type', 'put_call', 'accession_no'])
+    transactions = store.read_transactions(args.store, start=args.start, end=args.end)
+    prices = pd.read_csv(args.prices, dtype={'issuer_cik': str}) if args.prices else None
+    stream = build_event_stream(holdings, transactions, CrossReference.load(args.xref), prices)
+    print(f"Replayed {len(holdings)} holdings and {len(stream)} insider purchases "
+          f"in {time.perf_counter() - start_time:.2f}s.")
+
+    grid = param_grid(**DEFAULT_GRID)
+    start_time = time.perf_counter()
+    results = run_grid(stream, grid, workers=args.workers)
+    print(f"Evaluated {len(grid)} parameter sets in {time.perf_counter() - start_time:.2f}s "
+          f"({args.workers} worker(s)).")
+    print(results.to_string(index=False))
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+try:
+    import resource  # Not available on Windows.
+except ImportError:
+    resource = None
+
+from .main import _parse_file
+from .parsers import looks_like_xml
+from .sgml import is_submission
+
+# --- CONFIGURATION ---
+DEFAULT_CORPUS = Path(__file__).parent / 'sampled_filings'
+DEFAULT_REPEAT = 3
+# Percent change beyond which compare mode reports a regression.
+DEFAULT_THRESHOLD_PCT = 10.0
+# Latency percentiles must also move by this many milliseconds, and come from at
+# least MIN_SAMPLES timings in both runs, to count: sub-millisecond stages and
+# the tail of small groups move by more than the threshold between two runs of
+# the same code.
+DEFAULT_MIN_DELTA_MS = 1.0
+MIN_SAMPLES = 30
+PERCENTILES = (50, 95, 99)
+# The stages main._parse_file times, plus the whole call.
+STAGES = ('read', 'detect', 'parse', 'metadata', 'normalize', 'total')
+
+def collect_files(root: Path) -> List[Path]:
+    return sorted(p for p in root.rglob('*') if p.suffix.lower() in ('.xml', '.txt'))
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, or None where `resource` is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def bench_file(file_path: Path) -> Dict[str, Any]:
+    """
+    Runs one filing through main._parse_file, as process_file does on a cache
+    miss, and returns its stage timings. The 13F label says which parser path
+    handled it ('xml', 'text', or 'sgml' for submissions split into documents).
+    """
+    start = time.perf_counter()
+    result = _parse_file(file_path, Path(file_path.name))
+    timings = dict(result['timings'], total=time.perf_counter() - start)
+
+    label = result['filing_type'] or 'unknown'
+    if label == '13F-HR':
+        data = file_path.read_bytes()
+        label += '/sgml' if is_submission(data) else '/xml' if looks_like_xml(data) else '/text'
+    rows = sum(len(result[kind]) for kind in ('holdings', 'transactions') if result[kind] is not None)
+    return {'type': label, 'bytes': result['bytes'], 'rows': rows, 'timings': timings}
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.percentile(np.array(samples) * 1000, PERCENTILES)
+    return {f'p{p}_ms': round(float(v), 4) for p, v in zip(PERCENTILES, values)}
+
+def run(corpus: Path, repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """
+    Benchmarks every filing in `corpus`, `repeat` times after one warm-up
+    pass, and summarizes throughput, per-type latency percentiles and peak RSS.
+    """
+    files = collect_files(corpus)
+    if not files:
+        raise ValueError(f"No .xml or .txt filings found under {corpus}")
+    for file_path in files:
+        bench_file(file_path)
+
+    samples: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        samples.extend(bench_file(file_path) for file_path in files)
+    elapsed = time.perf_counter() - start
+
+    total_bytes = sum(sample['bytes'] for sample in samples)
+    by_type: Dict[str, Dict[str, Any]] = {}
+    for label in sorted({sample['type'] for sample in samples}):
+        group = [sample for sample in samples if sample['type'] == label]
+        stats = {'files': len(group) // repeat, 'samples': len(group),
+                 'rows': sum(s['rows'] for s in group) // repeat}
+        for stage in STAGES:
+            timings = [s['timings'][stage] for s in group if stage in s['timings']]
+            if timings:
+                stats[stage] = _percentiles(timings)
+        by_type[label] = stats
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': str(corpus),
+        'repeat': repeat,
+        'files': len(files),
+        'bytes': total_bytes // repeat,
+        'seconds': round(elapsed, 4),
+        'files_per_sec': round(len(samples) / elapsed, 2),
+        'mb_per_sec': round(total_bytes / (1024 * 1024) / elapsed, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'by_type': by_type,
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: float = DEFAULT_THRESHOLD_PCT,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[str]:
+    """
+    Returns a description of every metric that got worse than the baseline by
+    more than `threshold_pct` percent: lower throughput, higher peak RSS, or
+    higher latency percentiles (per type and stage). A percentile only counts
+    if it also rose by more than `min_delta_ms` and both runs timed the type at
+    least MIN_SAMPLES times.
+    """
+    regressions = []
+
+    def check(name: str, old: Optional[float], new: Optional[float], higher_is_better: bool,
+              min_delta: float = 0.0):
+        if not old or new is None:
+            return
+        change = (new - old) / old * 100
+        if (-change if higher_is_better else change) > threshold_pct and abs(new - old) > min_delta:
+            regressions.append(f"{name}: {old:g} -> {new:g} ({change:+.1f}%)")
+
+    check('files_per_sec', baseline.get('files_per_sec'), current.get('files_per_sec'), True)
+    check('mb_per_sec', baseline.get('mb_per_sec'), current.get('mb_per_sec'), True)
+    check('peak_rss_mb', baseline.get('peak_rss_mb'), current.get('peak_rss_mb'), False)
+    for label, old_stats in baseline.get('by_type', {}).items():
+        new_stats = current.get('by_type', {}).get(label)
+        if new_stats is None or min(_samples(baseline, old_stats), _samples(current, new_stats)) < MIN_SAMPLES:
+            continue
+        for stage in STAGES:
+            for key, old in old_stats.get(stage, {}).items():
+                check(f"{label} {stage} {key}", old, new_stats.get(stage, {}).get(key), False, min_delta_ms)
+    return regressions
+
+def _samples(report: Dict[str, Any], stats: Dict[str, Any]) -> int:
+    """Timings behind a type's percentiles (older reports only record files per run)."""
+    return stats.get('samples', stats.get('files', 0) * report.get('repeat', 1))
+
+def format_report(report: Dict[str, Any]) -> str:
+    rss = report['peak_rss_mb']
+    lines = [
+        f"{report['files']} files, {report['bytes'] / (1024 * 1024):.1f} MB, {report['repeat']} run(s): "
+        f"{report['files_per_sec']:.1f} files/s, {report['mb_per_sec']:.2f} MB/s, "
+        f"peak RSS {'n/a' if rss is None else f'{rss:.0f} MB'}",
+        f"{'type':<14}{'files':>6}{'rows':>8}   {'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}   (total per file)",
+    ]
+    for label, stats in report['by_type'].items():
+        total = stats.get('total', {})
+        lines.append(f"{label:<14}{stats['files']:>6}{stats['rows']:>8}   "
+                     f"{total.get('p50_ms', 0):>9.3f}{total.get('p95_ms', 0):>9.3f}{total.get('p99_ms', 0):>9.3f}")
+    return '\n'.join(lines)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the parsing pipeline over a corpus of filings.")
+    parser.add_argument('--corpus', type=Path, default=DEFAULT_CORPUS, help="Directory of filings")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timed passes over the corpus")
+    parser.add_argument('--save', metavar='JSON', help="Write the results as a baseline JSON file")
+    parser.add_argument('--compare', metavar='JSON', help="Compare against a baseline; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD_PCT,
+                        help="Percent change that counts as a regression in --compare")
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="Smallest rise in a latency percentile that counts as a regression in --compare")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run(args.corpus, args.repeat)
+    print(format_report(report))
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2))
+        print(f"Saved results to {args.save}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(baseline, report, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:g}% against {args.compare}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\nNo regressions over {args.threshold:g}% against {args.compare}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
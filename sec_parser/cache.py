@@ -0,0 +1,119 @@
+import hashlib
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Union
+
+# Default size limit of a ParseCache.
+DEFAULT_MAX_BYTES = 1 << 30
+# When put() finds the cache over max_bytes, it evicts down to this fraction of
+# it, so the directory isn't rescanned on every write once the cache is full.
+EVICT_TO_FRACTION = 0.9
+
+# Source files whose code determines parser output. Editing any of them changes
+# parser_version(), which invalidates every cached result.
+PARSER_MODULES = ('processor.py', 'parsers.py', 'sgml.py', 'utils.py', 'main.py')
+
+@lru_cache(maxsize=None)
+def parser_version() -> str:
+    """A short hash of the parsing code."""
+    sha = hashlib.sha256()
+    for name in PARSER_MODULES:
+        sha.update((Path(__file__).parent / name).read_bytes())
+    return sha.hexdigest()[:16]
+
+class ParseCache:
+    """
+    On-disk cache of per-file parse results, keyed by the sha256 of the file's
+    bytes together with the parser version, so a result is reused only while
+    both the file and the parsing code are unchanged.
+
+    Entries are pickles sharded by key prefix under `root`. Reads refresh an
+    entry's mtime and evict() removes the least recently used entries until
+    the cache fits in `max_bytes`; put() does so as soon as its writes take
+    the cache over the limit. Writes go through a temp file and a rename, so
+    several worker processes can share one cache directory (each keeps its
+    own estimate of the size, corrected whenever it evicts).
+    """
+    def __init__(self, root: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES, version: Optional[str] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.version = version or parser_version()
+        # Size of the cache as last scanned plus what this instance wrote since; None until first needed.
+        self._size: Optional[int] = None
+
+    def key(self, data: bytes, context: str = '') -> str:
+        """
+        Cache key for a file's bytes. `context` covers inputs that don't come
+        from the content, e.g. the CIK and accession number taken from the path.
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        return hashlib.sha256(f"{self.version}\0{context}\0{sha}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A damaged or incompatible entry is just a miss.
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO_FRACTION))
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, Path]], int]:
+        """The cache's entries as (mtime, size, path), and their total size."""
+        entries = []
+        total = 0
+        for path in self.root.glob('*/*.pkl'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return entries, total
+
+    def evict(self, target_bytes: Optional[int] = None) -> int:
+        """
+        Deletes least recently used entries until the cache fits in
+        `target_bytes` (default max_bytes). Returns the number removed.
+        """
+        target_bytes = self.max_bytes if target_bytes is None else target_bytes
+        entries, total = self._scan()
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
@@ -1,49 +1,235 @@
+import argparse
+import hashlib
 import os
-import json
+import random
 import requests
+import threading
 import time
-import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit
+from datetime import datetime
 
-def download_filings():
+from .manifest import DownloadManifest, DONE, FAILED, PENDING
+from . import submissions
+
+EDGAR_ARCHIVES_URL = "https://www.sec.gov/Archives/edgar/data"
+# EDGAR's fair-access policy allows at most 10 requests per second.
+MAX_REQUESTS_PER_SECOND = 10
+DEFAULT_USER_AGENT = 'YourAppName/1.0 (your.email@example.com)'
+FORM_TYPES = ['13F-HR', '13F-NT', '4', '4/A']
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate across all workers.
+    Refills at `rate` tokens per second up to `capacity` (the allowed burst).
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class EdgarClient:
+    """
+    HTTP client shared by all download workers: one keep-alive Session with a
+    connection pool, a global token-bucket rate limit, bounded concurrency per
+    host, and retries with jittered exponential backoff that honour 429/503
+    Retry-After headers.
+    """
+    def __init__(self, user_agent: str = DEFAULT_USER_AGENT, rate: float = MAX_REQUESTS_PER_SECOND,
+                 max_per_host: int = 8, retries: int = 5, backoff_factor: float = 0.5,
+                 max_backoff: float = 60.0, timeout: float = 10.0):
+        self.limiter = TokenBucket(rate)
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_per_host)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _retry_after(self, res: requests.Response) -> Optional[float]:
+        """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+        value = res.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, url: str, **kwargs) -> Optional[requests.Response]:
+        """
+        GETs a URL. Returns the response for 2xx/3xx and for client errors other
+        than 429, or None once all retries are exhausted.
+        """
+        slot = self._host_slot(url)
+        for attempt in range(self.retries):
+            self.limiter.acquire()
+            try:
+                with slot:
+                    res = self.session.get(url, timeout=self.timeout, **kwargs)
+            except requests.exceptions.RequestException:
+                delay = self._backoff(attempt)
+            else:
+                if res.status_code != 429 and res.status_code < 500:
+                    return res
+                retry_after = self._retry_after(res)
+                delay = min(self.max_backoff, retry_after) if retry_after is not None else self._backoff(attempt)
+            if attempt < self.retries - 1:
+                time.sleep(delay)
+        print(f"   [!] Final attempt failed for {url}.")
+        return None
+
+def _save_atomically(path: str, data: bytes) -> str:
+    """Writes data via a temp file so a crash never leaves a truncated filing behind. Returns its sha256."""
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f_out:
+        f_out.write(data)
+    os.replace(tmp_path, path)
+    return hashlib.sha256(data).hexdigest()
+
+def _file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _download_filing(client: EdgarClient, base_url: str, job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Downloads one filing (the information table for 13F filings when there is
+    one, otherwise the primary document). Returns the URL, size and sha256 of
+    what was saved, or an error if nothing could be downloaded.
+    """
+    filing_url_base = f"{base_url}/{job['cik']}/{job['accession_number'].replace('-', '')}/"
+
+    candidates = []
+    if job['form_type'] in ['13F-HR', '13F-NT']:
+        candidates = [(filename, filename) for filename in ['form13fInfoTable.xml', 'infotable.xml']]
+    candidates.append(('primary doc', job['primary_document']))
+
+    last_status = None
+    for label, filename in candidates:
+        url = filing_url_base + filename
+        res = client.get(url)
+        if res is None:
+            continue
+        last_status = res.status_code
+        if res.status_code == 200:
+            sha256 = _save_atomically(job['save_path'], res.content)
+            return {
+                'ok': True,
+                'source_url': url,
+                'size': len(res.content),
+                'sha256': sha256,
+                'message': f"   Downloaded {label} for {job['accession_number']}",
+            }
+    error = f"HTTP {last_status}" if last_status else "no response"
+    return {'ok': False, 'error': error}
+
+def download_filings(fund_data_dir: str = 'fund_data', output_dir: str = 'raw_filings',
+                     base_url: str = EDGAR_ARCHIVES_URL, max_workers: int = 8,
+                     rate: float = MAX_REQUESTS_PER_SECOND, user_agent: str = DEFAULT_USER_AGENT,
+                     since: Optional[str] = None, manifest_path: Optional[str] = None,
+                     retry_failed_only: bool = False, submissions_zip: Optional[str] = None,
+                     ciks: Optional[List[str]] = None):
     """
     Reads extracted CIK JSON files, finds 13F and Form 4 filings,
     and downloads the raw data files, filtering for modern filings.
+
+    With `submissions_zip`, the filing histories of `ciks` (default: the
+    tracked CIKs) are read straight from EDGAR's bulk submissions.zip instead
+    of from `fund_data_dir`. Either way, older filings on the overflow pages
+    listed under filings.files are included along with filings.recent.
+
+    Downloads run concurrently on `max_workers` threads sharing one
+    EdgarClient, so the request rate is capped globally at `rate` per second.
+    `base_url` can point at a local stand-in server (see edgar_standin.py).
+
+    Runs are incremental: every filing is tracked in a DownloadManifest
+    (default: <output_dir>/manifest.sqlite), and filings already downloaded are
+    skipped, so a rerun only fetches new accessions plus anything that failed
+    or was interrupted. `since` (YYYY-MM-DD) ignores filings with an earlier
+    filingDate; `retry_failed_only` only retries filings that previously failed
+    or never finished.
     """
     # --- CONFIGURATION ---
-    fund_data_dir = 'fund_data'
-    output_dir = 'raw_filings'
     # Filter to ignore any filings before this year.
     # Set to 2004 to capture the modern HTML/XML era.
-    MIN_FILING_YEAR = 2004 
-    
-    headers = {'User-Agent': 'YourAppName/1.0 (your.email@example.com)'}
-
-    if not os.path.exists(fund_data_dir):
-        print(f"Error: Directory '{fund_data_dir}' not found.")
-        return
+    MIN_FILING_YEAR = 2004
 
-    if os.path.exists(output_dir):
-        print(f"Removing old '{output_dir}' directory...")
-        shutil.rmtree(output_dir)
-    
-    os.makedirs(output_dir)
-    print(f"Created new '{output_dir}' directory.")
+    if submissions_zip:
+        if not os.path.exists(submissions_zip):
+            print(f"Error: Archive '{submissions_zip}' not found.")
+            return
+        sources = submissions.iter_filings(submissions_zip, ciks or submissions.TRACKED_CIKS, forms=FORM_TYPES)
+    else:
+        if not os.path.exists(fund_data_dir):
+            print(f"Error: Directory '{fund_data_dir}' not found.")
+            return
+        sources = submissions.read_fund_data(fund_data_dir)
 
-    json_files = [f for f in os.listdir(fund_data_dir) if f.endswith('.json')]
+    if since:
+        # Validate early; filingDate strings compare correctly as ISO dates.
+        datetime.strptime(since, '%Y-%m-%d')
 
-    for json_file in json_files:
-        cik = json_file.replace('CIK', '').replace('.json', '')
-        print(f"\nProcessing filings for CIK: {cik}")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = DownloadManifest(manifest_path or os.path.join(output_dir, 'manifest.sqlite'))
+    known = manifest.statuses()
 
-        with open(os.path.join(fund_data_dir, json_file), 'r') as f:
-            data = json.load(f)
+    jobs: List[Dict[str, Any]] = []
+    adopted: List[Dict[str, Any]] = []
+    for cik, filings in sources:
+        print(f"\nCollecting filings for CIK: {cik}")
+        if filings is None:
+            print(f"   [!] CIK {cik} not found in {submissions_zip}")
+            continue
 
         # --- Extract Filing Metadata ---
-        filings = data.get('filings', {}).get('recent', {})
         accession_numbers = filings.get('accessionNumber', [])
         form_types = filings.get('form', [])
         primary_documents = filings.get('primaryDocument', [])
-        filing_dates = filings.get('filingDate', []) 
+        filing_dates = filings.get('filingDate', [])
 
         for i, form_type in enumerate(form_types):
             # --- DATE FILTER ---
@@ -54,58 +240,101 @@ def download_filings():
             except (ValueError, IndexError):
                 continue # Skip if date is malformed
 
-            if form_type in ['13F-HR', '13F-NT', '4', '4/A']:
+            if since and filing_dates[i] < since:
+                continue
+
+            if form_type in FORM_TYPES:
                 accession_number = accession_numbers[i]
-                primary_document = primary_documents[i]
-                accession_no_dashes = accession_number.replace('-', '')
+                status = known.get(accession_number)
 
                 form_dir_name = form_type.replace('/', '_A')
                 output_path = os.path.join(output_dir, cik, form_dir_name)
-                os.makedirs(output_path, exist_ok=True)
-                
                 save_path = os.path.join(output_path, f"{accession_number}.xml")
 
-                if os.path.exists(save_path):
+                if status == DONE and os.path.exists(save_path):
+                    continue
+                if retry_failed_only and status not in (FAILED, PENDING):
                     continue
 
-                filing_url_base = f"https://www.sec.gov/Archives/edgar/data/{cik}/{accession_no_dashes}/"
-                
-                downloaded = False
-                
-                def make_request(url, retry_count=3, backoff_factor=0.5):
-                    for attempt in range(retry_count):
-                        try:
-                            time.sleep(0.2) 
-                            res = requests.get(url, headers=headers, timeout=10)
-                            if res.status_code == 200:
-                                return res
-                            if 400 <= res.status_code < 500:
-                                return res
-                        except requests.exceptions.RequestException:
-                            if attempt < retry_count - 1:
-                                time.sleep(backoff_factor * (2 ** attempt))
-                            else:
-                                print(f"   [!] Final attempt failed for {url}.")
-                                return None
-                    return None
-
-                if form_type in ['13F-HR', '13F-NT']:
-                    potential_filenames = ['form13fInfoTable.xml', 'infotable.xml']
-                    for filename in potential_filenames:
-                        res = make_request(filing_url_base + filename)
-                        if res and res.status_code == 200:
-                            with open(save_path, 'w', encoding='utf-8') as f_out:
-                                f_out.write(res.text)
-                            print(f"   Downloaded {filename} for {accession_number}")
-                            downloaded = True
-                            break
-                
-                if not downloaded:
-                    res = make_request(filing_url_base + primary_document)
-                    if res and res.status_code == 200:
-                        with open(save_path, 'w', encoding='utf-8') as f_out:
-                            f_out.write(res.text)
-                        print(f"   Downloaded primary doc for {accession_number}")
+                os.makedirs(output_path, exist_ok=True)
+                job = {
+                    'cik': cik,
+                    'form_type': form_type,
+                    'accession_number': accession_number,
+                    'filing_date': filing_dates[i],
+                    'primary_document': primary_documents[i],
+                    'save_path': save_path,
+                }
+                # Files downloaded before the manifest existed are recorded, not fetched again.
+                if status is None and os.path.exists(save_path):
+                    adopted.append(job)
+                else:
+                    jobs.append(job)
+
+    if adopted:
+        manifest.mark_pending(adopted)
+        for job in adopted:
+            manifest.mark_done(job['accession_number'], None, job['save_path'],
+                               os.path.getsize(job['save_path']), _file_sha256(job['save_path']))
+        print(f"\nRecorded {len(adopted)} previously downloaded filings in the manifest.")
+
+    run_downloads(manifest, jobs, base_url=base_url, max_workers=max_workers, rate=rate, user_agent=user_agent)
+    manifest.close()
+
+def run_downloads(manifest: DownloadManifest, jobs: List[Dict[str, Any]], base_url: str = EDGAR_ARCHIVES_URL,
+                  max_workers: int = 8, rate: float = MAX_REQUESTS_PER_SECOND,
+                  user_agent: str = DEFAULT_USER_AGENT, client: Optional[EdgarClient] = None) -> int:
+    """
+    Downloads `jobs` (dicts with cik, form_type, accession_number,
+    filing_date, primary_document and save_path) on `max_workers` threads,
+    recording each in the manifest. Returns the number downloaded. Pass
+    `client` to share its rate limit with other requests.
+    """
+    print(f"\nDownloading {len(jobs)} filings with {max_workers} workers (max {rate} requests/s)...")
+    # Recorded before starting, so anything left 'pending' after a crash is retried next run.
+    manifest.mark_pending(jobs)
+    client = client or EdgarClient(user_agent=user_agent, rate=rate, max_per_host=max_workers)
+    start_time = time.monotonic()
+    downloaded = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_download_filing, client, base_url, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)}
+            if result['ok']:
+                downloaded += 1
+                manifest.mark_done(job['accession_number'], result['source_url'], job['save_path'],
+                                   result['size'], result['sha256'])
+                print(result['message'])
+            else:
+                manifest.mark_failed(job['accession_number'], result['error'])
+                print(f"   [!] Error downloading {job['accession_number']}: {result['error']}")
+
+    elapsed = time.monotonic() - start_time
+    print(f"\nDownloaded {downloaded}/{len(jobs)} filings in {elapsed:.1f}s.")
+    print(f"Manifest status: {manifest.summary()}")
+    return downloaded
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download 13F and Form 4 filings for the tracked funds.")
+    parser.add_argument('--fund-data', default='fund_data', help="Directory of submissions CIK JSON files")
+    parser.add_argument('--output', default='raw_filings', help="Directory to download filings into")
+    parser.add_argument('--since', help="Only consider filings with filingDate on or after YYYY-MM-DD")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Only retry filings that failed or were interrupted in earlier runs")
+    parser.add_argument('--workers', type=int, default=8, help="Number of concurrent downloads")
+    parser.add_argument('--base-url', default=EDGAR_ARCHIVES_URL, help="EDGAR Archives base URL")
+    parser.add_argument('--submissions', metavar='ZIP',
+                        help="Read filing histories from EDGAR's bulk submissions.zip instead of --fund-data")
+    parser.add_argument('--ciks', help="Comma-separated CIKs to read from --submissions (default: the tracked CIKs)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    download_filings()
\ No newline at end of file
+    args = parse_args()
+    download_filings(fund_data_dir=args.fund_data, output_dir=args.output, base_url=args.base_url,
+                     max_workers=args.workers, since=args.since, retry_failed_only=args.retry_failed,
+                     submissions_zip=args.submissions,
+                     ciks=args.ciks.split(',') if args.ciks else None)
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+from email.utils import formatdate
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+# --- CONFIGURATION ---
+# Serves the sampled filings the same way EDGAR's Archives do, so the
+# downloader can be exercised locally without touching sec.gov.
+SAMPLE_ROOT = Path(__file__).parent / "sampled_filings"
+
+ARCHIVE_PATH = re.compile(r'^/Archives/edgar/data/(\d+)/(\d{18})/([^/]+)$')
+FULL_INDEX_PATH = re.compile(r'^/Archives/edgar/full-index/(\d{4})/QTR([1-4])/(master|form)\.idx$')
+DAILY_INDEX_PATH = re.compile(r'^/Archives/edgar/daily-index/\d{4}/QTR[1-4]/(master|form)\.(\d{8})\.idx$')
+INFOTABLE_NAMES = ('form13finfotable.xml', 'infotable.xml')
+FEED_PATH = '/cgi-bin/browse-edgar'
+
+def _accession_with_dashes(accession_no_dashes: str) -> str:
+    return f"{accession_no_dashes[:10]}-{accession_no_dashes[10:12]}-{accession_no_dashes[12:]}"
+
+def _is_information_table(path: Path) -> bool:
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip().lower()
+    return head.startswith(b'<?xml') or head.startswith(b'<informationtable')
+
+def index_samples(sample_root: Path = SAMPLE_ROOT) -> dict:
+    """Maps (cik, accession number) to the sampled file and its form type."""
+    index = {}
+    for path in sample_root.glob('*/*/*.xml'):
+        cik, form_dir = path.parts[-3], path.parts[-2]
+        # The downloader stores '4/A' filings under '4_AA'.
+        index[(cik, path.stem)] = (path, form_dir.replace('_A', '/', 1))
+    return index
+
+def _filing_date(accession: str) -> str:
+    """Filing dates are approximated from the accession number's year."""
+    return f"20{accession.split('-')[1]}-01-01"
+
+def render_index(index: dict, kind: str, start: str, end: str) -> bytes:
+    """
+    An EDGAR master.idx or form.idx listing the samples filed between `start`
+    and `end` (inclusive, YYYY-MM-DD), in the same layout as the real ones.
+    """
+    rows = sorted((form_type, cik, accession) for (cik, accession), (_, form_type) in index.items()
+                  if start <= _filing_date(accession) <= end)
+    lines = ["Description:           Master Index of EDGAR Dissemination Feed",
+             "Comments:              stand-in for local testing", "", ""]
+    if kind == 'master':
+        lines += ["CIK|Company Name|Form Type|Date Filed|Filename", "-" * 80]
+        for form_type, cik, accession in rows:
+            lines.append(f"{int(cik)}|SAMPLE FILER {cik}|{form_type}|{_filing_date(accession)}|"
+                         f"edgar/data/{int(cik)}/{accession}.txt")
+    else:
+        lines += [f"{'Form Type':<12}{'Company Name':<62}{'CIK':<12}{'Date Filed':<12}File Name", "-" * 140]
+        for form_type, cik, accession in rows:
+            lines.append(f"{form_type:<12}{'SAMPLE FILER ' + cik:<62}{int(cik):<12}{_filing_date(accession):<12}"
+                         f"edgar/data/{int(cik)}/{accession}.txt")
+    return ('\n'.join(lines) + '\n').encode('latin-1')
+
+def render_feed(entries: list, host: str) -> bytes:
+    """An Atom page like EDGAR's current-filings feed; `entries` are (accepted_at, cik, accession, form_type)."""
+    lines = ['<?xml version="1.0" encoding="ISO-8859-1" ?>',
+             '<feed xmlns="http://www.w3.org/2005/Atom">',
+             '<title>Latest Filings - stand-in</title>']
+    for accepted_at, cik, accession, form_type in entries:
+        updated = datetime.fromtimestamp(accepted_at, timezone.utc).isoformat(timespec='seconds')
+        href = f"http://{host}/Archives/edgar/data/{int(cik)}/{accession.replace('-', '')}/{accession}-index.htm"
+        # EDGAR lists a Form 4 once for the reporting owner and once for the issuer.
+        for role in ('Reporting', 'Issuer'):
+            lines += [
+                '<entry>',
+                f'<title>{escape(form_type)} - SAMPLE FILER {cik} ({cik}) ({role})</title>',
+                f'<link rel="alternate" type="text/html" href="{href}"/>',
+                f'<summary type="html"> &lt;b&gt;Filed:&lt;/b&gt; {updated[:10]} &lt;b&gt;AccNo:&lt;/b&gt; {accession}</summary>',
+                f'<updated>{updated}</updated>',
+                f'<category scheme="https://www.sec.gov/" label="form type" term="{escape(form_type)}"/>',
+                f'<id>urn:tag:sec.gov,2008:accession-number={accession}</id>',
+                '</entry>',
+            ]
+    lines.append('</feed>')
+    return ('\n'.join(lines) + '\n').encode('latin-1')
+
+def write_fund_data(fund_data_dir: str, sample_root: Path = SAMPLE_ROOT):
+    """
+    Writes a submissions-style CIK JSON file for every sampled fund, so
+    download_filings() can be pointed at the stand-in end to end. Filing dates
+    are approximated from the accession number's year.
+    """
+    os.makedirs(fund_data_dir, exist_ok=True)
+    funds = {}
+    for (cik, accession), (path, form_type) in sorted(index_samples(sample_root).items()):
+        recent = funds.setdefault(cik, {'accessionNumber': [], 'form': [], 'primaryDocument': [], 'filingDate': []})
+        recent['accessionNumber'].append(accession)
+        recent['form'].append(form_type)
+        recent['primaryDocument'].append('primary_doc.xml')
+        recent['filingDate'].append(_filing_date(accession))
+    for cik, recent in funds.items():
+        with open(os.path.join(fund_data_dir, f"CIK{cik}.json"), 'w') as f:
+            json.dump({'cik': cik, 'filings': {'recent': recent}}, f)
+    print(f"Wrote fund data for {len(funds)} CIKs to '{fund_data_dir}'.")
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves /Archives/edgar/data/<cik>/<accession>/<file> from the sample tree,
+    full-index and daily-index master.idx/form.idx files listing it, and a
+    current-filings Atom feed of the Form 4 samples. The feed releases one
+    sample every `feed_interval` seconds from server start (all at once if 0),
+    as if it had just been accepted, and honours If-None-Match.
+    """
+    index = {}
+    throttle_every = 0
+    feed_started = 0.0
+    feed_interval = 0.0
+    request_count = 0
+    count_lock = threading.Lock()
+
+    def do_GET(self):
+        with self.count_lock:
+            StandInHandler.request_count += 1
+            count = StandInHandler.request_count
+        # Optionally answer every Nth request with 429 to exercise the client's backoff.
+        if self.throttle_every and count % self.throttle_every == 0:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self._serve_index() or self._serve_feed():
+            return
+
+        match = ARCHIVE_PATH.match(self.path)
+        entry = None
+        if match:
+            cik, accession_no_dashes, filename = match.groups()
+            # EDGAR accepts the CIK with or without zero padding.
+            entry = self.index.get((f"{int(cik):010d}", _accession_with_dashes(accession_no_dashes)))
+        if entry is not None:
+            path, _ = entry
+            # Information table URLs only exist when the sample is an information table.
+            if filename.lower() in INFOTABLE_NAMES and not _is_information_table(path):
+                entry = None
+        if entry is None:
+            self.send_error(404)
+            return
+
+        body = entry[0].read_bytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_index(self) -> bool:
+        full, daily = FULL_INDEX_PATH.match(self.path), DAILY_INDEX_PATH.match(self.path)
+        if full:
+            year, quarter, kind = int(full.group(1)), int(full.group(2)), full.group(3)
+            start = date(year, 3 * quarter - 2, 1).isoformat()
+            end = date(year, 3 * quarter, 31 if quarter in (1, 4) else 30).isoformat()
+        elif daily:
+            kind, day = daily.groups()
+            start = end = f"{day[:4]}-{day[4:6]}-{day[6:]}"
+        else:
+            return False
+        body = render_index(self.index, kind, start, end)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def _serve_feed(self) -> bool:
+        url = urlsplit(self.path)
+        if url.path != FEED_PATH:
+            return False
+        query = parse_qs(url.query)
+        start, count = int(query.get('start', ['0'])[0]), int(query.get('count', ['40'])[0])
+        samples = sorted((accession, cik, form_type) for (cik, accession), (_, form_type) in self.index.items()
+                         if form_type in ('4', '4/A'))
+        now = time.time()
+        released = [(self.feed_started + i * self.feed_interval, cik, accession, form_type)
+                    for i, (accession, cik, form_type) in enumerate(samples)
+                    if self.feed_started + i * self.feed_interval <= now]
+        etag = f'"feed-{len(released)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+        newest_first = released[::-1][start:start + count]
+        body = render_feed(newest_first, self.headers.get('Host', '127.0.0.1'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/atom+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        if released:
+            self.send_header('Last-Modified', formatdate(released[-1][0], usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host: str = '127.0.0.1', port: int = 8000, throttle_every: int = 0,
+                sample_root: Path = SAMPLE_ROOT, feed_interval: float = 0.0) -> ThreadingHTTPServer:
+    """Creates (but doesn't start) a stand-in server; port 0 picks a free port."""
+    handler = type('Handler', (StandInHandler,), {
+        'index': index_samples(sample_root),
+        'throttle_every': throttle_every,
+        'feed_started': time.time(),
+        'feed_interval': feed_interval,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the EDGAR Archives.")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--throttle-every', type=int, default=0,
+                        help="Answer every Nth request with 429 Retry-After: 1")
+    parser.add_argument('--feed-interval', type=float, default=0.0,
+                        help="Release one Form 4 sample to the current-filings feed every N seconds")
+    parser.add_argument('--write-fund-data', metavar='DIR',
+                        help="Also write submissions-style CIK JSON files for the samples to DIR")
+    args = parser.parse_args()
+
+    if args.write_fund_data:
+        write_fund_data(args.write_fund_data)
+
+    server = make_server(port=args.port, throttle_every=args.throttle_every, feed_interval=args.feed_interval)
+    print(f"Serving sampled filings at http://127.0.0.1:{server.server_address[1]}/Archives/edgar/data")
+    print(f"Current-filings feed at http://127.0.0.1:{server.server_address[1]}{FEED_PATH}?action=getcurrent&output=atom")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import io
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate
+from typing import List, Dict, Any, Optional, Iterable, Set
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from .downloader import (EdgarClient, DownloadManifest, run_downloads, _save_atomically,
+                         MAX_REQUESTS_PER_SECOND, DEFAULT_USER_AGENT, DONE)
+from .submissions import pad_cik
+from .triggers import normalize_cik
+
+# --- CONFIGURATION ---
+EDGAR_ROOT_URL = "https://www.sec.gov/Archives"
+DAILY_INDEX = "edgar/daily-index/{year}/QTR{quarter}/{kind}.{day:%Y%m%d}.idx"
+FULL_INDEX = "edgar/full-index/{year}/QTR{quarter}/{kind}.idx"
+INDEX_KINDS = ('master', 'form')
+INDEX_COLUMNS = ['cik', 'company_name', 'form_type', 'date_filed', 'filename']
+# Where each column starts in form.idx's header line (it is fixed-width; master.idx is '|'-separated).
+FORM_INDEX_HEADERS = {'form_type': b'Form Type', 'company_name': b'Company Name', 'cik': b'CIK',
+                      'date_filed': b'Date Filed', 'filename': b'File Name'}
+FORM4_TYPES = ('4', '4/A')
+
+# EDGAR's index files list a filing once for every entity on it. For a
+# Form 4 that is the issuer and each reporting owner, all with the same
+# accession number, so the issuer's rows find the filings about a watchlisted
+# company and the other rows of the same accession name its insiders.
+
+def _quarter(day: date) -> int:
+    return (day.month - 1) // 3 + 1
+
+def daily_index_path(day: date, kind: str = 'master') -> str:
+    return DAILY_INDEX.format(year=day.year, quarter=_quarter(day), kind=kind, day=day)
+
+def full_index_path(year: int, quarter: int, kind: str = 'master') -> str:
+    return FULL_INDEX.format(year=year, quarter=quarter, kind=kind)
+
+def fetch_index(client: EdgarClient, path: str, cache_dir: str, archives_url: str = EDGAR_ROOT_URL,
+                final: bool = True) -> Optional[bytes]:
+    """
+    Returns an index file (`path` relative to the Archives root), from
+    `cache_dir` when it has been fetched before. Files for a past day or
+    quarter never change (`final`), so they're read from the cache without a
+    request; otherwise the cached copy is revalidated with If-Modified-Since.
+    Returns None when there's no such index (EDGAR has none for weekends and
+    holidays) and nothing cached.
+    """
+    local_path = os.path.join(cache_dir, *path.split('/'))
+    cached = os.path.exists(local_path)
+    if cached and final:
+        with open(local_path, 'rb') as f:
+            return f.read()
+
+    headers = {'If-Modified-Since': formatdate(os.path.getmtime(local_path), usegmt=True)} if cached else {}
+    res = client.get(f"{archives_url}/{path}", headers=headers)
+    if res is not None and res.status_code == 200:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        _save_atomically(local_path, res.content)
+        return res.content
+    if cached:
+        with open(local_path, 'rb') as f:
+            return f.read()
+    return None
+
+def _to_string(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Binary to string; index files are ASCII, but a stray latin-1 byte shouldn't fail the read."""
+    try:
+        return column.cast(pa.string())
+    except pa.ArrowInvalid:
+        return pa.chunked_array([pa.array([None if v is None else v.decode('latin-1') for v in column.to_pylist()],
+                                          pa.string())])
+
+def read_index(data: bytes) -> pd.DataFrame:
+    """
+    Parses a master.idx ('|'-separated) or form.idx (fixed-width) file into
+    cik (without zero padding), company_name, form_type, date_filed
+    (datetime64), filename and accession_no columns. Both are read by
+    pyarrow's CSV reader; form.idx lines are then cut at the header's column
+    offsets with Arrow's vectorized slicing, never row by row in Python.
+    """
+    dashes = data.find(b'\n---')
+    if dashes == -1:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in INDEX_COLUMNS + ['accession_no']})
+    header = data[data.rfind(b'\n', 0, dashes) + 1:dashes].rstrip(b'\r')
+    body = io.BytesIO(data[data.find(b'\n', dashes + 1) + 1:])
+    parse_options = dict(quote_char=False, ignore_empty_lines=True)
+
+    if b'|' in header:
+        table = pacsv.read_csv(
+            body, read_options=pacsv.ReadOptions(column_names=INDEX_COLUMNS, encoding='latin-1'),
+            parse_options=pacsv.ParseOptions(delimiter='|', **parse_options),
+            convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in INDEX_COLUMNS}))
+    else:
+        # One column of whole lines (no line contains \x01), as bytes so offsets are byte offsets.
+        lines = pacsv.read_csv(
+            body, read_options=pacsv.ReadOptions(column_names=['line']),
+            parse_options=pacsv.ParseOptions(delimiter='\x01', **parse_options),
+            convert_options=pacsv.ConvertOptions(column_types={'line': pa.binary()})).column('line')
+        starts = sorted((header.find(label), name) for name, label in FORM_INDEX_HEADERS.items())
+        columns = {}
+        for i, (begin, name) in enumerate(starts):
+            stop = starts[i + 1][0] if i + 1 < len(starts) else len(header) + 4096
+            columns[name] = pc.ascii_trim_whitespace(_to_string(pc.binary_slice(lines, begin, stop)))
+        table = pa.table({name: columns[name] for name in INDEX_COLUMNS})
+
+    df = table.to_pandas()
+    df['cik'] = df['cik'].str.strip().str.lstrip('0')
+    # Daily files use YYYYMMDD, quarterly ones YYYY-MM-DD.
+    df['date_filed'] = pd.to_datetime(df['date_filed'].str.replace('-', '', regex=False), format='%Y%m%d',
+                                      errors='coerce').astype('datetime64[ns]')
+    # Filenames are always edgar/data/<cik>/<20-character accession number>.txt.
+    df['accession_no'] = df['filename'].str.slice(-24, -4)
+    return df
+
+def select_form4(index: pd.DataFrame, issuer_ciks: Iterable[Any]) -> pd.DataFrame:
+    """
+    The Form 4/4-A filings in `index` listed under one of `issuer_ciks`, one
+    row per accession, with the issuer CIK and, from the other rows of the same
+    accession, the reporting owner's CIK (the issuer's when there is none).
+    """
+    ciks = {cik for cik in (normalize_cik(c) for c in issuer_ciks) if cik}
+    forms = index[index['form_type'].isin(FORM4_TYPES)]
+    on_watchlist = forms['cik'].isin(ciks)
+    hits = (forms[on_watchlist].drop_duplicates('accession_no')
+            .rename(columns={'cik': 'issuer_cik', 'company_name': 'issuer_name'}))
+    owners = (forms[~on_watchlist & forms['accession_no'].isin(hits['accession_no'])]
+              .drop_duplicates('accession_no')[['accession_no', 'cik']]
+              .rename(columns={'cik': 'insider_cik'}))
+    result = hits.merge(owners, on='accession_no', how='left')
+    result['insider_cik'] = result['insider_cik'].fillna(result['issuer_cik'])
+    return result[['accession_no', 'form_type', 'date_filed', 'issuer_cik', 'issuer_name', 'insider_cik', 'filename']]
+
+def build_jobs(selected: pd.DataFrame, output_dir: str, known: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Download jobs for selected filings not downloaded yet. Each full
+    submission (.txt) is saved as <output_dir>/<insider CIK>/<form>/<accession>.txt,
+    the directory layout main.py reads the insider's CIK from.
+    """
+    jobs = []
+    for row in selected.itertuples(index=False):
+        save_path = os.path.join(output_dir, pad_cik(row.insider_cik), row.form_type.replace('/', '_A'),
+                                 f"{row.accession_no}.txt")
+        if known.get(row.accession_no) == DONE and os.path.exists(save_path):
+            continue
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        jobs.append({
+            'cik': pad_cik(row.issuer_cik),
+            'form_type': row.form_type,
+            'accession_number': row.accession_no,
+            'filing_date': row.date_filed.strftime('%Y-%m-%d') if pd.notna(row.date_filed) else None,
+            'primary_document': f"{row.accession_no}.txt",
+            'save_path': save_path,
+        })
+    return jobs
+
+def index_paths(day: Optional[date] = None, days: int = 1, quarter: Optional[str] = None,
+                kind: str = 'master', today: Optional[date] = None) -> List[tuple]:
+    """(path, final) for the daily indexes of `days` days up to `day`, or for one quarter ('2024Q1')."""
+    today = today or datetime.now(timezone.utc).date()
+    if quarter:
+        year, q = int(quarter[:4]), int(quarter[-1])
+        current = (year, q) == (today.year, _quarter(today))
+        return [(full_index_path(year, q, kind), not current)]
+    day = day or today
+    return [(daily_index_path(day - timedelta(days=i), kind), day - timedelta(days=i) < today)
+            for i in range(days)]
+
+def watchlist_ciks(store: str, xref_dir: str, min_funds: Optional[int] = None) -> Set[str]:
+    """Issuer CIKs of the current Whale Watchlist, through the CUSIP cross-reference."""
+    from .watchlist import HoldingsDiffEngine, MIN_CLUSTER_FUNDS
+    from .xref import CrossReference
+    watchlist = HoldingsDiffEngine.from_store(store).watchlist(min_funds=min_funds or MIN_CLUSTER_FUNDS)
+    annotated = CrossReference.load(xref_dir).annotate(watchlist)
+    return {cik for cik in (normalize_cik(c) for c in annotated['issuer_cik']) if cik}
+
+def discover_form4s(issuer_ciks: Iterable[Any], output_dir: str = 'raw_filings', cache_dir: str = 'edgar_index',
+                    day: Optional[date] = None, days: int = 1, quarter: Optional[str] = None, kind: str = 'master',
+                    archives_url: str = EDGAR_ROOT_URL, max_workers: int = 8,
+                    rate: float = MAX_REQUESTS_PER_SECOND, user_agent: str = DEFAULT_USER_AGENT,
+                    manifest_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Finds the Form 4/4-A filings about `issuer_ciks` in EDGAR's form index
+    (daily by default, or a quarter's full index) and downloads the ones not
+    downloaded yet, sharing the downloader's manifest and rate limit. A daily
+    run costs one index file plus the relevant filings. Returns the selection.
+    """
+    issuer_ciks = list(issuer_ciks)
+    client = EdgarClient(user_agent=user_agent, rate=rate, max_per_host=max_workers)
+    frames = []
+    start = time.monotonic()
+    for path, final in index_paths(day, days, quarter, kind):
+        data = fetch_index(client, path, cache_dir, archives_url, final)
+        if data is None:
+            print(f"   No index at {path}")
+            continue
+        frames.append(read_index(data))
+    index = pd.concat(frames, ignore_index=True) if frames else read_index(b'')
+    selected = select_form4(index, issuer_ciks)
+    print(f"Read {len(index)} index entries in {time.monotonic() - start:.1f}s; "
+          f"{len(selected)} Form 4/4-A filing(s) for {len(issuer_ciks)} watchlisted issuer(s).")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = DownloadManifest(manifest_path or os.path.join(output_dir, 'manifest.sqlite'))
+    try:
+        jobs = build_jobs(selected, output_dir, manifest.statuses())
+        run_downloads(manifest, jobs, base_url=f"{archives_url}/edgar/data", max_workers=max_workers,
+                      rate=rate, user_agent=user_agent, client=client)
+    finally:
+        manifest.close()
+    return selected
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download Form 4/4-A filings about watchlisted issuers, "
+                                                 "found through EDGAR's form index.")
+    parser.add_argument('--ciks', help="Comma-separated issuer CIKs")
+    parser.add_argument('--ciks-file', help="File of issuer CIKs, one per line")
+    parser.add_argument('--store', metavar='DIR', help="Holdings store to build the watchlist from (with --xref)")
+    parser.add_argument('--xref', metavar='DIR',
+                        help="Cross-reference mapping watchlist CUSIPs to issuer CIKs (built with python -m sec_parser.xref)")
+    parser.add_argument('--date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help="Last day of daily indexes to read (default: today)")
+    parser.add_argument('--days', type=int, default=1, help="Number of daily indexes to read, back from --date")
+    parser.add_argument('--quarter', help="Read a quarter's full index instead, e.g. 2024Q1")
+    parser.add_argument('--kind', choices=INDEX_KINDS, default='master', help="Index file to read")
+    parser.add_argument('--cache-dir', default='edgar_index', help="Where index files are cached")
+    parser.add_argument('--output', default='raw_filings', help="Directory to download filings into")
+    parser.add_argument('--workers', type=int, default=8, help="Number of concurrent downloads")
+    parser.add_argument('--archives-url', default=EDGAR_ROOT_URL, help="EDGAR Archives root URL")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    ciks: Set[str] = set()
+    if args.ciks:
+        ciks.update(args.ciks.split(','))
+    if args.ciks_file:
+        with open(args.ciks_file) as f:
+            ciks.update(line.strip() for line in f if line.strip())
+    if args.store and args.xref:
+        ciks.update(watchlist_ciks(args.store, args.xref))
+    if not ciks:
+        print("Error: no issuer CIKs; pass --ciks, --ciks-file or --store with --xref.")
+        return
+    discover_form4s(ciks, output_dir=args.output, cache_dir=args.cache_dir, day=args.date, days=args.days,
+                    quarter=args.quarter, kind=args.kind, archives_url=args.archives_url, max_workers=args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import pandas as pd
+
+from . import loader
+
+# --- CONFIGURATION ---
+# Parsed filings waiting for the writer. When the queue is full the parsers are
+# held back, so memory stays bounded however far the database falls behind.
+DEFAULT_QUEUE_SIZE = 256
+# A commit is made every batch_size rows, or after this many filings, so that
+# filings with few or no rows are still checkpointed regularly...
+MAX_FILINGS_PER_COMMIT = 1000
+# ...or once no filing has arrived for this long.
+FLUSH_SECONDS = 5.0
+# How often a producer blocked on a full queue checks whether the writer died.
+PUT_POLL_SECONDS = 0.5
+
+_DONE = object()
+
+# The additive loader stats; rows_per_sec is derived from them.
+_STAT_KEYS = ('rows_in', 'rows_skipped', 'rows_staged', 'rows_merged', 'batches', 'seconds')
+
+def _add_stats(total: Dict[str, Any], stats: Dict[str, Any]):
+    for key in _STAT_KEYS:
+        total[key] += stats[key]
+    if total['seconds'] > 0:
+        total['rows_per_sec'] = total['rows_staged'] / total['seconds']
+
+class IngestWriter(threading.Thread):
+    """
+    The consumer side of main.py's pipelined ingest: a thread draining
+    process_file() results from a bounded queue into PostgreSQL.
+
+    Results are grouped until they hold `batch_size` rows (or
+    MAX_FILINGS_PER_COMMIT filings, or the queue has been idle for
+    FLUSH_SECONDS) and each group is written with loader.load_filings(), which
+    commits the group's rows and its Ingest_Checkpoints entries together.
+    Connections come from a loader.connection_pool(); one broken by an error
+    is closed rather than returned.
+
+    put() blocks while the queue is full (backpressure). If the writer fails,
+    put() and close() raise, and nothing after the last commit is checkpointed,
+    so a rerun picks up from there.
+    """
+    def __init__(self, pool, batch_size: int = loader.DEFAULT_BATCH_SIZE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, max_filings: int = MAX_FILINGS_PER_COMMIT):
+        super().__init__(name='ingest-writer', daemon=True)
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_filings = max_filings
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.error: Optional[BaseException] = None
+        self.stats = {kind: dict.fromkeys(_STAT_KEYS + ('rows_per_sec',), 0) for kind in ('holdings', 'transactions')}
+        self.filings_committed = 0
+        self.commits: List[float] = []     # seconds per commit
+        self.blocked_seconds = 0.0         # time producers spent waiting on a full queue
+
+    def put(self, result: Dict[str, Any]):
+        """Hands a process_file() result to the writer, waiting while the queue is full."""
+        blocked_since = None
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"Ingest writer failed: {self.error}") from self.error
+            try:
+                self.queue.put(result, timeout=PUT_POLL_SECONDS)
+                break
+            except queue.Full:
+                blocked_since = blocked_since or time.perf_counter()
+        if blocked_since is not None:
+            self.blocked_seconds += time.perf_counter() - blocked_since
+
+    def close(self):
+        """Commits what's left and stops the writer. Raises if it failed."""
+        if self.error is None:
+            self.put(_DONE)
+        self.join()
+        if self.error is not None:
+            raise RuntimeError(f"Ingest writer failed: {self.error}") from self.error
+
+    def run(self):
+        pending: List[Dict[str, Any]] = []
+        rows = 0
+        try:
+            while True:
+                try:
+                    result = self.queue.get(timeout=FLUSH_SECONDS)
+                except queue.Empty:
+                    if pending:
+                        self._flush(pending)
+                        pending, rows = [], 0
+                    continue
+                if result is _DONE:
+                    break
+                pending.append(result)
+                rows += sum(len(df) for df in (result['holdings'], result['transactions']) if df is not None)
+                if rows >= self.batch_size or len(pending) >= self.max_filings:
+                    self._flush(pending)
+                    pending, rows = [], 0
+            if pending:
+                self._flush(pending)
+        except BaseException as e:
+            self.error = e
+            # Unblock a producer waiting on the full queue; it sees self.error next.
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def _flush(self, results: List[Dict[str, Any]]):
+        holdings = [result['holdings'] for result in results if result['holdings'] is not None]
+        transactions = [result['transactions'] for result in results if result['transactions'] is not None]
+        checkpoints = [(Path(result['path']).stem, Path(result['path']).as_posix()) for result in results]
+        start_time = time.perf_counter()
+        conn = self.pool.getconn()
+        try:
+            stats = loader.load_filings(
+                conn,
+                pd.concat(holdings, ignore_index=True) if holdings else pd.DataFrame(),
+                pd.concat(transactions, ignore_index=True) if transactions else pd.DataFrame(),
+                checkpoints)
+        except Exception:
+            self.pool.putconn(conn, close=True)
+            raise
+        self.pool.putconn(conn)
+        for kind, kind_stats in stats.items():
+            _add_stats(self.stats[kind], kind_stats)
+        self.filings_committed += len(results)
+        self.commits.append(time.perf_counter() - start_time)
@@ -0,0 +1,384 @@
+import io
+import logging
+import time
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Set, Tuple
+
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from .utils import share_positions
+
+# Columns written to each staging table, in COPY order.
+HOLDINGS_COLUMNS = ['fund_cik', 'report_date', 'filing_date', 'cusip', 'company_name',
+                    'shares', 'value_usd', 'share_type', 'put_call', 'accession_no',
+                    'raw_sha256', 'raw_offset', 'raw_parser_version']
+TRANSACTION_COLUMNS = ['accession_no', 'transaction_no', 'issuer_cik', 'issuer_ticker', 'insider_cik',
+                       'insider_name', 'insider_relation', 'filing_date', 'transaction_date', 'transaction_code',
+                       'shares', 'price_per_share', 'shares_owned_after', 'raw_sha256', 'raw_offset',
+                       'raw_parser_version']
+# Columns a DataFrame may lack; they are loaded as NULL. The raw references are
+# only set with a RawStore, and frames without share_type/put_call are taken
+# to hold share positions only.
+OPTIONAL_COLUMNS = ['share_type', 'put_call', 'accession_no', 'raw_sha256', 'raw_offset', 'raw_parser_version']
+
+# Columns declared NOT NULL in schema.sql; rows missing any of them are skipped.
+HOLDINGS_REQUIRED = ['fund_cik', 'report_date', 'filing_date', 'cusip', 'company_name',
+                     'shares', 'value_usd']
+TRANSACTION_REQUIRED = ['accession_no', 'transaction_no', 'issuer_cik', 'insider_name', 'filing_date',
+                        'transaction_date', 'shares']
+
+DEFAULT_BATCH_SIZE = 50_000
+
+# Staging tables are temporary (so unlogged and private to the session) and
+# untyped beyond what COPY needs; all validation happens in the merge.
+_HOLDINGS_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS stg_quarterly_holdings (
+    fund_cik TEXT, report_date DATE, filing_date TIMESTAMPTZ, cusip TEXT, company_name TEXT,
+    shares BIGINT, value_usd BIGINT, share_type TEXT, put_call TEXT, accession_no TEXT,
+    raw_sha256 TEXT, raw_offset INTEGER, raw_parser_version SMALLINT
+)
+"""
+
+_TRANSACTIONS_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS stg_insider_transactions (
+    ord BIGSERIAL, accession_no TEXT, transaction_no INTEGER, issuer_cik TEXT, issuer_ticker TEXT,
+    insider_cik TEXT, insider_name TEXT, insider_relation TEXT, filing_date TIMESTAMPTZ, transaction_date DATE,
+    transaction_code TEXT, shares BIGINT, price_per_share NUMERIC(18, 4), shares_owned_after BIGINT,
+    raw_sha256 TEXT, raw_offset INTEGER, raw_parser_version SMALLINT
+)
+"""
+
+# A fund can list the same CUSIP on several lines of one filing (e.g. per manager
+# or discretion type), but uq_holding allows one row per fund/quarter/CUSIP, so
+# those lines are summed and the row keeps the offsets of all of them. (Option
+# and principal-amount lines never get here; see utils.share_positions().) When a
+# filing and its amendment are staged together, each CUSIP is taken from the
+# latest filing listing it, as a later batch would replace it through ON CONFLICT;
+# a stored row is only replaced by one from a filing at least as recent, so an
+# original loaded after its amendment doesn't undo it.
+_HOLDINGS_MERGE = """
+INSERT INTO "Quarterly_Holdings" ("fund_cik", "report_date", "filing_date", "cusip", "company_name",
+                                  "shares", "value_usd", "raw_sha256", "raw_offsets", "raw_parser_version")
+SELECT s.fund_cik, s.report_date, max(s.filing_date), s.cusip, min(s.company_name),
+       sum(s.shares), sum(s.value_usd), min(s.raw_sha256),
+       array_agg(s.raw_offset ORDER BY s.raw_offset) FILTER (WHERE s.raw_offset IS NOT NULL),
+       min(s.raw_parser_version)
+FROM (
+    SELECT *, rank() OVER (PARTITION BY fund_cik, report_date, cusip
+                           ORDER BY filing_date DESC, accession_no DESC NULLS LAST) AS filing_rank
+    FROM stg_quarterly_holdings
+) s
+JOIN "Funds" f ON f."cik" = s.fund_cik
+WHERE s.filing_rank = 1
+GROUP BY s.fund_cik, s.report_date, s.cusip
+ON CONFLICT ON CONSTRAINT uq_holding DO UPDATE SET
+    "filing_date" = EXCLUDED."filing_date",
+    "company_name" = EXCLUDED."company_name",
+    "shares" = EXCLUDED."shares",
+    "value_usd" = EXCLUDED."value_usd",
+    "raw_sha256" = EXCLUDED."raw_sha256",
+    "raw_offsets" = EXCLUDED."raw_offsets",
+    "raw_parser_version" = EXCLUDED."raw_parser_version"
+WHERE EXCLUDED."filing_date" >= "Quarterly_Holdings"."filing_date"
+"""
+
+# Staged holdings of funds missing from "Funds", which the merge's join drops.
+_HOLDINGS_UNKNOWN_FUNDS = """
+SELECT s.fund_cik, count(*) FROM stg_quarterly_holdings s
+WHERE NOT EXISTS (SELECT 1 FROM "Funds" f WHERE f."cik" = s.fund_cik)
+GROUP BY s.fund_cik ORDER BY s.fund_cik
+"""
+
+# Filings whose rows have been committed by load_filings(), so an interrupted
+# pipelined run can resume. Also in schema.sql; created here for older databases.
+_CHECKPOINTS_DDL = """
+CREATE TABLE IF NOT EXISTS "Ingest_Checkpoints" (
+    "accession_no" VARCHAR(255) PRIMARY KEY,
+    "path" TEXT,
+    "committed_at" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+)
+"""
+
+_CHECKPOINTS_INSERT = """
+INSERT INTO "Ingest_Checkpoints" ("accession_no", "path") VALUES %s
+ON CONFLICT ("accession_no") DO UPDATE SET "path" = EXCLUDED."path", "committed_at" = now()
+"""
+
+# Every transaction of a filing is a row, keyed by (accession_no, transaction_no).
+# A filing staged twice in one batch (e.g. found under both the issuer's and the
+# owner's CIK) is taken once, from its last copy.
+_TRANSACTIONS_MERGE = """
+INSERT INTO "Insider_Transactions" ("accession_no", "transaction_no", "issuer_cik", "issuer_ticker",
+                                    "insider_cik", "insider_name", "insider_relation", "filing_date",
+                                    "transaction_date", "transaction_code", "shares", "price_per_share",
+                                    "shares_owned_after", "raw_sha256", "raw_offset", "raw_parser_version")
+SELECT DISTINCT ON (accession_no, transaction_no)
+       accession_no, transaction_no, issuer_cik, issuer_ticker, insider_cik, insider_name, insider_relation,
+       filing_date, transaction_date, transaction_code, shares, price_per_share, shares_owned_after,
+       raw_sha256, raw_offset, raw_parser_version
+FROM stg_insider_transactions
+ORDER BY accession_no, transaction_no, ord DESC
+ON CONFLICT ON CONSTRAINT uq_insider_transaction DO UPDATE SET
+    "issuer_cik" = EXCLUDED."issuer_cik",
+    "issuer_ticker" = EXCLUDED."issuer_ticker",
+    "insider_cik" = EXCLUDED."insider_cik",
+    "insider_name" = EXCLUDED."insider_name",
+    "insider_relation" = EXCLUDED."insider_relation",
+    "filing_date" = EXCLUDED."filing_date",
+    "transaction_date" = EXCLUDED."transaction_date",
+    "transaction_code" = EXCLUDED."transaction_code",
+    "shares" = EXCLUDED."shares",
+    "price_per_share" = EXCLUDED."price_per_share",
+    "shares_owned_after" = EXCLUDED."shares_owned_after",
+    "raw_sha256" = EXCLUDED."raw_sha256",
+    "raw_offset" = EXCLUDED."raw_offset",
+    "raw_parser_version" = EXCLUDED."raw_parser_version"
+"""
+
+# A re-loaded filing that now parses to fewer transactions (e.g. after a parser
+# fix) leaves rows past its last transaction_no; they are removed.
+_TRANSACTIONS_PRUNE = """
+DELETE FROM "Insider_Transactions" t
+USING (SELECT accession_no, max(transaction_no) AS last_no FROM stg_insider_transactions GROUP BY accession_no) s
+WHERE t."accession_no" = s.accession_no AND t."transaction_no" > s.last_no
+"""
+
+def _connect_kwargs(dsn: Optional[str]) -> Dict[str, Any]:
+    if dsn:
+        return {'dsn': dsn}
+    import config
+    return {'host': config.DB_HOST, 'port': config.DB_PORT, 'dbname': config.DB_NAME,
+            'user': config.DB_USER, 'password': config.DB_PASSWORD}
+
+def connect(dsn: Optional[str] = None):
+    """Opens a connection from a DSN, or from the DB_* settings in config.py."""
+    return psycopg2.connect(**_connect_kwargs(dsn))
+
+def connection_pool(dsn: Optional[str] = None, maxconn: int = 2) -> ThreadedConnectionPool:
+    """
+    A thread-safe pool of up to `maxconn` connections, configured like
+    connect(). Take connections with getconn() and hand them back with
+    putconn(), passing close=True for one left broken by an error.
+    """
+    return ThreadedConnectionPool(1, maxconn, **_connect_kwargs(dsn))
+
+def _valid_holdings(df: pd.DataFrame) -> pd.Series:
+    """Rows that satisfy the Quarterly_Holdings constraints."""
+    valid = df[HOLDINGS_REQUIRED].notna().all(axis=1)
+    valid &= df['cusip'].astype('string').str.len().le(9).fillna(False)
+    valid &= df['company_name'].astype('string').str.len().le(255).fillna(False)
+    valid &= df['shares'].ge(0).fillna(False) & df['value_usd'].ge(0).fillna(False)
+    return valid
+
+def _valid_transactions(df: pd.DataFrame) -> pd.Series:
+    """Rows that satisfy the Insider_Transactions constraints."""
+    valid = df[TRANSACTION_REQUIRED].notna().all(axis=1)
+    valid &= df['transaction_code'].astype('string').str.len().le(1).fillna(True)
+    valid &= df['issuer_ticker'].astype('string').str.len().le(10).fillna(True)
+    valid &= df['issuer_cik'].astype('string').str.len().le(10).fillna(False)
+    valid &= df['insider_name'].astype('string').str.len().le(255).fillna(False)
+    valid &= df['shares_owned_after'].ge(0).fillna(True)
+    return valid
+
+def _batches(df: pd.DataFrame, keys: List[str], batch_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Splits df into batches of about batch_size rows without splitting a group
+    of rows sharing `keys` (one filing) across batches, so each group is
+    merged in a single statement.
+    """
+    batch, batch_rows = [], 0
+    for _, group in df.groupby(keys, sort=False, observed=True):
+        batch.append(group)
+        batch_rows += len(group)
+        if batch_rows >= batch_size:
+            yield pd.concat(batch)
+            batch, batch_rows = [], 0
+    if batch:
+        yield pd.concat(batch)
+
+def _copy(cursor, df: pd.DataFrame, table: str, columns: List[str]):
+    """Streams df into `table` with COPY FROM STDIN."""
+    buffer = io.StringIO()
+    df[columns].to_csv(buffer, index=False, header=False, na_rep='\\N',
+                       date_format='%Y-%m-%d %H:%M:%S')
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+def _table(kind: str):
+    """(columns, staging DDL, staging table, merge SQL, validator, filing keys) for 'holdings' or 'transactions'."""
+    if kind == 'holdings':
+        return (HOLDINGS_COLUMNS, _HOLDINGS_STAGING, 'stg_quarterly_holdings', _HOLDINGS_MERGE,
+                _valid_holdings, ['fund_cik', 'report_date'])
+    return (TRANSACTION_COLUMNS, _TRANSACTIONS_STAGING, 'stg_insider_transactions', _TRANSACTIONS_MERGE,
+            _valid_transactions, ['accession_no'])
+
+def _new_stats(rows_in: int) -> Dict[str, Any]:
+    return {'rows_in': rows_in, 'rows_skipped': 0, 'rows_staged': 0, 'rows_merged': 0,
+            'batches': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+
+def _finish_stats(stats: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+    stats['seconds'] = time.perf_counter() - start_time
+    if stats['seconds'] > 0:
+        stats['rows_per_sec'] = stats['rows_staged'] / stats['seconds']
+    return stats
+
+def _prepare(df: pd.DataFrame, kind: str, stats: Dict[str, Any]) -> pd.DataFrame:
+    """The rows of df that can be loaded; the others are counted in stats['rows_skipped']."""
+    columns, _, _, _, valid, _ = _table(kind)
+    missing = [c for c in columns if c not in df.columns and c not in OPTIONAL_COLUMNS]
+    if missing:
+        raise ValueError(f"DataFrame is missing columns required by the {kind} table: {missing}")
+    df = df.assign(**{c: None for c in OPTIONAL_COLUMNS if c in columns and c not in df.columns})
+
+    if kind == 'holdings':
+        shares = share_positions(df)
+        excluded = int((~shares).sum())
+        if excluded:
+            logging.info(f"Leaving out {excluded} option and principal-amount holdings lines.")
+            stats['rows_skipped'] += excluded
+            df = df[shares]
+
+    mask = valid(df)
+    invalid = int((~mask).sum())
+    stats['rows_skipped'] += invalid
+    if invalid:
+        logging.warning(f"Skipping {invalid} {kind} rows that violate schema constraints.")
+    return df[mask]
+
+def _merge(cursor, batch: pd.DataFrame, kind: str, stats: Dict[str, Any]):
+    """Stages one batch and merges it into the table, without committing."""
+    columns, _, staging, merge, _, _ = _table(kind)
+    cursor.execute(f"TRUNCATE {staging}")
+    _copy(cursor, batch, staging, columns)
+    unknown = 0
+    if kind == 'holdings':
+        cursor.execute(_HOLDINGS_UNKNOWN_FUNDS)
+        unknown_funds = cursor.fetchall()
+        unknown = sum(count for _, count in unknown_funds)
+        if unknown:
+            ciks = ', '.join(cik for cik, _ in unknown_funds[:5])
+            more = f" and {len(unknown_funds) - 5} more" if len(unknown_funds) > 5 else ""
+            logging.warning(f"Skipping {unknown} holdings rows of {len(unknown_funds)} fund(s) "
+                            f"not in \"Funds\": {ciks}{more}.")
+            stats['rows_skipped'] += unknown
+    cursor.execute(merge)
+    stats['rows_merged'] += cursor.rowcount
+    if kind == 'transactions':
+        cursor.execute(_TRANSACTIONS_PRUNE)
+    stats['rows_staged'] += len(batch) - unknown
+    stats['batches'] += 1
+
+def _load(conn, df: pd.DataFrame, kind: str, batch_size: int) -> Dict[str, Any]:
+    stats = _new_stats(len(df))
+    if df.empty:
+        return stats
+    start_time = time.perf_counter()
+    df = _prepare(df, kind, stats)
+    _, staging_ddl, _, _, _, keys = _table(kind)
+
+    with conn.cursor() as cursor:
+        cursor.execute(staging_ddl)
+        conn.commit()
+        for batch in _batches(df, keys, batch_size):
+            # One transaction per batch: a failure rolls back only this batch.
+            try:
+                _merge(cursor, batch, kind, stats)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    return _finish_stats(stats, start_time)
+
+def load_holdings(conn, df: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Bulk-loads a normalize_13f_data() DataFrame into Quarterly_Holdings.
+
+    Each batch is COPYed into a staging table and merged with
+    INSERT ... ON CONFLICT ON CONSTRAINT uq_holding, in one transaction per
+    batch. Rows violating the table's constraints, option and principal-amount
+    lines, and rows for funds that aren't in "Funds" are not loaded (and are
+    counted as skipped), nor is a row older than the one stored for its
+    fund, quarter and CUSIP. Returns row counts and rows/s.
+
+    Rows keep the RawStore hash of their filing and the raw_offsets of the
+    lines summed into them, with the raw_parser_version the offsets belong
+    to; RawStore.record() rehydrates the original lines.
+    """
+    return _load(conn, df, 'holdings', batch_size)
+
+def load_transactions(conn, df: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Bulk-loads a normalize_form4_data() DataFrame into Insider_Transactions,
+    one row per transaction, merging on (accession_no, transaction_no) like
+    load_holdings() does on uq_holding.
+    """
+    return _load(conn, df, 'transactions', batch_size)
+
+def committed_accessions(conn) -> Set[str]:
+    """The accession numbers checkpointed by earlier load_filings() calls."""
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(_CHECKPOINTS_DDL)
+            cursor.execute('SELECT "accession_no" FROM "Ingest_Checkpoints"')
+            accessions = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return accessions
+
+def load_filings(conn, holdings: pd.DataFrame, transactions: pd.DataFrame,
+                 checkpoints: Iterable[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads the holdings and transactions of a group of filings and checkpoints
+    the filings, given as (accession_no, path), all in one transaction: after
+    a crash, either a filing's rows and its checkpoint are both committed or
+    neither is. Each DataFrame is merged in a single statement, so the caller
+    sizes the group. Returns load_holdings()-style stats per table.
+    """
+    stats = {'holdings': _new_stats(len(holdings)), 'transactions': _new_stats(len(transactions))}
+    start_time = time.perf_counter()
+    frames = {'holdings': holdings, 'transactions': transactions}
+    with conn.cursor() as cursor:
+        try:
+            for kind, df in frames.items():
+                if not df.empty:
+                    cursor.execute(_table(kind)[1])
+                    _merge(cursor, _prepare(df, kind, stats[kind]), kind, stats[kind])
+            cursor.execute(_CHECKPOINTS_DDL)
+            # One row per accession, or ON CONFLICT would update a row twice.
+            checkpoints = list(dict(checkpoints).items())
+            if checkpoints:
+                execute_values(cursor, _CHECKPOINTS_INSERT, checkpoints)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    for kind_stats in stats.values():
+        _finish_stats(kind_stats, start_time)
+    return stats
+
+def refresh_latest_holdings(conn) -> float:
+    """
+    Refreshes the "Latest_Holdings" materialized view after new holdings are
+    loaded. The refresh is CONCURRENTLY, so readers keep seeing the previous
+    snapshot until it commits. Returns the seconds taken.
+    """
+    start_time = time.perf_counter()
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY "Latest_Holdings"')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return time.perf_counter() - start_time
+
+def format_stats(kind: str, stats: Dict[str, Any]) -> str:
+    return (f"Loaded {kind}: {stats['rows_staged']} rows staged in {stats['batches']} batch(es), "
+            f"{stats['rows_merged']} merged, {stats['rows_skipped']} skipped, "
+            f"{stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/s)")
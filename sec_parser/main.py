@@ -1,18 +1,411 @@
 import pandas as pd
 from pathlib import Path
+import argparse
+import heapq
+import itertools
+import os
+import time
 import traceback
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterator
 
 # Import the new modules
 from .processor import FileProcessor
 from . import parsers
+from . import sgml
 from . import utils
+from . import loader
+from . import store
+from .cache import ParseCache, DEFAULT_MAX_BYTES
+from .ingest import IngestWriter, DEFAULT_QUEUE_SIZE
+from .raw_store import RawStore
+from .metrics import PipelineMetrics, StageTimer
 
-def main():
+# Each worker gets several chunks so a single slow chunk doesn't leave the other cores idle.
+CHUNKS_PER_WORKER = 4
+# Files per chunk in --pipeline mode, where chunks are taken in file order as results are consumed.
+PIPELINE_CHUNK_FILES = 16
+
+@lru_cache(maxsize=None)
+def _parse_cache(cache_dir: str, max_bytes: int) -> ParseCache:
+    """One ParseCache per directory and process, so it keeps track of what it wrote."""
+    return ParseCache(cache_dir, max_bytes=max_bytes)
+
+def process_file(file_path: Path, root_path: Path, cache_dir: Optional[str] = None,
+                 raw_store_dir: Optional[str] = None, cache_max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Parses and normalizes a single filing.
+
+    Nothing is printed or logged here; the console lines and log records are
+    returned with the result so the caller can emit them in a stable order,
+    whether the file was processed in-process or in a pool worker.
+
+    With a `cache_dir`, results are looked up in (and saved to) a ParseCache,
+    so files whose content and parser code haven't changed aren't re-parsed.
+    The cache is kept under `cache_max_bytes` as results are saved.
+
+    With a `raw_store_dir`, parsed filings are kept in a RawStore and their
+    rows reference it (raw_sha256, raw_offset, raw_parser_version) instead of
+    carrying raw_json.
+    """
+    relative_path = file_path.relative_to(root_path)
+    if cache_dir is None:
+        return _parse_file(file_path, relative_path, raw_store_dir)
+
+    timer = StageTimer()
+    with timer('cache'):
+        cache = _parse_cache(cache_dir, cache_max_bytes)
+        data = file_path.read_bytes()
+        # Rows are shaped differently with a raw store, so those results are cached apart.
+        context = relative_path.as_posix() + ('\0raw_store' if raw_store_dir else '')
+        key = cache.key(data, context=context)
+        result = cache.get(key)
+    if result is not None:
+        if raw_store_dir and (result['holdings'] is not None or result['transactions'] is not None):
+            # The rows may come from a run that used another store.
+            with timer('raw_store'):
+                RawStore(raw_store_dir).put(data)
+        result['cache'] = 'hit'
+        result['timings'] = timer.timings
+        return result
+    result = _parse_file(file_path, relative_path, raw_store_dir, data)
+    # Failures may be transient (e.g. a file still being written), so only successes are kept.
+    if not result['error']:
+        cache.put(key, result)
+    result['cache'] = 'miss'
+    result['timings'].update(timer.timings)
+    return result
+
+def _parse_file(file_path: Path, relative_path: Path, raw_store_dir: Optional[str] = None,
+                data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Does the actual work for process_file(). Each stage is timed, and the
+    result records the filing's outcome ('parsed', 'empty', 'skipped',
+    'unknown' or 'error') and size for the run's PipelineMetrics. `data` is
+    the file's content when the caller has already read it.
+    """
+    timer = StageTimer()
+    result = {
+        'path': str(relative_path),
+        'filing_type': None,
+        'holdings': None,
+        'transactions': None,
+        'lines': [f"\nProcessing file: {relative_path}"],
+        'logs': [],
+        'error': False,
+        'cache': None,
+        'outcome': 'parsed',
+        'bytes': 0,
+        'filing_type_rule': None,
+        'timings': timer.timings,
+    }
+    lines = result['lines']
+    logs = result['logs']
+    accession_no = file_path.stem
+    raw_store = RawStore(raw_store_dir) if raw_store_dir else None
+    raw_ref = None
+
+    try:
+        with timer('read'):
+            processor = FileProcessor(file_path) if data is None else FileProcessor.from_bytes(data, file_path)
+        result['bytes'] = len(processor.data)
+        with timer('detect'):
+            filing_type = processor.filing_type
+        result['filing_type'] = filing_type
+        result['filing_type_rule'] = processor.filing_type_rule
+
+        lines.append(f"  - Detected Type: {filing_type}")
+
+        if filing_type == "13F-HR":
+            with timer('parse'):
+                if processor.is_submission:
+                    # Split into <DOCUMENT> parts, each handed to its own parser.
+                    raw_data = sgml.parse_13f_submission(processor.data, str(file_path))
+                else:
+                    # XML information tables are streamed by the parser instead of built into a tree.
+                    tree = None if processor.is_information_table else processor.tree
+                    raw_data = parsers.parse_13f_hr(processor.data, str(file_path), tree)
+
+            # The parser returns None for cover pages without data tables.
+            if raw_data is None:
+                result['outcome'] = 'skipped'
+                lines.append(f"    - Skipped 13F-HR cover page (no data table found).")
+                return result
+
+            if not raw_data:
+                result['outcome'] = 'empty'
+                logs.append((logging.WARNING, f"Parsed 0 holdings from 13F-HR file: {relative_path}"))
+
+            if raw_store is not None and raw_data:
+                with timer('raw_store'):
+                    raw_ref = raw_store.put(processor.data)
+            with timer('metadata'):
+                metadata = processor.metadata
+            with timer('normalize'):
+                df = utils.normalize_13f_data(raw_data, metadata, include_raw_json=raw_store is None,
+                                              raw_ref=raw_ref, accession_no=accession_no)
+            if not df.empty:
+                result['holdings'] = df
+            lines.append(f"    - Parsed as 13F-HR. Found {len(df)} holdings.")
+
+        elif filing_type in ["4", "4/A"]:
+            with timer('parse'):
+                if processor.is_submission:
+                    raw_data = sgml.parse_form4_submission(processor.data)
+                else:
+                    raw_data = parsers.parse_form4(processor.data, processor.tree if processor.is_xml else None)
+            if raw_store is not None and raw_data:
+                with timer('raw_store'):
+                    raw_ref = raw_store.put(processor.data)
+            with timer('metadata'):
+                metadata = processor.metadata
+            with timer('normalize'):
+                df = utils.normalize_form4_data(raw_data, metadata, accession_no, include_raw_json=raw_store is None,
+                                                raw_ref=raw_ref)
+            if not df.empty:
+                result['transactions'] = df
+            else:
+                result['outcome'] = 'empty'
+            lines.append(f"    - Parsed as {filing_type}. Found {len(df)} transactions.")
+
+        elif filing_type == "13F-NT":
+            result['outcome'] = 'skipped'
+            lines.append(f"    - Skipped 13F-NT (Notice) filing.")
+
+        else:
+            result['outcome'] = 'unknown'
+            logs.append((logging.WARNING, f"Unknown or unhandled filing type '{filing_type}' for file: {relative_path}"))
+            lines.append(f"    - WARNING: Unknown or unhandled filing type '{filing_type}'.")
+
+    except Exception as e:
+        result['error'] = True
+        result['outcome'] = 'error'
+        lines.append(f"    - ERROR processing {file_path.name}: {e}")
+        logs.append((logging.ERROR, f"Failed to process {relative_path}\n{traceback.format_exc().rstrip()}"))
+
+    return result
+
+def _process_chunk(chunk: List[Path], root_path: Path, cache_dir: Optional[str] = None,
+                   raw_store_dir: Optional[str] = None,
+                   cache_max_bytes: int = DEFAULT_MAX_BYTES) -> List[Dict[str, Any]]:
+    """Worker entry point: processes one chunk of files."""
+    return [process_file(file_path, root_path, cache_dir, raw_store_dir, cache_max_bytes) for file_path in chunk]
+
+def _balanced_chunks(files: List[Path], num_chunks: int) -> List[List[int]]:
+    """
+    Splits files into chunks of roughly equal total size (in bytes).
+    Returns lists of indexes into `files` so results can be put back in order.
+    """
+    num_chunks = max(1, min(num_chunks, len(files)))
+    # Largest files first, each going to the currently lightest chunk.
+    by_size = sorted(range(len(files)), key=lambda i: files[i].stat().st_size, reverse=True)
+    heap = [(0, chunk_id) for chunk_id in range(num_chunks)]
+    chunks = [[] for _ in range(num_chunks)]
+    for i in by_size:
+        total, chunk_id = heapq.heappop(heap)
+        chunks[chunk_id].append(i)
+        heapq.heappush(heap, (total + files[i].stat().st_size, chunk_id))
+    return [chunk for chunk in chunks if chunk]
+
+def process_files(files: List[Path], root_path: Path, workers: int = 1, cache_dir: Optional[str] = None,
+                  raw_store_dir: Optional[str] = None,
+                  cache_max_bytes: int = DEFAULT_MAX_BYTES) -> List[Dict[str, Any]]:
+    """
+    Processes files serially (workers=1) or over a process pool.
+    Results are always returned in the same order as `files`.
+    """
+    if workers <= 1 or len(files) <= 1:
+        return [process_file(file_path, root_path, cache_dir, raw_store_dir, cache_max_bytes) for file_path in files]
+
+    chunks = _balanced_chunks(files, workers * CHUNKS_PER_WORKER)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_process_chunk, [files[i] for i in chunk], root_path, cache_dir, raw_store_dir,
+                            cache_max_bytes)
+            for chunk in chunks
+        ]
+        for chunk, future in zip(chunks, futures):
+            for i, result in zip(chunk, future.result()):
+                results[i] = result
+    return results
+
+def iter_process_files(files: List[Path], root_path: Path, workers: int = 1, cache_dir: Optional[str] = None,
+                       raw_store_dir: Optional[str] = None,
+                       cache_max_bytes: int = DEFAULT_MAX_BYTES) -> Iterator[Dict[str, Any]]:
+    """
+    Like process_files(), but yields each result, in `files` order, as soon as
+    it and those before it are done. Only CHUNKS_PER_WORKER chunks per worker
+    are in flight, and the next is submitted when one is consumed, so a slow
+    consumer holds the workers back instead of letting results pile up.
+    """
+    if workers <= 1 or len(files) <= 1:
+        for file_path in files:
+            yield process_file(file_path, root_path, cache_dir, raw_store_dir, cache_max_bytes)
+        return
+
+    chunks = (files[i:i + PIPELINE_CHUNK_FILES] for i in range(0, len(files), PIPELINE_CHUNK_FILES))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(chunk: List[Path]):
+            return executor.submit(_process_chunk, chunk, root_path, cache_dir, raw_store_dir, cache_max_bytes)
+
+        pending = deque(submit(chunk) for chunk in itertools.islice(chunks, workers * CHUNKS_PER_WORKER))
+        try:
+            while pending:
+                results = pending.popleft().result()
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(submit(chunk))
+                yield from results
+        finally:
+            for future in pending:
+                future.cancel()
+
+def _report_result(result: Dict[str, Any], metrics: PipelineMetrics, args: argparse.Namespace):
+    """Prints and logs one file's outcome, records it in the metrics and writes its rows to --store."""
+    if not args.quiet:
+        for line in result['lines']:
+            print(line)
+    for level, message in result['logs']:
+        logging.log(level, message)
+    metrics.record_file(result['filing_type'], result['outcome'], result['bytes'], result['timings'])
+    if result['cache']:
+        metrics.count(f"cache_{result['cache']}")
+    if result['filing_type_rule']:
+        # How often the type sniffer needed the full-text scan ('full') instead of the prefix.
+        metrics.count(f"type_sniff_{result['filing_type_rule'].rpartition('@')[2]}")
+    accession_no = Path(result['path']).stem
+    if result['holdings'] is not None:
+        metrics.rows['holdings'] += len(result['holdings'])
+        if args.store:
+            with metrics.stage('write'):
+                store.write_holdings(result['holdings'], args.store, accession_no)
+    if result['transactions'] is not None:
+        metrics.rows['transactions'] += len(result['transactions'])
+        if args.store:
+            with metrics.stage('write'):
+                store.write_transactions(result['transactions'], args.store, accession_no)
+
+def run_pipeline(args: argparse.Namespace, filing_files: List[Path], root_path: Path,
+                 metrics: PipelineMetrics) -> int:
+    """
+    The --pipeline ingest: parser workers feed an IngestWriter thread through a
+    bounded queue, so rows are committed (and checkpointed) while parsing goes
+    on and no more than --queue-size parsed filings are held in memory.
+    Filings already in Ingest_Checkpoints are skipped unless --no-resume.
+    Failed filings aren't checkpointed, so a rerun retries them.
+    Returns the number of files parsed.
+    """
+    pool = loader.connection_pool(args.dsn)
+    try:
+        if args.resume:
+            conn = pool.getconn()
+            try:
+                committed = loader.committed_accessions(conn)
+            finally:
+                pool.putconn(conn)
+            if committed:
+                remaining = [file_path for file_path in filing_files if file_path.stem not in committed]
+                print(f"Resuming: {len(filing_files) - len(remaining)} filing(s) already committed, "
+                      f"{len(remaining)} to go.")
+                metrics.count('resume_skipped', len(filing_files) - len(remaining))
+                filing_files = remaining
+
+        writer = IngestWriter(pool, batch_size=args.batch_size, queue_size=args.queue_size)
+        writer.start()
+        try:
+            for result in iter_process_files(filing_files, root_path, workers=args.workers, cache_dir=args.cache,
+                                             raw_store_dir=args.raw_store,
+                                             cache_max_bytes=args.cache_max_mb * 1024 * 1024):
+                _report_result(result, metrics, args)
+                if not result['error']:
+                    writer.put(result)
+        finally:
+            writer.close()
+
+        for seconds in writer.commits:
+            metrics.observe('load', seconds)
+        metrics.count('pipeline_commits', len(writer.commits))
+        print("\n" + loader.format_stats('holdings', writer.stats['holdings']))
+        print(loader.format_stats('transactions', writer.stats['transactions']))
+        print(f"Committed {writer.filings_committed} filing(s) in {len(writer.commits)} commit(s); "
+              f"parsers waited {writer.blocked_seconds:.2f}s on the writer.")
+        if writer.stats['holdings']['rows_merged']:
+            conn = pool.getconn()
+            try:
+                with metrics.stage('refresh'):
+                    seconds = loader.refresh_latest_holdings(conn)
+            finally:
+                pool.putconn(conn)
+            print(f"Refreshed Latest_Holdings in {seconds:.2f}s")
+    finally:
+        pool.closeall()
+    return len(filing_files)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Parse downloaded 13F and Form 4 filings.")
+    parser.add_argument('--root', default="./sec_parser/parser_error",
+                        help="Directory of filings laid out as <cik>/<form type>/<accession>.xml")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Number of parser processes (default: CPU count, 1 = serial)")
+    parser.add_argument('--load-db', action='store_true',
+                        help="Bulk-load the parsed holdings and transactions into PostgreSQL (needs --raw-store)")
+    parser.add_argument('--dsn', help="PostgreSQL DSN for --load-db (default: DB_* settings in config.py)")
+    parser.add_argument('--batch-size', type=int, default=loader.DEFAULT_BATCH_SIZE,
+                        help="Rows per COPY/merge transaction for --load-db")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Load into PostgreSQL while parsing: a writer thread commits batches of "
+                             "--batch-size rows and checkpoints them, so an interrupted run resumes (needs --raw-store)")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Parsed filings --pipeline holds for the writer before parsing waits")
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help="With --pipeline, also re-process filings an earlier run already committed")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="Reuse parse results for unchanged files from a parse cache in DIR")
+    parser.add_argument('--cache-max-mb', type=int, default=1024,
+                        help="Size limit for --cache; least recently used entries are evicted as results are saved")
+    parser.add_argument('--store', metavar='DIR',
+                        help="Also append each filing's parsed records to the Parquet store in DIR")
+    parser.add_argument('--raw-store', metavar='DIR',
+                        help="Keep each parsed filing once, zstd-compressed, in a content-addressed store in DIR; "
+                             "rows then reference it (raw_sha256, raw_offset, raw_parser_version) instead of carrying raw_json")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Don't print per-file progress (warnings and errors still go to the log)")
+    parser.add_argument('--report-json', metavar='PATH',
+                        help="Write a JSON run report with per-stage timings and per-type counters")
+    parser.add_argument('--metrics-prom', metavar='PATH',
+                        help="Write the run's metrics in Prometheus text format")
+    return parser.parse_args(argv)
+
+def _finish(args: argparse.Namespace, metrics: PipelineMetrics, parsed: int, elapsed: float):
+    """Prints the run summary, evicts the parse cache and writes the reports."""
+    files_per_sec = parsed / elapsed if elapsed > 0 else 0.0
+    print(f"\nParsed {parsed} files in {elapsed:.2f}s "
+          f"({files_per_sec:.1f} files/s, {args.workers} worker(s)).")
+    for line in metrics.summary_lines():
+        print(line)
+    if args.cache:
+        hits, misses = metrics.counters['cache_hit'], metrics.counters['cache_miss']
+        evicted = ParseCache(args.cache, max_bytes=args.cache_max_mb * 1024 * 1024).evict()
+        metrics.count('cache_evicted', evicted)
+        print(f"Parse cache: {hits} hits, {misses} misses, {evicted} entries evicted.")
+    if args.report_json:
+        Path(args.report_json).write_text(metrics.to_json())
+        print(f"Wrote run report to {args.report_json}")
+    if args.metrics_prom:
+        Path(args.metrics_prom).write_text(metrics.to_prometheus())
+        print(f"Wrote Prometheus metrics to {args.metrics_prom}")
+    print(f"\nProcessing complete. Check 'parser_issues.log' for any warnings or errors.")
+
+def main(argv: Optional[List[str]] = None):
     """
     Main function to walk the sampled_filings directory, parse all filings,
     and return two aggregated DataFrames.
     """
+    args = parse_args(argv)
+
     # Configure logging
     logging.basicConfig(
         level=logging.INFO,
@@ -20,12 +413,18 @@ def main():
         filename='parser_issues.log',
         filemode='w' # Overwrite the log file each time
     )
-    
+
     pd.set_option('display.max_columns', None)
     pd.set_option('display.width', 200)
 
+    # Loaded rows don't carry raw_json; without a raw store they couldn't be traced back to their filing.
+    if (args.load_db or args.pipeline) and not args.raw_store:
+        print("Error: --load-db and --pipeline need --raw-store, so loaded rows reference their filing.")
+        logging.critical("--load-db/--pipeline given without --raw-store")
+        return
+
     # Changed path to point to the sample filings for testing
-    root_path = Path("./sec_parser/parser_error")
+    root_path = Path(args.root)
 
     if not root_path.exists():
         print(f"Error: Directory not found at '{root_path.resolve()}'")
@@ -38,64 +437,36 @@ def main():
     print(f"Starting processing of directory: {root_path.resolve()}")
     logging.info(f"Starting processing of directory: {root_path.resolve()}")
 
-    filing_files = [p for p in root_path.rglob('*') if p.is_file()]
-
-    for file_path in filing_files:
-        if file_path.suffix.lower() not in ['.xml', '.txt']:
-            continue
-            
-        accession_no = file_path.stem
-        print(f"\nProcessing file: {file_path.relative_to(root_path)}")
+    # Sorted so the output order doesn't depend on the filesystem or the worker count.
+    filing_files = sorted(
+        p for p in root_path.rglob('*')
+        if p.is_file() and p.suffix.lower() in ['.xml', '.txt']
+    )
 
-        try:
-            processor = FileProcessor(file_path)
-            filing_type = processor.filing_type
-            metadata = processor.metadata
-
-            print(f"  - Detected Type: {filing_type}")
-            
-            raw_data = []
-            df = pd.DataFrame()
-
-            if filing_type == "13F-HR":
-                raw_data = parsers.parse_13f_hr(processor.content, str(file_path))
-                
-                # The parser returns None for cover pages without data tables.
-                if raw_data is None:
-                    print(f"    - Skipped 13F-HR cover page (no data table found).")
-                    continue
-                
-                if not raw_data:
-                    logging.warning(f"Parsed 0 holdings from 13F-HR file: {file_path.relative_to(root_path)}")
-
-                df = utils.normalize_13f_data(raw_data, metadata)
-                if not df.empty:
-                    all_holdings.append(df)
-                print(f"    - Parsed as 13F-HR. Found {len(df)} holdings.")
-            
-            elif filing_type in ["4", "4/A"]:
-                raw_data = parsers.parse_form4(processor.content)
-                df = utils.normalize_form4_data(raw_data, metadata, accession_no)
-                if not df.empty:
-                    all_transactions.append(df)
-                print(f"    - Parsed as {filing_type}. Found {len(df)} transactions.")
-
-            elif filing_type == "13F-NT":
-                print(f"    - Skipped 13F-NT (Notice) filing.")
+    metrics = PipelineMetrics()
+    if args.pipeline:
+        start_time = time.perf_counter()
+        parsed = run_pipeline(args, filing_files, root_path, metrics)
+        _finish(args, metrics, parsed, time.perf_counter() - start_time)
+        return
 
-            else:
-                logging.warning(f"Unknown or unhandled filing type '{filing_type}' for file: {file_path.relative_to(root_path)}")
-                print(f"    - WARNING: Unknown or unhandled filing type '{filing_type}'.")
+    start_time = time.perf_counter()
+    results = process_files(filing_files, root_path, workers=args.workers, cache_dir=args.cache,
+                            raw_store_dir=args.raw_store, cache_max_bytes=args.cache_max_mb * 1024 * 1024)
+    elapsed = time.perf_counter() - start_time
 
-        except Exception as e:
-            print(f"    - ERROR processing {file_path.name}: {e}")
-            logging.error(f"Failed to process {file_path.relative_to(root_path)}", exc_info=True)
+    for result in results:
+        _report_result(result, metrics, args)
+        if result['holdings'] is not None:
+            all_holdings.append(result['holdings'])
+        if result['transactions'] is not None:
+            all_transactions.append(result['transactions'])
 
     # --- Aggregate and display final results ---
     final_holdings_df = pd.DataFrame()
     if all_holdings:
         final_holdings_df = pd.concat(all_holdings, ignore_index=True)
-    
+
     final_transactions_df = pd.DataFrame()
     if all_transactions:
         final_transactions_df = pd.concat(all_transactions, ignore_index=True)
@@ -116,7 +487,23 @@ def main():
     else:
         print("No Form 4/4A transaction data found.")
 
-    print(f"\nProcessing complete. Check 'parser_issues.log' for any warnings or errors.")
+    if args.load_db:
+        conn = loader.connect(args.dsn)
+        try:
+            with metrics.stage('load'):
+                stats = loader.load_holdings(conn, final_holdings_df, args.batch_size)
+            print("\n" + loader.format_stats('holdings', stats))
+            if stats['rows_merged']:
+                with metrics.stage('refresh'):
+                    seconds = loader.refresh_latest_holdings(conn)
+                print(f"Refreshed Latest_Holdings in {seconds:.2f}s")
+            with metrics.stage('load'):
+                stats = loader.load_transactions(conn, final_transactions_df, args.batch_size)
+            print(loader.format_stats('transactions', stats))
+        finally:
+            conn.close()
+
+    _finish(args, metrics, len(filing_files), elapsed)
 
 
 if __name__ == '__main__':
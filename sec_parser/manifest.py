@@ -0,0 +1,96 @@
+import sqlite3
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterable
+
+# Status values stored in the manifest.
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    accession_no TEXT PRIMARY KEY,
+    cik TEXT NOT NULL,
+    form_type TEXT NOT NULL,
+    filing_date TEXT,
+    status TEXT NOT NULL,
+    source_url TEXT,
+    path TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (status);
+"""
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+class DownloadManifest:
+    """
+    Persistent record of every filing the downloader has seen, keyed by
+    accession number. Rows are marked 'pending' before a download starts and
+    'done' or 'failed' when it finishes, so after a crash the rows still
+    'pending' are exactly the downloads that need to be redone.
+
+    Not thread-safe: only the thread that created it should write to it.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, accession_no: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM downloads WHERE accession_no = ?", (accession_no,)).fetchone()
+        return dict(row) if row else None
+
+    def statuses(self) -> Dict[str, str]:
+        """Returns {accession_no: status} for every filing in the manifest."""
+        return dict(self.conn.execute("SELECT accession_no, status FROM downloads"))
+
+    def mark_pending(self, jobs: Iterable[Dict[str, Any]]):
+        """Records that downloads are about to start (one transaction for the batch)."""
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO downloads (accession_no, cik, form_type, filing_date, status, path, updated_at)
+                VALUES (:accession_number, :cik, :form_type, :filing_date, 'pending', :save_path, :now)
+                ON CONFLICT (accession_no) DO UPDATE SET status = 'pending', path = excluded.path,
+                    filing_date = excluded.filing_date, updated_at = excluded.updated_at
+                """,
+                [dict(job, now=now) for job in jobs],
+            )
+
+    def mark_done(self, accession_no: str, source_url: Optional[str], path: str, size: int, sha256: str):
+        with self.conn:
+            self.conn.execute(
+                """
+                UPDATE downloads SET status = 'done', source_url = ?, path = ?, size = ?, sha256 = ?,
+                    attempts = attempts + 1, error = NULL, updated_at = ?
+                WHERE accession_no = ?
+                """,
+                (source_url, path, size, sha256, _now(), accession_no),
+            )
+
+    def mark_failed(self, accession_no: str, error: str):
+        with self.conn:
+            self.conn.execute(
+                """
+                UPDATE downloads SET status = 'failed', attempts = attempts + 1, error = ?, updated_at = ?
+                WHERE accession_no = ?
+                """,
+                (error, _now(), accession_no),
+            )
+
+    def summary(self) -> Dict[str, int]:
+        """Returns the number of filings in each status."""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM downloads GROUP BY status"))
@@ -0,0 +1,170 @@
+import json
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+# --- CONFIGURATION ---
+# Upper bounds (seconds) of the stage duration histogram buckets.
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+METRIC_PREFIX = 'sec_parser'
+
+class StageTimer:
+    """
+    Times the stages of processing one filing. Plain data (a dict of seconds
+    per stage), so it can travel back from a worker process with the result.
+    """
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect_left(DURATION_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None past the last bound)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(DURATION_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+class PipelineMetrics:
+    """
+    Run-wide instrumentation: a duration histogram per stage (read, detect,
+    metadata, parse, normalize, write, load, ...), counters of filings by type
+    and outcome, and bytes processed per type. Exported as a JSON run report or
+    in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.stages: Dict[str, _Histogram] = {}
+        self.files: Counter = Counter()       # (filing_type, outcome) -> filings
+        self.bytes: Counter = Counter()       # filing_type -> bytes
+        self.rows: Counter = Counter()        # 'holdings' / 'transactions' -> rows
+        self.counters: Counter = Counter()    # anything else, e.g. cache hits
+
+    def observe(self, stage: str, seconds: float):
+        self.stages.setdefault(stage, _Histogram()).observe(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times a block as one observation of stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def record_file(self, filing_type: Optional[str], outcome: str, size: int = 0,
+                    timings: Optional[Dict[str, float]] = None):
+        filing_type = filing_type or 'unknown'
+        self.files[(filing_type, outcome)] += 1
+        self.bytes[filing_type] += size
+        for stage, seconds in (timings or {}).items():
+            self.observe(stage, seconds)
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._start
+        total_files = sum(self.files.values())
+        total_bytes = sum(self.bytes.values())
+        files: Dict[str, Dict[str, int]] = {}
+        for (filing_type, outcome), n in sorted(self.files.items()):
+            files.setdefault(filing_type, {})[outcome] = n
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'seconds': round(elapsed, 4),
+            'files': total_files,
+            'bytes': total_bytes,
+            'files_per_sec': round(total_files / elapsed, 2) if elapsed > 0 else 0.0,
+            'mb_per_sec': round(total_bytes / (1024 * 1024) / elapsed, 3) if elapsed > 0 else 0.0,
+            'files_by_type': files,
+            'bytes_by_type': dict(self.bytes),
+            'rows': dict(self.rows),
+            'counters': dict(self.counters),
+            'stages': {
+                name: {
+                    'count': h.count, 'seconds': round(h.sum, 6), 'max_seconds': round(h.max, 6),
+                    'p50_seconds_le': h.quantile(0.5), 'p99_seconds_le': h.quantile(0.99),
+                }
+                for name, h in self.stages.items()
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.report(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """The metrics in Prometheus text format (e.g. for node_exporter's textfile collector)."""
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_files_total Filings processed, by filing type and outcome.",
+            f"# TYPE {p}_files_total counter",
+        ]
+        for (filing_type, outcome), n in sorted(self.files.items()):
+            lines.append(f'{p}_files_total{{filing_type="{_escape(filing_type)}",outcome="{outcome}"}} {n}')
+        lines += [f"# HELP {p}_bytes_total Bytes of filings processed, by filing type.",
+                  f"# TYPE {p}_bytes_total counter"]
+        for filing_type, n in sorted(self.bytes.items()):
+            lines.append(f'{p}_bytes_total{{filing_type="{_escape(filing_type)}"}} {n}')
+        lines += [f"# HELP {p}_rows_total Normalized rows produced, by table.",
+                  f"# TYPE {p}_rows_total counter"]
+        for table, n in sorted(self.rows.items()):
+            lines.append(f'{p}_rows_total{{table="{table}"}} {n}')
+        for name, n in sorted(self.counters.items()):
+            lines += [f"# TYPE {p}_{name}_total counter", f"{p}_{name}_total {n}"]
+
+        lines += [f"# HELP {p}_stage_duration_seconds Time spent per pipeline stage.",
+                  f"# TYPE {p}_stage_duration_seconds histogram"]
+        for name, h in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, n in zip(DURATION_BUCKETS + (float('inf'),), h.buckets):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{p}_stage_duration_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+            lines.append(f'{p}_stage_duration_seconds_count{{stage="{name}"}} {h.count}')
+        lines.append(f"# TYPE {p}_run_seconds gauge")
+        lines.append(f"{p}_run_seconds {time.perf_counter() - self._start:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def summary_lines(self) -> List[str]:
+        """Short human-readable summary: time per stage, then filings by outcome."""
+        lines = []
+        total = sum(h.sum for h in self.stages.values()) or 1.0
+        for name, h in sorted(self.stages.items(), key=lambda item: -item[1].sum):
+            lines.append(f"  {name:<10} {h.sum:8.2f}s {h.sum / total:6.1%}  ({h.count} calls, max {h.max * 1000:.1f}ms)")
+        outcomes = Counter()
+        for (_, outcome), n in self.files.items():
+            outcomes[outcome] += n
+        lines.append("  " + ", ".join(f"{n} {outcome}" for outcome, n in sorted(outcomes.items())))
+        return lines
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
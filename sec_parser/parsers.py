@@ -1,12 +1,43 @@
 from lxml import etree, html
 import re
-from typing import List, Dict, Any, Optional
+from html import unescape
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Union, BinaryIO
+
+# --- CONFIGURATION ---
+# Size of the pieces an in-memory XML document is fed to lxml in.
+FEED_CHUNK_BYTES = 1024 * 1024
+# Rows reference their parser record in the RawStore by position (raw_offset),
+# stored with this version. Bump it with any change that adds, drops or
+# reorders the records parsed from a filing, so stale positions are refused
+# instead of resolving to the wrong record. (cache.parser_version() changes
+# with any edit to the parsing code; this only when record positions may.)
+PARSER_VERSION = 1
 
 # --- Helper Functions ---
 def _clean_value(value: Optional[str]) -> Optional[str]:
     if not value: return None
     return re.sub(r'[$,]', '', value).strip()
 
+_XML_START = re.compile(r'\s*(?:<\?xml|(?i:<informationtable|<ownershipdocument))')
+_XML_START_BYTES = re.compile(_XML_START.pattern.encode())
+
+# A document as text or as raw bytes (bytes, or a buffer such as an mmap).
+Content = Union[str, bytes, Any]
+
+def looks_like_xml(content: Content) -> bool:
+    """True if the document starts with an XML declaration, or an information table or Form 4 root."""
+    pattern = _XML_START if isinstance(content, str) else _XML_START_BYTES
+    return pattern.match(content) is not None
+
+def decode_text(content: Content) -> str:
+    """The document as text: UTF-8 if it decodes, otherwise latin-1."""
+    if isinstance(content, str):
+        return content
+    try:
+        return str(content, 'utf-8')
+    except UnicodeDecodeError:
+        return str(content, 'latin-1')
+
 # --- 13F-HR Parser ---
 
 def _parse_13f_text_table(table_text: str) -> List[Dict[str, Any]]:
@@ -53,43 +84,96 @@ def _parse_13f_text_table(table_text: str) -> List[Dict[str, Any]]:
             'value': _clean_value(other_cols[0]),
             'sshPrnamt': _clean_value(other_cols[1]),
         }
+        # SH/PRN and PUT/CALL, when the table has those columns.
+        for col in other_cols[2:5]:
+            col = col.strip().upper()
+            if col in ('SH', 'PRN'):
+                holding.setdefault('sshPrnamtType', col)
+            elif col in ('PUT', 'CALL'):
+                holding.setdefault('putCall', col)
         holdings.append(holding)
             
     return holdings
 
-def _parse_13f_xml_infotable(xml_content: str) -> List[Dict[str, Any]]:
-    """Parses the modern form13fInfoTable.xml format."""
+def _info_table_record(info_table: etree._Element) -> Dict[str, Any]:
+    """Extracts one holding from an <infoTable> element (any namespace)."""
+    data = {
+        'nameOfIssuer': info_table.findtext('{*}nameOfIssuer'),
+        'cusip': info_table.findtext('{*}cusip'),
+        'value': _clean_value(info_table.findtext('{*}value')),
+        'sshPrnamt': _clean_value(info_table.findtext('.//{*}shrsOrPrnAmt/{*}sshPrnamt')),
+        'sshPrnamtType': info_table.findtext('.//{*}shrsOrPrnAmt/{*}sshPrnamtType'),
+    }
+    # Only option lines have a putCall element.
+    put_call = info_table.findtext('{*}putCall')
+    if put_call:
+        data['putCall'] = put_call
+    return {k: v.strip() if isinstance(v, str) else v for k, v in data.items()}
+
+def iter_13f_xml_infotable(source: Union[str, BinaryIO]) -> Iterator[Dict[str, Any]]:
+    """
+    Streams holdings from an XML information table, one <infoTable> at a time.
+    `source` is a file path or a binary file-like object. Each element is
+    cleared once it has been read, so memory stays flat however large the
+    table is. Raises etree.XMLSyntaxError if the document is malformed.
+    """
+    for _, info_table in etree.iterparse(source, events=('end',), tag='{*}infoTable'):
+        yield _info_table_record(info_table)
+        info_table.clear(keep_tail=True)
+        # Drop the already-processed siblings still referenced by the root.
+        while info_table.getprevious() is not None:
+            del info_table.getparent()[0]
+
+def iter_13f_xml_buffer(buffer: Any, chunk_bytes: int = FEED_CHUNK_BYTES) -> Iterator[Dict[str, Any]]:
+    """
+    Like iter_13f_xml_infotable, for a document already in memory: bytes, an
+    mmap or a memoryview slice of either. It's fed to an XMLPullParser a chunk
+    at a time, so only one chunk is ever copied.
+    """
+    parser = etree.XMLPullParser(events=('end',), tag='{*}infoTable')
+    with memoryview(buffer) as view:
+        for start in range(0, len(view), chunk_bytes):
+            parser.feed(view[start:start + chunk_bytes].tobytes())
+            for _, info_table in parser.read_events():
+                yield _info_table_record(info_table)
+                info_table.clear(keep_tail=True)
+                while info_table.getprevious() is not None:
+                    del info_table.getparent()[0]
+    parser.close()
+    for _, info_table in parser.read_events():
+        yield _info_table_record(info_table)
+
+def _parse_13f_xml_infotable(xml_content: Content, root: Optional[etree._Element] = None) -> List[Dict[str, Any]]:
+    """
+    Parses the modern form13fInfoTable.xml format.
+    Uses `root` if the document has already been parsed, otherwise streams it
+    straight from the raw bytes.
+    """
+    if root is not None:
+        return [_info_table_record(info_table) for info_table in root.iterdescendants('{*}infoTable')]
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
     try:
-        clean_xml = re.sub(r'\sxmlns="[^"]+"', '', xml_content, count=1)
-        root = etree.fromstring(clean_xml.encode('utf-8'))
+        return list(iter_13f_xml_buffer(xml_content))
     except etree.XMLSyntaxError: return []
 
-    holdings = []
-    for info_table in root.findall('.//infoTable'):
-        data = {
-            'nameOfIssuer': info_table.findtext('nameOfIssuer'),
-            'cusip': info_table.findtext('cusip'),
-            'value': _clean_value(info_table.findtext('value')),
-            'sshPrnamt': _clean_value(info_table.findtext('.//shrsOrPrnAmt/sshPrnamt')),
-            'sshPrnamtType': info_table.findtext('.//shrsOrPrnAmt/sshPrnamtType'),
-        }
-        holdings.append({k: v.strip() if isinstance(v, str) else v for k, v in data.items()})
-    return holdings
-
-def parse_13f_hr(content: str, file_path_str: str) -> Optional[List[Dict[str, Any]]]:
+def parse_13f_hr(content: Content, file_path_str: str, root: Optional[etree._Element] = None) -> Optional[List[Dict[str, Any]]]:
     """
-    Dispatches 13F-HR parsing based on content.
+    Dispatches 13F-HR parsing based on content, given as text or as the raw
+    bytes (see FileProcessor.data), which lxml parses without a decode/encode
+    round trip.
+    `root` is the already-parsed document (see FileProcessor.tree), if available.
     Returns a list of holdings, an empty list if no holdings are found,
     or None if the file is identified as a cover page without a data table.
     """
-    stripped_content = content.strip()
     # Check for XML declaration or root element of an information table
-    if stripped_content.startswith('<?xml') or stripped_content.lower().startswith('<informationtable'):
-        return _parse_13f_xml_infotable(content)
+    if looks_like_xml(content):
+        return _parse_13f_xml_infotable(content, root)
 
     # Attempt to parse as HTML and find a text-based table
     try:
-        root = html.fromstring(content.encode('utf-8'))
+        if root is None:
+            root = html.fromstring(content.encode('utf-8') if isinstance(content, str) else bytes(content))
         for element in root.xpath('//table | //pre'):
             text = element.text_content()
             if 'CUSIP' in text.upper() and 'VALUE' in text.upper():
@@ -97,6 +181,7 @@ def parse_13f_hr(content: str, file_path_str: str) -> Optional[List[Dict[str, An
     except etree.XMLSyntaxError:
         # Fallback for content that isn't valid HTML.
         # Use regex to find the table text, as the document may be malformed.
+        content = decode_text(content)
         table_match = re.search(r'<TABLE>([\s\S]*?)<\/TABLE>', content, re.I)
         if table_match:
             table_text = table_match.group(1)
@@ -107,7 +192,7 @@ def parse_13f_hr(content: str, file_path_str: str) -> Optional[List[Dict[str, An
             return _parse_13f_text_table(content)
 
     # If no holdings table is found, check if it's just a cover page
-    upper_content = content.upper()
+    upper_content = decode_text(content).upper()
     if 'FORM 13F COVER PAGE' in upper_content or 'FORM 13F SUMMARY PAGE' in upper_content:
         return None  # Signal that this is a cover page, not a parsing failure
 
@@ -115,42 +200,243 @@ def parse_13f_hr(content: str, file_path_str: str) -> Optional[List[Dict[str, An
 
 # --- Form 4 Parser ---
 
-def parse_form4(content: str) -> List[Dict[str, Any]]:
-    """Parses a Form 4 or 4/A filing."""
-    try:
-        root = html.fromstring(content.encode('utf-8'))
-    except etree.XMLSyntaxError: return []
+# ownershipDocument elements whose text is a yes/no flag ('1'/'0' or 'true'/'false').
+_FORM4_FLAGS = {'isDirector': 'is_director', 'isOfficer': 'is_officer',
+                'isTenPercentOwner': 'is_ten_percent_owner', 'isOther': 'is_other'}
+# ownershipDocument element -> output key, for both transaction tables.
+_FORM4_FIELDS = {
+    'securityTitle': 'security_title',
+    'transactionDate': 'transaction_date',
+    'transactionCode': 'transaction_code',
+    'transactionShares': 'shares_transacted',
+    'transactionPricePerShare': 'price_per_share',
+    'transactionAcquiredDisposedCode': 'acquired_disposed',
+    'sharesOwnedFollowingTransaction': 'shares_owned_after',
+    'directOrIndirectOwnership': 'ownership',
+    'conversionOrExercisePrice': 'conversion_price',
+    'exerciseDate': 'exercise_date',
+    'expirationDate': 'expiration_date',
+    'underlyingSecurityTitle': 'underlying_title',
+    'underlyingSecurityShares': 'underlying_shares',
+}
+_FORM4_NUMBERS = ('shares_transacted', 'price_per_share', 'shares_owned_after', 'conversion_price', 'underlying_shares')
+_FORM4_TABLES = {'nonDerivativeTable': ('nonDerivativeTransaction', 'non-derivative'),
+                 'derivativeTable': ('derivativeTransaction', 'derivative')}
 
-    if root.xpath('.//nonderivativetransaction'):
-        transactions = []
-        base_info = {'issuer_ticker': root.findtext('.//issuer/issuertradingsymbol')}
-        for tx in root.findall('.//nonDerivativeTransaction'):
-            data = base_info.copy()
-            data.update({
-                'security_title': tx.findtext('.//securitytitle/value'),
-                'transaction_date': tx.findtext('.//transactiondate/value'),
-                'transaction_code': tx.findtext('.//transactioncoding/transactioncode'),
-                'shares_transacted': _clean_value(tx.findtext('.//transactionamounts/transactionshares/value')),
-                'price_per_share': _clean_value(tx.findtext('.//transactionamounts/transactionpricepershare/value')),
-                'shares_owned_after': _clean_value(tx.findtext('.//posttransactionamounts/sharesownedfollowingtransaction/value')),
-            })
-            transactions.append(data)
-        return transactions
+def _localname(element: etree._Element) -> str:
+    tag = element.tag
+    return tag[tag.index('}') + 1:] if tag[0] == '{' else tag
+
+def _flatten(element: etree._Element) -> Dict[str, str]:
+    """
+    The leaf values under an ownershipDocument element, keyed by element name.
+    Values wrapped in <value> (e.g. <transactionDate><value>) are keyed by the
+    wrapper; footnote references are dropped.
+    """
+    values = {}
+    for leaf in element.iter(etree.Element):
+        text = leaf.text
+        if text is None or len(leaf) or not text.strip():
+            continue
+        name = _localname(leaf)
+        if name == 'footnoteId':
+            continue
+        if name == 'value':
+            name = _localname(leaf.getparent())
+        values.setdefault(name, text.strip())
+    return values
+
+def _flag(value: Optional[str]) -> bool:
+    return value is not None and value.strip().lower() in ('1', 'true')
+
+def _owner(cik: Optional[str], name: Optional[str], flags: Dict[str, bool],
+           officer_title: Optional[str], other_text: Optional[str]) -> Dict[str, Any]:
+    owner = {'reporting_owner_cik': cik, 'reporting_owner_name': name}
+    owner.update(flags)
+    owner['officer_title'] = officer_title or ''
+    owner['other_text'] = other_text or ''
+    return owner
+
+def _form4_records(issuer: Dict[str, Any], owners: List[Dict[str, Any]],
+                   transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    One record per transaction: the transaction, the issuer and the first
+    reporting owner, whose fields normalize_form4_data reads. Joint filings
+    list every owner under 'reporting_owners'.
+    """
+    base = dict(issuer)
+    if owners:
+        base.update(owners[0])
+    if len(owners) > 1:
+        base['reporting_owners'] = [{'cik': o['reporting_owner_cik'], 'name': o['reporting_owner_name'],
+                                     'relation': [k for k in _FORM4_FLAGS.values() if o.get(k)]}
+                                    for o in owners]
+    records = []
+    for transaction in transactions:
+        record = base.copy()
+        record.update(transaction)
+        records.append(record)
+    return records
+
+def _parse_form4_xml(root: etree._Element) -> List[Dict[str, Any]]:
+    """
+    Parses an ownershipDocument (the XML Form 4) in one walk over its
+    top-level sections: the issuer, every reporting owner and its
+    relationship, then both transaction tables. Holdings rows (positions
+    reported without a transaction) are skipped.
+    """
+    issuer: Dict[str, Any] = {'issuer_cik': None, 'issuer_name': None, 'issuer_ticker': None}
+    owners: List[Dict[str, Any]] = []
+    transactions: List[Dict[str, Any]] = []
+    for section in root.iterchildren(etree.Element):
+        name = _localname(section)
+        if name == 'issuer':
+            values = _flatten(section)
+            issuer = {'issuer_cik': values.get('issuerCik'), 'issuer_name': values.get('issuerName'),
+                      'issuer_ticker': values.get('issuerTradingSymbol')}
+        elif name == 'reportingOwner':
+            values = _flatten(section)
+            flags = {key: _flag(values.get(tag)) for tag, key in _FORM4_FLAGS.items()}
+            owners.append(_owner(values.get('rptOwnerCik'), values.get('rptOwnerName'), flags,
+                                 values.get('officerTitle'), values.get('otherText')))
+        elif name in _FORM4_TABLES:
+            row_tag, table = _FORM4_TABLES[name]
+            for row in section.iterchildren(etree.Element):
+                if _localname(row) != row_tag:
+                    continue
+                values = _flatten(row)
+                transaction = {'table': table}
+                for tag, key in _FORM4_FIELDS.items():
+                    value = values.get(tag)
+                    transaction[key] = _clean_value(value) if key in _FORM4_NUMBERS else value
+                transactions.append(transaction)
+    return _form4_records(issuer, owners, transactions)
+
+# EDGAR's HTML rendering of a Form 4 (its XSL view of the ownershipDocument).
+_F4_OWNER_LABEL = 'Name and Address of Reporting Person'
+_F4_ISSUER_LABEL = 'Issuer Name'
+_F4_RELATIONSHIP_LABEL = 'Relationship of Reporting Person(s) to Issuer'
+_F4_TABLE_I_LABEL = 'Table I - Non-Derivative'
+_F4_TABLE_II_LABEL = 'Table II - Derivative'
+_F4_COMPANY_LINK = re.compile(r'CIK=(\d+)"[^>]*>([^<]*)</a>')
+_F4_TICKER = re.compile(r'\s*\[(.*?)\]', re.S)
+# Row and cell contents, matched up to the closing tag without a lazy .*? (which
+# retries the closing tag at every character).
+_HTML_ROW = re.compile(r'<tr[^>]*>([^<]*(?:<(?!/tr>)[^<]*)*)</tr>')
+_HTML_CELL = re.compile(r'<td[^>]*>([^<]*(?:<(?!/td>)[^<]*)*)</td>')
+# Footnote markers (with their text) and any other tag, removed in one pass.
+_HTML_MARKUP = re.compile(r'<sup>.*?</sup>|<[^>]*>', re.S)
+_F4_RELATIONSHIP_BOXES = {'Director': 'is_director', 'Officer (give title below)': 'is_officer',
+                          '10% Owner': 'is_ten_percent_owner', 'Other (specify below)': 'is_other'}
+
+def _cell_text(cell: str) -> str:
+    """A table cell's text: footnote markers and tags removed, whitespace collapsed."""
+    if '<' in cell:
+        cell = _HTML_MARKUP.sub('', cell)
+    if '&' in cell:
+        cell = unescape(cell)
+    return ' '.join(cell.split())
+
+def _html_section(text: str, label: str, start: str, end: str, pos: int = 0) -> Optional[str]:
+    """The text between the first `start` and `end` markers after `label`, or None."""
+    pos = text.find(label, pos)
+    if pos == -1:
+        return None
+    begin = text.find(start, pos)
+    if begin == -1:
+        return None
+    begin += len(start)
+    finish = text.find(end, begin)
+    return text[begin:] if finish == -1 else text[begin:finish]
+
+def _html_rows(tbody: Optional[str]) -> Iterator[List[str]]:
+    for row in _HTML_ROW.findall(tbody or ''):
+        yield [_cell_text(cell) for cell in _HTML_CELL.findall(row)]
+
+def _html_relationship(block: Optional[str]) -> Tuple[Dict[str, bool], str, str]:
+    """The checked boxes of a '5. Relationship' block, and the officer title / other text below them."""
+    cells = _HTML_CELL.findall(block or '')
+    flags = {key: False for key in _F4_RELATIONSHIP_BOXES.values()}
+    # The first two rows: [mark] label [mark] label, with plain-text labels.
+    for mark, label in zip(cells[0:8:2], cells[1:8:2]):
+        key = _F4_RELATIONSHIP_BOXES.get(' '.join(label.split()))
+        if key:
+            flags[key] = _cell_text(mark) == 'X'
+    # The third row: [ ] officer title [ ] other text
+    if len(cells) < 12:
+        return flags, '', ''
+    return flags, _cell_text(cells[9]), _cell_text(cells[11])
+
+def _parse_form4_html(text: str) -> List[Dict[str, Any]]:
+    """
+    Parses EDGAR's HTML rendering of a Form 4 by scanning for its box labels
+    instead of building a tree: the rendering is generated from the XML by a
+    fixed stylesheet, so the boxes and table columns are always laid out the
+    same way.
+    """
+    issuer: Dict[str, Any] = {'issuer_cik': None, 'issuer_name': None, 'issuer_ticker': None}
+    pos = text.find(_F4_ISSUER_LABEL)
+    match = _F4_COMPANY_LINK.search(text, pos) if pos != -1 else None
+    if match:
+        ticker = _F4_TICKER.match(text, match.end())
+        issuer = {'issuer_cik': match.group(1), 'issuer_name': unescape(match.group(2)).strip() or None,
+                  'issuer_ticker': (_cell_text(ticker.group(1)) if ticker else '') or None}
+
+    # Each owner's relationship box is the first one after its name; joint
+    # filings repeat the first owner in the list that follows the tables.
+    owners: Dict[str, Dict[str, Any]] = {}
+    pos = text.find(_F4_OWNER_LABEL)
+    while pos != -1:
+        match = _F4_COMPANY_LINK.search(text, pos)
+        if match is None:
+            break
+        cik = match.group(1)
+        relationship = _html_section(text, _F4_RELATIONSHIP_LABEL, '<table', '</table>', match.end())
+        flags, officer_title, other_text = _html_relationship(relationship)
+        owners.setdefault(cik, _owner(cik, unescape(match.group(2)).strip() or None, flags,
+                                      officer_title, other_text))
+        pos = text.find(_F4_OWNER_LABEL, match.end())
 
     transactions = []
-    issuer_ticker_match = re.search(r'Ticker or Trading Symbol.*\[\s*(.*?)\s*\]', content)
-    issuer_ticker = issuer_ticker_match.group(1) if issuer_ticker_match else None
-    table1 = root.xpath('//table[.//b[contains(text(), "Table I - Non-Derivative")]]')
-    if table1:
-        for row in table1[0].xpath('.//tr[count(td) > 7]'):
-            cells = row.xpath('.//td')
-            transactions.append({
-                'issuer_ticker': issuer_ticker,
-                'security_title': cells[0].text_content().strip(),
-                'transaction_date': cells[1].text_content().strip(),
-                'transaction_code': cells[3].text_content().strip(),
-                'shares_transacted': _clean_value(cells[5].text_content()),
-                'price_per_share': _clean_value(cells[7].text_content()),
-                'shares_owned_after': _clean_value(cells[8].text_content()),
-            })
-    return transactions
+    for cells in _html_rows(_html_section(text, _F4_TABLE_I_LABEL, '<tbody>', '</tbody>')):
+        # Title, date, deemed date, code, V, amount, (A)/(D), price, owned after, D/I, nature
+        if len(cells) < 11 or not (cells[1] or cells[3]):
+            continue
+        transactions.append({
+            'table': 'non-derivative', 'security_title': cells[0], 'transaction_date': cells[1],
+            'transaction_code': cells[3] or None, 'shares_transacted': _clean_value(cells[5]),
+            'price_per_share': _clean_value(cells[7]), 'acquired_disposed': cells[6] or None,
+            'shares_owned_after': _clean_value(cells[8]), 'ownership': cells[9] or None,
+        })
+    for cells in _html_rows(_html_section(text, _F4_TABLE_II_LABEL, '<tbody>', '</tbody>')):
+        # Title, conversion price, date, deemed date, code, V, (A), (D), exercisable, expiration,
+        # underlying title, underlying amount, price, owned after, D/I, nature
+        if len(cells) < 16 or not (cells[2] or cells[4]):
+            continue
+        transactions.append({
+            'table': 'derivative', 'security_title': cells[0], 'transaction_date': cells[2],
+            'transaction_code': cells[4] or None, 'shares_transacted': _clean_value(cells[6] or cells[7]),
+            'price_per_share': _clean_value(cells[12]),
+            'acquired_disposed': 'A' if cells[6] else ('D' if cells[7] else None),
+            'shares_owned_after': _clean_value(cells[13]), 'ownership': cells[14] or None,
+            'conversion_price': _clean_value(cells[1]), 'exercise_date': cells[8] or None,
+            'expiration_date': cells[9] or None, 'underlying_title': cells[10] or None,
+            'underlying_shares': _clean_value(cells[11]),
+        })
+    return _form4_records(issuer, list(owners.values()), transactions)
+
+def parse_form4(content: Content, root: Optional[etree._Element] = None) -> List[Dict[str, Any]]:
+    """
+    Parses a Form 4 or 4/A filing, given as text or as raw bytes, into one
+    record per transaction (both tables) carrying the issuer and the
+    reporting owner's name and relationship.
+    `root` is the already-parsed XML document (see FileProcessor.tree), if
+    available; HTML renderings are scanned as text and need no tree.
+    """
+    if root is None and looks_like_xml(content):
+        try:
+            root = etree.fromstring(content.encode('utf-8') if isinstance(content, str) else bytes(content))
+        except etree.XMLSyntaxError: return []
+    if root is not None and _localname(root) == 'ownershipDocument':
+        return _parse_form4_xml(root)
+    return _parse_form4_html(decode_text(content))
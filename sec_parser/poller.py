@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from .downloader import EdgarClient, DEFAULT_USER_AGENT, MAX_REQUESTS_PER_SECOND
+from .form_index import EDGAR_ROOT_URL, FORM4_TYPES
+from .processor import FileProcessor
+from . import parsers
+from . import sgml
+from . import utils
+
+# --- CONFIGURATION ---
+# EDGAR's "latest filings" feed, newest first.
+CURRENT_FEED_URL = ("https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=4&company=&dateb="
+                    "&owner=include&start={start}&count={count}&output=atom")
+FEED_PAGE_SIZE = 100
+# When a whole page is new, older pages are read too (up to this many) so a burst isn't missed.
+MAX_FEED_PAGES = 5
+POLL_SECONDS = 10.0
+# Accession numbers remembered for deduplication; the oldest are forgotten first.
+SEEN_MAX = 50_000
+# Filings fetched and parsed at once.
+FETCH_CONCURRENCY = 4
+# A filing that fails to fetch or parse is tried again on the following polls,
+# up to this many attempts in all, before it's given up on.
+MAX_ATTEMPTS = 3
+LATENCY_SAMPLES = 100_000
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+class FeedEntry:
+    """One entry of the current-filings feed. A Form 4 is listed once per role ('Reporting', 'Issuer')."""
+    def __init__(self, accession_no: str, form_type: str, cik: Optional[str], role: Optional[str],
+                 accepted: Optional[pd.Timestamp]):
+        self.accession_no = accession_no
+        self.form_type = form_type
+        self.cik = cik
+        self.role = role
+        self.accepted = accepted
+
+    def __repr__(self) -> str:
+        return f"FeedEntry({self.accession_no!r}, {self.form_type!r}, cik={self.cik!r}, role={self.role!r})"
+
+def parse_feed(data: bytes) -> List[FeedEntry]:
+    """The entries of an Atom feed page, in feed order (newest first)."""
+    root = etree.fromstring(data)
+    entries = []
+    for entry in root.iterfind(f'{ATOM}entry'):
+        entry_id = entry.findtext(f'{ATOM}id') or ''
+        accession_no = entry_id.rsplit('=', 1)[-1].strip()
+        category = entry.find(f'{ATOM}category')
+        form_type = category.get('term') if category is not None else ''
+        # e.g. "4 - Doe John (0001234567) (Reporting)"
+        title = entry.findtext(f'{ATOM}title') or ''
+        parts = [part.rstrip(')') for part in title.split(' (')[1:]]
+        cik = next((part for part in parts if part.isdigit()), None)
+        role = parts[-1] if parts and not parts[-1].isdigit() else None
+        updated = entry.findtext(f'{ATOM}updated')
+        accepted = pd.Timestamp(updated).tz_convert('UTC') if updated else None
+        if accession_no:
+            entries.append(FeedEntry(accession_no, form_type, cik, role, accepted))
+    return entries
+
+class SeenSet:
+    """Set of the most recent `maxlen` keys; adding beyond that forgets the oldest."""
+    def __init__(self, maxlen: int = SEEN_MAX):
+        self.maxlen = maxlen
+        self._keys: OrderedDict = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key) -> bool:
+        """Adds `key`; returns False if it was already there."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.maxlen:
+            self._keys.popitem(last=False)
+        return True
+
+class Form4Poller:
+    """
+    Polls the current-filings Atom feed for Form 4/4-A filings and turns each
+    new accession into normalize_form4_data() records in memory: fetch the
+    full submission, parse, normalize, hand to `on_records`. Nothing touches
+    disk.
+
+    The feed is requested conditionally (If-None-Match / If-Modified-Since),
+    so an unchanged feed costs a 304. Accessions are deduplicated with a
+    bounded SeenSet, which an accession only enters once it has been parsed;
+    one that fails is retried on the next polls (the feed may not list it
+    again), up to `max_attempts` times. HTTP goes through an EdgarClient on worker threads, so
+    the poller shares the downloader's rate limit and retry policy while the
+    event loop overlaps up to `concurrency` fetches. The latency from filing
+    acceptance to parsed records is kept for stats().
+    """
+    def __init__(self, client: Optional[EdgarClient] = None, feed_url: str = CURRENT_FEED_URL,
+                 archives_url: str = EDGAR_ROOT_URL, interval: float = POLL_SECONDS, seen_max: int = SEEN_MAX,
+                 concurrency: int = FETCH_CONCURRENCY, max_attempts: int = MAX_ATTEMPTS,
+                 on_records: Optional[Callable[[pd.DataFrame], Any]] = None):
+        self.client = client or EdgarClient()
+        self.feed_url = feed_url
+        self.archives_url = archives_url
+        self.interval = interval
+        self.seen = SeenSet(seen_max)
+        self.max_attempts = max_attempts
+        # Accessions that failed, with their entry and the attempts so far.
+        self._retries: Dict[str, Tuple[FeedEntry, int]] = {}
+        self.on_records = on_records
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.counters: Dict[str, int] = {'polls': 0, 'not_modified': 0, 'filings': 0, 'records': 0, 'errors': 0,
+                                         'dropped': 0}
+
+    def _fetch_page(self, start: int) -> Optional[bytes]:
+        """One feed page; None if it's unchanged since the last poll (first page only) or unavailable."""
+        headers = {}
+        if start == 0:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        res = self.client.get(self.feed_url.format(start=start, count=FEED_PAGE_SIZE), headers=headers)
+        if res is None or res.status_code != 200:
+            if res is not None and res.status_code == 304:
+                self.counters['not_modified'] += 1
+            return None
+        if start == 0:
+            self._etag = res.headers.get('ETag')
+            self._last_modified = res.headers.get('Last-Modified')
+        return res.content
+
+    async def new_entries(self) -> List[FeedEntry]:
+        """
+        The feed entries for accessions not seen before, one per accession
+        (the reporting owner's when listed), after the failed ones to retry.
+        """
+        self.counters['polls'] += 1
+        by_accession: Dict[str, FeedEntry] = {}
+        for page in range(MAX_FEED_PAGES):
+            data = await asyncio.to_thread(self._fetch_page, page * FEED_PAGE_SIZE)
+            if data is None:
+                break
+            page_entries = parse_feed(data)
+            entries = [entry for entry in page_entries if entry.form_type in FORM4_TYPES and entry.cik]
+            fresh = [entry for entry in entries if entry.accession_no not in self.seen]
+            for entry in fresh:
+                # The owner's CIK goes in the path, where the insider CIK is read from.
+                current = by_accession.get(entry.accession_no)
+                if current is None or (entry.role == 'Reporting' and current.role != 'Reporting'):
+                    by_accession[entry.accession_no] = entry
+            # A short page is the end of the feed; the filter says nothing about that.
+            if len(fresh) < len(entries) or len(page_entries) < FEED_PAGE_SIZE:
+                break
+        retries = [entry for accession_no, (entry, _) in self._retries.items() if accession_no not in by_accession]
+        # Oldest first, so records are handed on in filing order.
+        return retries + list(reversed(list(by_accession.values())))
+
+    def filing_url(self, entry: FeedEntry) -> str:
+        return (f"{self.archives_url}/edgar/data/{int(entry.cik)}/{entry.accession_no.replace('-', '')}/"
+                f"{entry.accession_no}.txt")
+
+    def _fetch_and_parse(self, entry: FeedEntry) -> pd.DataFrame:
+        res = self.client.get(self.filing_url(entry))
+        if res is None or res.status_code != 200:
+            raise IOError(f"HTTP {res.status_code if res is not None else 'no response'} for {entry.accession_no}")
+        virtual_path = Path(f"{int(entry.cik):010d}", entry.form_type.replace('/', '_A'), f"{entry.accession_no}.txt")
+        processor = FileProcessor.from_bytes(res.content, virtual_path)
+        if processor.is_submission:
+            raw_data = sgml.parse_form4_submission(processor.data)
+        else:
+            raw_data = parsers.parse_form4(processor.data, processor.tree if processor.is_xml else None)
+        return utils.normalize_form4_data(raw_data, processor.metadata, entry.accession_no)
+
+    async def handle(self, entry: FeedEntry) -> Optional[pd.DataFrame]:
+        async with self._semaphore:
+            try:
+                df = await asyncio.to_thread(self._fetch_and_parse, entry)
+            except Exception as e:
+                self.counters['errors'] += 1
+                self._failed(entry, e)
+                return None
+        self.seen.add(entry.accession_no)
+        self._retries.pop(entry.accession_no, None)
+        if entry.accepted is not None:
+            self.latencies.append(time.time() - entry.accepted.timestamp())
+        self.counters['filings'] += 1
+        self.counters['records'] += len(df)
+        if self.on_records is not None and not df.empty:
+            self.on_records(df)
+        return df
+
+    def _failed(self, entry: FeedEntry, error: Exception):
+        """Queues a failed accession for the next poll, or gives up on it after max_attempts."""
+        _, attempts = self._retries.pop(entry.accession_no, (entry, 0))
+        attempts += 1
+        if attempts < self.max_attempts:
+            self._retries[entry.accession_no] = (entry, attempts)
+            print(f"   [!] {entry.accession_no}: {error} (attempt {attempts} of {self.max_attempts}, will retry)")
+            return
+        self.seen.add(entry.accession_no)
+        self.counters['dropped'] += 1
+        print(f"   [!] {entry.accession_no}: {error} (giving up after {attempts} attempts)")
+
+    async def poll_once(self) -> List[pd.DataFrame]:
+        """Reads the feed and processes every new accession. Returns their records."""
+        entries = await self.new_entries()
+        results = await asyncio.gather(*(self.handle(entry) for entry in entries))
+        return [df for df in results if df is not None]
+
+    async def run(self, polls: Optional[int] = None):
+        """Polls every `interval` seconds, `polls` times or until cancelled."""
+        count = 0
+        while polls is None or count < polls:
+            started = time.monotonic()
+            await self.poll_once()
+            count += 1
+            if polls is None or count < polls:
+                await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus acceptance-to-records latency percentiles, in seconds."""
+        stats: Dict[str, Any] = dict(self.counters, seen=len(self.seen))
+        if self.latencies:
+            p50, p99 = np.percentile(np.fromiter(self.latencies, dtype=float), [50, 99])
+            stats.update(latency_p50_s=float(p50), latency_p99_s=float(p99))
+        return stats
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    line = (f"{stats['polls']} poll(s) ({stats['not_modified']} not modified), {stats['filings']} filing(s), "
+            f"{stats['records']} record(s), {stats['errors']} error(s), {stats['dropped']} dropped")
+    if 'latency_p50_s' in stats:
+        line += f"; acceptance to records p50 {stats['latency_p50_s']:.2f}s, p99 {stats['latency_p99_s']:.2f}s"
+    return line
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Poll EDGAR's current-filings feed for Form 4/4-A filings.")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Seconds between polls")
+    parser.add_argument('--polls', type=int, help="Stop after this many polls (default: run until interrupted)")
+    parser.add_argument('--ciks', help="Comma-separated watchlist issuer CIKs to raise trigger alerts for")
+    parser.add_argument('--feed-url', default=CURRENT_FEED_URL,
+                        help="Feed URL, with {start} and {count} placeholders")
+    parser.add_argument('--archives-url', default=EDGAR_ROOT_URL, help="EDGAR Archives root URL")
+    parser.add_argument('--user-agent', default=DEFAULT_USER_AGENT)
+    parser.add_argument('--rate', type=float, default=MAX_REQUESTS_PER_SECOND, help="Max requests per second")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    from .triggers import TriggerEngine, WatchlistIndex
+    args = parse_args(argv)
+
+    engine = None
+    if args.ciks:
+        index = WatchlistIndex()
+        for cik in args.ciks.split(','):
+            index.add(issuer_cik=cik)
+        engine = TriggerEngine(index)
+
+    def on_records(df: pd.DataFrame):
+        print(f"   {df['accession_no'].iloc[0]}: {len(df)} transaction(s)")
+        for alert in (engine.consume(df) if engine else []):
+            print(f"   ALERT {alert['kind']}: {alert['insider_name']} ({alert['insider_relation']}) "
+                  f"bought {alert['shares']} of {alert['issuer_ticker'] or alert['issuer_cik']}")
+
+    client = EdgarClient(user_agent=args.user_agent, rate=args.rate)
+    poller = Form4Poller(client, feed_url=args.feed_url, archives_url=args.archives_url,
+                         interval=args.interval, on_records=on_records)
+    try:
+        asyncio.run(poller.run(args.polls))
+    except KeyboardInterrupt:
+        pass
+    print(format_stats(poller.stats()))
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,240 @@
 from pathlib import Path
+import mmap
+import os
 import re
-from typing import Optional, Dict, Any
+from functools import cached_property
+from typing import Optional, Dict, Any, Tuple, Union
 from lxml import etree, html
 from datetime import datetime
 
+from .parsers import looks_like_xml, decode_text
+from .sgml import is_submission
+
+# Root element of a 13F information table, which never carries filing metadata.
+_INFOTABLE_ROOT = re.compile(rb'<(?:\w+:)?informationTable\b', re.I)
+
+# --- CONFIGURATION ---
+# How much of a document the filing type sniffer looks at before falling back to a full scan.
+SNIFF_BYTES = 8192
+# Files at least this big are memory-mapped rather than read into memory.
+MMAP_MIN_BYTES = 4 * 1024 * 1024
+
+# A whole filing: bytes, or a read-only mmap for big files. Both work with
+# bytes regexes, slicing and find().
+Buffer = Union[bytes, mmap.mmap]
+
+def _type_from_tag(match: re.Match) -> str:
+    doc_type = match.group(1).decode('utf-8', 'replace').strip().upper()
+    if '13F-HR' in doc_type: return '13F-HR'
+    if '13F-NT' in doc_type: return '13F-NT'
+    if '4/A' in doc_type: return '4/A'
+    if '4' in doc_type: return '4'
+    return doc_type
+
+# Filing type rules in priority order: (name, pattern, type or function of the
+# match, decisive, hints). Decisive rules mark where a document says what it is
+# (its SGML header, the report-type checkbox), so a match in the prefix settles
+# the type. The generic keywords can appear anywhere, so one found in the
+# prefix only holds if no stronger rule matches further on. Hints are literals
+# at least one of which any match must contain; plain substring checks for
+# them are much cheaper than running a case-insensitive pattern over a whole
+# document that can't match. All of it works on the raw bytes, so sniffing
+# never needs the decoded text.
+_TYPE_RULES = [
+    # The <TYPE> tag is the most reliable indicator.
+    ('type_tag', re.compile(rb'<TYPE>([^<\n]+)'), _type_from_tag, True, (b'<TYPE>',)),
+    # An ownershipDocument (XML Form 4) names its form the same way.
+    ('document_type', re.compile(rb'<documentType>\s*(4(?:/A)?)\s*</documentType>'), _type_from_tag, True,
+     (b'<documentType>',)),
+    # For HTML forms, check which box is checked.
+    ('hr_checkbox', re.compile(rb'\[[Xx]\]\s*13F HOLDINGS REPORT', re.I), '13F-HR', True, (b'13F', b'13f')),
+    ('nt_checkbox', re.compile(rb'\[[Xx]\]\s*13F NOTICE', re.I), '13F-NT', True, (b'13F', b'13f')),
+    ('hr_checkbox_html', re.compile(rb'[Xx]</span></td>\s*<td.*>13F HOLDINGS REPORT', re.I), '13F-HR', True, (b'13F', b'13f')),
+    ('nt_checkbox_html', re.compile(rb'[Xx]</span></td>\s*<td.*>13F NOTICE', re.I), '13F-NT', True, (b'13F', b'13f')),
+    # Fallback to generic keyword search.
+    ('form_4a', re.compile(rb'FORM 4/A', re.I), '4/A', False, (b'4/A', b'4/a')),
+    ('form_4', re.compile(rb'FORM 4', re.I), '4', False, (b' 4',)),
+    ('13f_notice', re.compile(rb'13F NOTICE', re.I), '13F-NT', False, (b'13F', b'13f')),  # Check for NT before HR
+    ('13f_holdings', re.compile(rb'13F HOLDINGS REPORT', re.I), '13F-HR', False, (b'13F', b'13f')),
+    ('form_13f_nt', re.compile(rb'FORM 13F-NT', re.I), '13F-NT', False, (b'13F-', b'13f-')),
+    ('form_13f_hr', re.compile(rb'FORM 13F-HR', re.I), '13F-HR', False, (b'13F-', b'13f-')),
+]
+_INFOTABLE_TAG = re.compile(rb'<informationTable|(?i:<infotable)')
+
+# Metadata patterns, also matched against the raw bytes.
+_ACCEPTANCE_DATETIME = re.compile(rb'<ACCEPTANCE-DATETIME>(\d{8})')
+_FILED_AS_OF = re.compile(rb'FILED AS OF DATE:\s*(\d{8})')
+_DATE_OF_SIGNING = re.compile(rb'Date of Signing:\s*([\d/]+)', re.I)
+_QUARTER_ENDED = re.compile(rb'Report for the Calendar Year or Quarter Ended:\s*([\d/]+)', re.I)
+_PERIOD_OF_REPORT = re.compile(rb'CONFORMED PERIOD OF REPORT:\s*(\d{8})')
+
+def _search(rule, text: Buffer) -> Optional[re.Match]:
+    if all(text.find(hint) == -1 for hint in rule[4]):
+        return None
+    return rule[1].search(text)
+
+def _apply_rule(rule, match: re.Match) -> str:
+    result = rule[2]
+    return result(match) if callable(result) else result
+
+def _sniff_full(text: Buffer) -> Tuple[Optional[str], str]:
+    """The first rule, in priority order, that matches anywhere in `text`."""
+    for rule in _TYPE_RULES:
+        match = _search(rule, text)
+        if match:
+            return _apply_rule(rule, match), rule[0]
+
+    # Fallback for data-only XML files.
+    if looks_like_xml(text) and _INFOTABLE_TAG.search(text):
+        return '13F-HR', 'xml_infotable'
+    return None, 'none'
+
 class FileProcessor:
     """
     Processes a single filing to determine its type and extract key metadata.
+
+    The file is read once, as bytes (memory-mapped when large). Type sniffing
+    and metadata extraction work on those bytes and lxml parses them directly,
+    honoring the document's declared encoding. The decoded text (`content`),
+    filing type, metadata and parsed document tree are computed on first access
+    and cached, so the document is decoded and parsed at most once no matter how
+    many extractors or parsers use it.
     """
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, data: Optional[bytes] = None):
         self.file_path = file_path
-        self.content = self._read_content()
-        self.filing_type = self._determine_filing_type()
-        self.metadata = self._extract_metadata()
+        self.data = self._read_data() if data is None else data
+
+    @classmethod
+    def from_bytes(cls, data: bytes, file_path: Path) -> 'FileProcessor':
+        """
+        A processor for a filing already in memory (e.g. just downloaded).
+        `file_path` is never read; it only supplies what the path normally
+        does, the CIK directory (<cik>/<form>/<accession>.txt).
+        """
+        return cls(Path(file_path), data)
+
+    @cached_property
+    def content(self) -> str:
+        """The document as text, for the regex paths that need it: UTF-8, else latin-1."""
+        return decode_text(self.data)
+
+    @cached_property
+    def filing_type(self) -> Optional[str]:
+        filing_type, self._filing_type_rule = self._determine_filing_type()
+        return filing_type
+
+    @property
+    def filing_type_rule(self) -> str:
+        """Which sniffer rule decided filing_type, and whether on the prefix or the full text."""
+        self.filing_type
+        return self._filing_type_rule
+
+    @cached_property
+    def metadata(self) -> Dict[str, Any]:
+        return self._extract_metadata()
 
-    def _read_content(self) -> str:
-        """Reads file content, trying different encodings."""
+    @cached_property
+    def is_xml(self) -> bool:
+        """True for XML documents (e.g. 13F information tables), False for HTML/SGML."""
+        return looks_like_xml(self.data)
+
+    @cached_property
+    def is_submission(self) -> bool:
+        """True for SGML made of <DOCUMENT> blocks, which sgml.py splits into their parts."""
+        return is_submission(self.data)
+
+    @cached_property
+    def is_information_table(self) -> bool:
+        """True for bare 13F XML information tables, which are parsed by streaming."""
+        return self.is_xml and _INFOTABLE_ROOT.search(self.data, 0, 4096) is not None
+
+    @cached_property
+    def tree(self) -> Optional[etree._Element]:
+        """
+        The parsed document: an XML tree for XML documents, otherwise a lenient
+        HTML tree. None if the document cannot be parsed.
+        """
+        data = self.data if isinstance(self.data, bytes) else self.data[:]
         try:
-            return self.file_path.read_text(encoding='utf-8')
-        except UnicodeDecodeError:
-            return self.file_path.read_text(encoding='latin-1')
+            if not self.is_xml:
+                return html.fromstring(data)
+            try:
+                return etree.fromstring(data)
+            except etree.XMLSyntaxError:
+                # Bytes that don't match the declared encoding (e.g. latin-1
+                # declared as UTF-8): parse the text as decoded by `content`.
+                return etree.fromstring(self.content.encode('utf-8'))
+        except (etree.XMLSyntaxError, etree.ParserError):
+            return None
+
+    def _tree_findtext(self, tag: str) -> Optional[str]:
+        """
+        Returns the text of the first element named `tag` (lowercase) in the
+        shared tree. HTML trees are already lowercased; XML trees are matched on
+        the lowercased local name so namespaces and camelCase don't matter.
+        """
+        # Information tables hold no filing metadata, so don't build a tree just to look.
+        if self.is_information_table:
+            return None
+        # Nor when the tag isn't in the text at all (e.g. an HTML Form 4, which
+        # is parsed without a tree).
+        if 'tree' not in self.__dict__ and re.search(rb'<(?:[\w.-]+:)?' + tag.encode('ascii'), self.data, re.I) is None:
+            return None
+        root = self.tree
+        if root is None:
+            return None
+        if not self.is_xml:
+            return root.findtext('.//' + tag)
+        for element in root.iter(etree.Element):
+            if etree.QName(element).localname.lower() == tag:
+                return element.text or ''
+        return None
+
+    def _read_data(self) -> Buffer:
+        """Reads the file once as bytes; large files are memory-mapped instead of copied."""
+        with open(self.file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_MIN_BYTES:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
 
-    def _determine_filing_type(self) -> Optional[str]:
+    def _determine_filing_type(self) -> Tuple[Optional[str], str]:
         """
         Determines the filing type by inspecting the file content.
         This is more reliable than trusting file extensions or directory names.
+
+        The rules are first tried on the leading SNIFF_BYTES bytes, where
+        the <TYPE> tag, the 13F report-type checkboxes and the XML root almost
+        always are. The whole document is scanned only when that prefix is
+        inconclusive. Returns the type and the deciding rule, suffixed with
+        '@prefix' or '@full' (e.g. 'type_tag@prefix').
         """
-        # The <TYPE> tag is the most reliable indicator.
-        type_match = re.search(r'<TYPE>([^<\n]+)', self.content)
-        if type_match:
-            doc_type = type_match.group(1).strip().upper()
-            if '13F-HR' in doc_type: return '13F-HR'
-            if '13F-NT' in doc_type: return '13F-NT'
-            if '4/A' in doc_type: return '4/A'
-            if '4' in doc_type: return '4'
-            return doc_type
-
-        # For HTML forms, check which box is checked.
-        if re.search(r'\[[Xx]\]\s*13F HOLDINGS REPORT', self.content, re.I): return '13F-HR'
-        if re.search(r'\[[Xx]\]\s*13F NOTICE', self.content, re.I): return '13F-NT'
-        if re.search(r'[Xx]</span></td>\s*<td.*>13F HOLDINGS REPORT', self.content, re.I): return '13F-HR'
-        if re.search(r'[Xx]</span></td>\s*<td.*>13F NOTICE', self.content, re.I): return '13F-NT'
-
-        # Fallback to generic keyword search.
-        upper_content = self.content.upper()
-        if 'FORM 4/A' in upper_content: return '4/A'
-        if 'FORM 4' in upper_content: return '4'
-        if '13F NOTICE' in upper_content: return '13F-NT' # Check for NT before HR
-        if '13F HOLDINGS REPORT' in upper_content: return '13F-HR'
-        if 'FORM 13F-NT' in upper_content: return '13F-NT'
-        if 'FORM 13F-HR' in upper_content: return '13F-HR'
-
-        # Fallback for data-only XML files.
-        stripped_content = self.content.strip()
-        if stripped_content.startswith('<?xml') or stripped_content.lower().startswith('<informationtable'):
-            if '<informationTable' in stripped_content or '<infotable' in stripped_content.lower():
-                return '13F-HR'
+        content = self.data
+        if len(content) <= SNIFF_BYTES:
+            filing_type, rule = _sniff_full(content)
+            return filing_type, f"{rule}@prefix"
 
-        return None
+        prefix = content[:SNIFF_BYTES]
+        for i, rule in enumerate(_TYPE_RULES):
+            match = _search(rule, prefix)
+            if match is None:
+                continue
+            if match.end() == len(prefix):
+                break  # The match may run on past the prefix.
+            if rule[3]:
+                return _apply_rule(rule, match), f"{rule[0]}@prefix"
+            # A keyword match stands unless a stronger rule matches anywhere in the document.
+            for stronger in _TYPE_RULES[:i]:
+                stronger_match = _search(stronger, content)
+                if stronger_match:
+                    return _apply_rule(stronger, stronger_match), f"{stronger[0]}@full"
+            return _apply_rule(rule, match), f"{rule[0]}@full"
+        else:
+            if looks_like_xml(prefix) and _INFOTABLE_TAG.search(prefix):
+                return '13F-HR', 'xml_infotable@prefix'
+
+        filing_type, rule = _sniff_full(content)
+        return filing_type, f"{rule}@full"
 
     def _extract_metadata(self) -> Dict[str, Any]:
         """
@@ -83,45 +260,42 @@ class FileProcessor:
     def _extract_filing_date(self) -> Optional[str]:
         """Extracts the filing date from the document."""
         # Pattern for <ACCEPTANCE-DATETIME> or similar tags
-        match = re.search(r'<ACCEPTANCE-DATETIME>(\d{8})', self.content)
+        match = _ACCEPTANCE_DATETIME.search(self.data)
         if match:
-            return self._format_date(match.group(1), '%Y%m%d')
+            return self._format_date(match.group(1).decode('ascii'), '%Y%m%d')
         
         # Pattern for "FILED AS OF DATE:"
-        match = re.search(r'FILED AS OF DATE:\s*(\d{8})', self.content)
+        match = _FILED_AS_OF.search(self.data)
         if match:
-            return self._format_date(match.group(1), '%Y%m%d')
+            return self._format_date(match.group(1).decode('ascii'), '%Y%m%d')
 
         # Pattern for "Date of Signing"
-        match = re.search(r'Date of Signing:\s*([\d/]+)', self.content, re.I)
+        match = _DATE_OF_SIGNING.search(self.data)
         if match:
-            return self._format_date(match.group(1).strip(), '%m/%d/%Y', '%m/%d/%y')
+            return self._format_date(match.group(1).decode('ascii').strip(), '%m/%d/%Y', '%m/%d/%y')
             
         # Look for <filingDate> in XML
-        try:
-            root = html.fromstring(self.content.encode('utf-8'))
-            date_val = root.findtext('.//filingdate')
-            if date_val:
-                return self._format_date(date_val, '%Y-%m-%d', '%m-%d-%Y')
-        except etree.XMLSyntaxError:
-            pass
-            
+        date_val = self._tree_findtext('filingdate')
+        if date_val:
+            return self._format_date(date_val, '%Y-%m-%d', '%m-%d-%Y')
+
         return None
 
     def _extract_report_date(self) -> Optional[str]:
         """Extracts the period of report date, primarily for 13F filings."""
         # Pattern for "Report for the Calendar Year or Quarter Ended:"
-        match = re.search(r'Report for the Calendar Year or Quarter Ended:\s*([\d/]+)', self.content, re.I)
+        match = _QUARTER_ENDED.search(self.data)
         if match:
-            return self._format_date(match.group(1).strip(), '%m/%d/%Y', '%m/%d/%y')
+            return self._format_date(match.group(1).decode('ascii').strip(), '%m/%d/%Y', '%m/%d/%y')
+
+        # The SEC header of a full submission
+        match = _PERIOD_OF_REPORT.search(self.data)
+        if match:
+            return self._format_date(match.group(1).decode('ascii'), '%Y%m%d')
 
         # Look for <periodOfReport> in XML
-        try:
-            root = html.fromstring(self.content.encode('utf-8'))
-            date_val = root.findtext('.//periodofreport')
-            if date_val:
-                return self._format_date(date_val, '%Y-%m-%d', '%m-%d-%Y')
-        except etree.XMLSyntaxError:
-            pass
+        date_val = self._tree_findtext('periodofreport')
+        if date_val:
+            return self._format_date(date_val, '%Y-%m-%d', '%m-%d-%Y')
 
         return None
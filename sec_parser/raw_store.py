@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Union
+
+import zstandard
+
+from .processor import FileProcessor
+from . import parsers
+from . import sgml
+
+# --- CONFIGURATION ---
+# zstd level for new documents. Filings are written once and read rarely, so a
+# high level pays off; level 10 still compresses tens of MB/s.
+DEFAULT_LEVEL = 10
+# Parsed documents kept in memory by record(), so rehydrating several records
+# of one filing parses it once.
+PARSED_CACHE_SIZE = 16
+
+def content_hash(data) -> str:
+    """The address of a document in the store: the sha256 of its bytes, as hex."""
+    return hashlib.sha256(data).hexdigest()
+
+def parse_document(data: bytes) -> Optional[List[Dict[str, Any]]]:
+    """
+    The parser output for a stored filing, routed the way main.py routes a
+    file: a list of holdings for a 13F-HR, of transactions for a Form 4/4-A.
+    None for other filing types and for 13F cover pages without a table.
+    """
+    # Only the CIK comes from the path, and parser output doesn't use it.
+    processor = FileProcessor.from_bytes(data, Path('0', 'raw', 'raw.txt'))
+    filing_type = processor.filing_type
+    if filing_type == '13F-HR':
+        if processor.is_submission:
+            return sgml.parse_13f_submission(processor.data, 'raw')
+        tree = None if processor.is_information_table else processor.tree
+        return parsers.parse_13f_hr(processor.data, 'raw', tree)
+    if filing_type in ('4', '4/A'):
+        if processor.is_submission:
+            return sgml.parse_form4_submission(processor.data)
+        return parsers.parse_form4(processor.data, processor.tree if processor.is_xml else None)
+    return None
+
+class StaleReferenceError(LookupError):
+    """A raw_offset taken with another parser version, which may point at a different record now."""
+
+class RawStore:
+    """
+    Content-addressed store of original filings. Each document is kept once,
+    zstd-compressed, under `root`/<sha[:2]>/<sha>.zst, however many rows or
+    runs refer to it; the database and Parquet rows carry only the hash
+    (raw_sha256), their position in the parser output (raw_offset) and the
+    parsers.PARSER_VERSION that position was taken with (raw_parser_version).
+
+    record(sha, offset, parser_version) rehydrates a row's original parser
+    record by parsing the stored filing again. A parser change can shift the
+    offsets, so a reference from another parser version raises
+    StaleReferenceError rather than returning some other record; re-parse
+    the filing to refresh it. Writes go through a temp file and a rename, so
+    worker processes can share one store.
+    """
+    def __init__(self, root: Union[str, Path], level: int = DEFAULT_LEVEL):
+        self.root = Path(root)
+        self.level = level
+        self._compressor: Optional[zstandard.ZstdCompressor] = None
+        self._decompressor: Optional[zstandard.ZstdDecompressor] = None
+        self._parsed: OrderedDict = OrderedDict()
+
+    def _path(self, sha: str) -> Path:
+        return self.root / sha[:2] / f"{sha}.zst"
+
+    def __contains__(self, sha: str) -> bool:
+        return self._path(sha).exists()
+
+    def put(self, data, sha: Optional[str] = None) -> str:
+        """Stores a document unless it's already there. Returns its hash."""
+        sha = sha or content_hash(data)
+        path = self._path(sha)
+        if path.exists():
+            return sha
+        if self._compressor is None:
+            self._compressor = zstandard.ZstdCompressor(level=self.level)
+        compressed = self._compressor.compress(data)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return sha
+
+    def get(self, sha: str) -> bytes:
+        """The original bytes of a stored document. KeyError if it isn't stored."""
+        try:
+            compressed = self._path(sha).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(sha) from None
+        if self._decompressor is None:
+            self._decompressor = zstandard.ZstdDecompressor()
+        return self._decompressor.decompress(compressed)
+
+    def records(self, sha: str) -> List[Dict[str, Any]]:
+        """All of a stored filing's parser records, in offset order."""
+        records = self._parsed.get(sha)
+        if records is not None:
+            self._parsed.move_to_end(sha)
+            return records
+        records = parse_document(self.get(sha)) or []
+        self._parsed[sha] = records
+        if len(self._parsed) > PARSED_CACHE_SIZE:
+            self._parsed.popitem(last=False)
+        return records
+
+    def record(self, sha: str, offset: int, parser_version: Optional[int]) -> Dict[str, Any]:
+        """
+        The parser record a row was built from, given the row's raw_sha256,
+        raw_offset and raw_parser_version. IndexError if the offset is out of
+        range.
+        """
+        if parser_version != parsers.PARSER_VERSION:
+            raise StaleReferenceError(
+                f"Offset {offset} into {sha} was taken with parser version {parser_version}, "
+                f"not the current {parsers.PARSER_VERSION}; re-parse the filing to refresh it")
+        return self.records(sha)[offset]
+
+    def __iter__(self) -> Iterator[str]:
+        """The hashes of all stored documents."""
+        for path in self.root.glob('*/*.zst'):
+            yield path.stem
+
+    def stats(self) -> Dict[str, int]:
+        """Document count with their original and compressed sizes, in bytes."""
+        stats = {'documents': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+        for path in self.root.glob('*/*.zst'):
+            with open(path, 'rb') as f:
+                header = f.read(18)
+                size = os.fstat(f.fileno()).st_size
+            stats['documents'] += 1
+            stats['stored_bytes'] += size
+            stats['raw_bytes'] += max(zstandard.frame_content_size(header), 0)
+        return stats
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect the raw filing store or rehydrate records from it.")
+    parser.add_argument('root', help="Raw store directory")
+    parser.add_argument('sha', nargs='?', help="Document hash (raw_sha256); omit for store statistics")
+    parser.add_argument('offset', nargs='?', type=int,
+                        help="Record offset (raw_offset); omit for all of the document's records")
+    parser.add_argument('parser_version', nargs='?', type=int,
+                        help="The row's raw_parser_version, required with an offset")
+    parser.add_argument('--original', action='store_true', help="Write the original filing to stdout instead")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.offset is not None and args.parser_version is None:
+        print("Error: an offset needs the row's raw_parser_version too.")
+        return
+    store = RawStore(args.root)
+    if args.sha is None:
+        stats = store.stats()
+        ratio = stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0.0
+        print(f"{stats['documents']} document(s), {stats['raw_bytes'] / 1e6:.1f} MB stored in "
+              f"{stats['stored_bytes'] / 1e6:.1f} MB ({ratio:.1f}x)")
+    elif args.original:
+        os.write(1, store.get(args.sha))
+    elif args.offset is not None:
+        print(json.dumps(store.record(args.sha, args.offset, args.parser_version), indent=2))
+    else:
+        print(json.dumps(store.records(args.sha), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from . import loader
+
+# --- CONFIGURATION ---
+SCHEMA_FILE = Path(__file__).resolve().parent.parent / 'schema.sql'
+LEGACY_SCHEMA = 'bench_legacy'
+PARTITIONED_SCHEMA = 'bench_partitioned'
+DEFAULT_FUNDS = 200
+DEFAULT_QUARTERS = 80          # 20 years
+DEFAULT_POSITIONS = 250        # holdings per fund per quarter
+DEFAULT_TRANSACTIONS = 1_000_000
+CUSIP_UNIVERSE = 6000
+REPEAT = 7
+
+# The tables as schema.sql defined them before migrations/001_partitioned_holdings.sql.
+_LEGACY_DDL = """
+CREATE TABLE "Funds" ("cik" VARCHAR(10) PRIMARY KEY, "fund_name" VARCHAR(255) NOT NULL UNIQUE, "strategy" VARCHAR(255));
+CREATE TABLE "Quarterly_Holdings" (
+    "id" BIGSERIAL PRIMARY KEY,
+    "fund_cik" VARCHAR(10) NOT NULL REFERENCES "Funds"("cik") ON DELETE CASCADE,
+    "report_date" DATE NOT NULL, "filing_date" TIMESTAMP WITH TIME ZONE NOT NULL,
+    "cusip" VARCHAR(9) NOT NULL, "company_name" VARCHAR(255) NOT NULL,
+    "shares" BIGINT NOT NULL CHECK ("shares" >= 0), "value_usd" BIGINT NOT NULL CHECK ("value_usd" >= 0),
+    "raw_json" JSONB NOT NULL,
+    CONSTRAINT uq_holding UNIQUE ("fund_cik", "report_date", "cusip")
+);
+CREATE INDEX ON "Quarterly_Holdings" ("fund_cik");
+CREATE INDEX ON "Quarterly_Holdings" ("report_date");
+CREATE INDEX ON "Quarterly_Holdings" ("cusip");
+CREATE TABLE "Insider_Transactions" (
+    "id" BIGSERIAL PRIMARY KEY, "accession_no" VARCHAR(255) NOT NULL UNIQUE,
+    "issuer_cik" VARCHAR(10) NOT NULL, "issuer_ticker" VARCHAR(10), "insider_cik" VARCHAR(10),
+    "insider_name" VARCHAR(255) NOT NULL, "insider_relation" VARCHAR(255),
+    "filing_date" TIMESTAMP WITH TIME ZONE NOT NULL, "transaction_date" DATE NOT NULL,
+    "transaction_code" CHAR(1), "shares" BIGINT NOT NULL, "price_per_share" NUMERIC(18, 4),
+    "shares_owned_after" BIGINT CHECK ("shares_owned_after" >= 0), "raw_json" JSONB NOT NULL
+);
+CREATE INDEX ON "Insider_Transactions" ("issuer_cik");
+CREATE INDEX ON "Insider_Transactions" ("issuer_ticker");
+CREATE INDEX ON "Insider_Transactions" ("transaction_date");
+CREATE INDEX ON "Insider_Transactions" ("transaction_code");
+"""
+
+# Synthetic history: every fund reports `positions` CUSIPs each quarter end, drawn
+# from a fixed universe, with the quarters loaded in filing order.
+_FILL_FUNDS = """
+INSERT INTO "Funds" SELECT lpad(f::text, 10, '0'), 'Fund ' || f, NULL FROM generate_series(1, %(funds)s) f
+"""
+_FILL_HOLDINGS = """
+INSERT INTO "Quarterly_Holdings" ("fund_cik", "report_date", "filing_date", "cusip", "company_name",
+                                  "shares", "value_usd", "raw_json")
+SELECT lpad(f::text, 10, '0'), d::date, d + interval '45 days',
+       lpad(((f * 7919 + p * 104729 + q * 31) %% %(universe)s)::text, 9, '0'), 'Issuer',
+       1000 + (f * p + q) %% 100000, 50000 + (f * p * q) %% 10000000, '{}'
+FROM generate_series(0, %(quarters)s - 1) q
+CROSS JOIN LATERAL (SELECT (date '2005-03-31' + make_interval(months => 3 * q)) AS d) quarter
+CROSS JOIN generate_series(1, %(funds)s) f
+CROSS JOIN generate_series(1, %(positions)s) p
+"""
+_FILL_TRANSACTIONS = """
+INSERT INTO "Insider_Transactions" ("accession_no", "issuer_cik", "issuer_ticker", "insider_cik", "insider_name",
+                                    "insider_relation", "filing_date", "transaction_date", "transaction_code",
+                                    "shares", "price_per_share", "shares_owned_after", "raw_json")
+SELECT 'acc-' || t, lpad((t %% 5000)::text, 10, '0'), 'T' || (t %% 5000), NULL, 'Insider', 'Director',
+       timestamptz '2005-01-01' + t * (interval '20 years' / %(transactions)s),
+       (timestamptz '2005-01-01' + t * (interval '20 years' / %(transactions)s) - interval '2 days')::date,
+       CASE WHEN t %% 7 = 0 THEN 'P' ELSE 'S' END, 100, 10, 1000, '{}'
+FROM generate_series(1, %(transactions)s) t
+"""
+# raw_json isn't copied: the current schema references the raw document store instead.
+# The legacy table holds one transaction per filing, so each copied row is its filing's first.
+_HOLDINGS_COPY_COLUMNS = '"id", "fund_cik", "report_date", "filing_date", "cusip", "company_name", "shares", "value_usd"'
+_TRANSACTIONS_COPY_COLUMNS = ('"id", "accession_no", "issuer_cik", "issuer_ticker", "insider_cik", "insider_name", '
+                              '"insider_relation", "filing_date", "transaction_date", "transaction_code", "shares", '
+                              '"price_per_share", "shares_owned_after"')
+_COPY_FROM_LEGACY = f"""
+INSERT INTO "Funds" SELECT * FROM {LEGACY_SCHEMA}."Funds";
+INSERT INTO "Quarterly_Holdings" ({_HOLDINGS_COPY_COLUMNS})
+SELECT {_HOLDINGS_COPY_COLUMNS} FROM {LEGACY_SCHEMA}."Quarterly_Holdings";
+INSERT INTO "Insider_Transactions" ({_TRANSACTIONS_COPY_COLUMNS}, "transaction_no")
+SELECT {_TRANSACTIONS_COPY_COLUMNS}, 0 FROM {LEGACY_SCHEMA}."Insider_Transactions";
+"""
+
+# (name, SQL for the legacy tables, SQL for the new schema); parameters are filled by _params().
+QUERIES: List[Tuple[str, str, str]] = [
+    ('funds holding a CUSIP this quarter',
+     'SELECT "fund_cik", "shares", "value_usd" FROM "Quarterly_Holdings" WHERE "report_date" = %(quarter)s AND "cusip" = %(cusip)s',
+     'SELECT "fund_cik", "shares", "value_usd" FROM "Quarterly_Holdings" WHERE "report_date" = %(quarter)s AND "cusip" = %(cusip)s'),
+    ('one fund, latest snapshot',
+     'SELECT "cusip", "shares", "value_usd" FROM "Quarterly_Holdings" WHERE "fund_cik" = %(fund)s AND "report_date" = '
+     '(SELECT max("report_date") FROM "Quarterly_Holdings" WHERE "fund_cik" = %(fund)s)',
+     'SELECT "cusip", "shares", "value_usd" FROM "Latest_Holdings" WHERE "fund_cik" = %(fund)s'),
+    ('all funds, latest snapshot',
+     'SELECT count(*), sum("value_usd") FROM "Quarterly_Holdings" h JOIN (SELECT "fund_cik", max("report_date") AS "report_date" '
+     'FROM "Quarterly_Holdings" GROUP BY "fund_cik") l USING ("fund_cik", "report_date")',
+     'SELECT count(*), sum("value_usd") FROM "Latest_Holdings"'),
+    ('holders of a CUSIP, latest snapshot',
+     'SELECT h."fund_cik", h."shares" FROM "Quarterly_Holdings" h JOIN (SELECT "fund_cik", max("report_date") AS "report_date" '
+     'FROM "Quarterly_Holdings" GROUP BY "fund_cik") l USING ("fund_cik", "report_date") WHERE h."cusip" = %(cusip)s',
+     'SELECT "fund_cik", "shares" FROM "Latest_Holdings" WHERE "cusip" = %(cusip)s'),
+    ('one year of a CUSIP',
+     'SELECT "report_date", sum("shares") FROM "Quarterly_Holdings" WHERE "cusip" = %(cusip)s '
+     'AND "report_date" BETWEEN %(year_start)s AND %(quarter)s GROUP BY 1',
+     'SELECT "report_date", sum("shares") FROM "Quarterly_Holdings" WHERE "cusip" = %(cusip)s '
+     'AND "report_date" BETWEEN %(year_start)s AND %(quarter)s GROUP BY 1'),
+    ('purchases filed in a week',
+     'SELECT count(*), sum("shares") FROM "Insider_Transactions" WHERE "filing_date" >= %(week)s '
+     'AND "filing_date" < %(week)s::timestamptz + interval \'7 days\' AND "transaction_code" = \'P\'',
+     'SELECT count(*), sum("shares") FROM "Insider_Transactions" WHERE "filing_date" >= %(week)s '
+     'AND "filing_date" < %(week)s::timestamptz + interval \'7 days\' AND "transaction_code" = \'P\''),
+    ('transactions in a month',
+     'SELECT count(*) FROM "Insider_Transactions" WHERE "transaction_date" BETWEEN %(month)s AND %(month)s::date + 30',
+     'SELECT count(*) FROM "Insider_Transactions" WHERE "transaction_date" BETWEEN %(month)s AND %(month)s::date + 30'),
+]
+
+def _params(args: argparse.Namespace) -> Dict[str, Any]:
+    """Query parameters hitting the latest generated quarter and a CUSIP held in it."""
+    last = args.quarters - 1
+    year = 2005 + last // 4
+    quarter_end = f"{year}-{('03-31', '06-30', '09-30', '12-31')[last % 4]}"
+    cusip = (7919 + 104729 + last * 31) % CUSIP_UNIVERSE   # fund 1's first position that quarter
+    return {'quarter': quarter_end, 'year_start': f"{year}-01-01", 'cusip': f"{cusip:09d}",
+            'fund': f"{1:010d}", 'week': '2015-06-01', 'month': '2015-06-01'}
+
+def _use(cursor, schema: str):
+    cursor.execute(f"SET search_path TO {schema}, public")
+
+def build(conn, args: argparse.Namespace):
+    """Creates both schemas and fills them with the same synthetic history."""
+    params = {'funds': args.funds, 'quarters': args.quarters, 'positions': args.positions,
+              'transactions': args.transactions, 'universe': CUSIP_UNIVERSE}
+    with conn.cursor() as cursor:
+        for schema in (LEGACY_SCHEMA, PARTITIONED_SCHEMA):
+            cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+        _use(cursor, LEGACY_SCHEMA)
+        cursor.execute(_LEGACY_DDL)
+        start = time.perf_counter()
+        cursor.execute(_FILL_FUNDS, params)
+        cursor.execute(_FILL_HOLDINGS, params)
+        cursor.execute(_FILL_TRANSACTIONS, params)
+        print(f"Filled {LEGACY_SCHEMA} in {time.perf_counter() - start:.1f}s")
+
+        _use(cursor, PARTITIONED_SCHEMA)
+        cursor.execute(SCHEMA_FILE.read_text())
+        start = time.perf_counter()
+        cursor.execute(_COPY_FROM_LEGACY)
+        cursor.execute('REFRESH MATERIALIZED VIEW "Latest_Holdings"')
+        print(f"Filled {PARTITIONED_SCHEMA} in {time.perf_counter() - start:.1f}s")
+        conn.commit()
+
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        for schema in (LEGACY_SCHEMA, PARTITIONED_SCHEMA):
+            _use(cursor, schema)
+            cursor.execute('VACUUM ANALYZE "Quarterly_Holdings"')
+            cursor.execute('VACUUM ANALYZE "Insider_Transactions"')
+    conn.autocommit = False
+
+def time_query(cursor, sql: str, params: Dict[str, Any], repeat: int) -> float:
+    """Median wall time in milliseconds over `repeat` runs, after one warm-up run."""
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def index_sizes(cursor, schema: str) -> Dict[str, int]:
+    """Bytes per index of the two tables in `schema` (summed over partitions)."""
+    cursor.execute("""
+        SELECT coalesce(pi.relname, i.relname), sum(pg_relation_size(i.oid))
+        FROM pg_class i
+        JOIN pg_index x ON x.indexrelid = i.oid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = i.relnamespace
+        LEFT JOIN pg_inherits inh ON inh.inhrelid = i.oid
+        LEFT JOIN pg_class pi ON pi.oid = inh.inhparent
+        WHERE n.nspname = %s AND (t.relname LIKE 'Quarterly_Holdings%%' OR t.relname = 'Insider_Transactions')
+        GROUP BY 1 ORDER BY 1""", (schema,))
+    return dict(cursor.fetchall())
+
+def run(conn, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    params = _params(args)
+    results = []
+    with conn.cursor() as cursor:
+        for name, legacy_sql, new_sql in QUERIES:
+            _use(cursor, LEGACY_SCHEMA)
+            legacy_ms = time_query(cursor, legacy_sql, params, args.repeat)
+            _use(cursor, PARTITIONED_SCHEMA)
+            new_ms = time_query(cursor, new_sql, params, args.repeat)
+            results.append({'query': name, 'legacy_ms': legacy_ms, 'partitioned_ms': new_ms})
+        conn.rollback()
+    return results
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the watchlist queries on the original and the partitioned schema.")
+    parser.add_argument('--dsn', help="PostgreSQL DSN (default: DB_* settings in config.py)")
+    parser.add_argument('--funds', type=int, default=DEFAULT_FUNDS)
+    parser.add_argument('--quarters', type=int, default=DEFAULT_QUARTERS)
+    parser.add_argument('--positions', type=int, default=DEFAULT_POSITIONS, help="Holdings per fund per quarter")
+    parser.add_argument('--transactions', type=int, default=DEFAULT_TRANSACTIONS)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="Timed runs per query (the median is reported)")
+    parser.add_argument('--skip-build', action='store_true', help="Reuse the data from a previous run")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    conn = loader.connect(args.dsn)
+    try:
+        if not args.skip_build:
+            rows = args.funds * args.quarters * args.positions
+            print(f"Building {rows:,} holdings and {args.transactions:,} transactions in each schema...")
+            build(conn, args)
+        results = run(conn, args)
+        with conn.cursor() as cursor:
+            sizes = {schema: index_sizes(cursor, schema) for schema in (LEGACY_SCHEMA, PARTITIONED_SCHEMA)}
+    finally:
+        conn.close()
+
+    print(f"\n{'query':<38} {'legacy ms':>10} {'new ms':>10} {'speedup':>8}")
+    for r in results:
+        speedup = r['legacy_ms'] / r['partitioned_ms'] if r['partitioned_ms'] else float('inf')
+        print(f"{r['query']:<38} {r['legacy_ms']:>10.2f} {r['partitioned_ms']:>10.2f} {speedup:>7.1f}x")
+    for schema, schema_sizes in sizes.items():
+        print(f"\nIndexes in {schema}:")
+        for name, size in schema_sizes.items():
+            print(f"  {name:<45} {size / 1024 / 1024:8.1f} MB")
+
+if __name__ == '__main__':
+    main()
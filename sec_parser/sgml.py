@@ -0,0 +1,143 @@
+import logging
+import re
+from typing import List, Dict, Any, Optional, Iterator
+
+from lxml import etree
+
+from . import parsers
+
+# EDGAR's .txt full submissions are SGML: an optional <SEC-HEADER>, then one
+# <DOCUMENT> block per file of the filing (cover page, information table,
+# exhibits, ...), each a few header lines followed by the file itself between
+# <TEXT> and </TEXT>, XML files additionally wrapped in <XML>...</XML>.
+
+_SUBMISSION_START = re.compile(rb'\s*<(?:SEC-DOCUMENT|IMS-DOCUMENT|SEC-HEADER|IMS-HEADER|DOCUMENT)>')
+_HEADER_FIELD = re.compile(rb'^<([A-Z-]+)>[ \t]*([^\r\n<]*)', re.M)
+_WHITESPACE = b' \t\r\n'
+
+_CUSIP = re.compile(rb'CUSIP', re.I)
+_COVER_PAGE = re.compile(rb'FORM 13F (?:COVER|SUMMARY) PAGE', re.I)
+_INFOTABLE_ROOT = re.compile(rb'<(?:\w+:)?informationTable\b', re.I)
+
+class Document:
+    """
+    One <DOCUMENT> of a submission. `body` is a memoryview into the submission
+    (the file between <TEXT> and </TEXT>, or between <XML> and </XML>), so
+    nothing is copied until a parser reads it.
+    """
+    def __init__(self, doc_type: str, filename: Optional[str], sequence: Optional[str],
+                 description: Optional[str], body: memoryview, is_xml: bool):
+        self.type = doc_type
+        self.filename = filename
+        self.sequence = sequence
+        self.description = description
+        self.body = body
+        self.is_xml = is_xml
+
+    def text(self) -> str:
+        return parsers.decode_text(self.body)
+
+    def __repr__(self) -> str:
+        return f"Document(type={self.type!r}, filename={self.filename!r}, bytes={len(self.body)}, xml={self.is_xml})"
+
+def is_submission(data) -> bool:
+    """True for SGML text made of <DOCUMENT> blocks (e.g. a .txt full submission)."""
+    return _SUBMISSION_START.match(data) is not None
+
+def _skip_whitespace(data, start: int, end: int) -> int:
+    while start < end and data[start] in _WHITESPACE:
+        start += 1
+    return start
+
+def _body_bounds(data, start: int, end: int):
+    """Trims the <TEXT> contents to the file itself; unwraps <XML> blocks."""
+    start = _skip_whitespace(data, start, end)
+    if data.find(b'<XML>', start, start + 5) == start:
+        xml_end = data.rfind(b'</XML>', start, end)
+        return _skip_whitespace(data, start + 5, end), (end if xml_end == -1 else xml_end), True
+    return start, end, False
+
+def iter_documents(data) -> Iterator[Document]:
+    """
+    Splits a submission (bytes or an mmap) into its documents with a single
+    forward scan for the block delimiters. Only the few header lines of each
+    block are copied; bodies are memoryview slices of `data`.
+    """
+    view = memoryview(data)
+    pos = 0
+    while True:
+        start = data.find(b'<DOCUMENT>', pos)
+        if start == -1:
+            return
+        end = data.find(b'</DOCUMENT>', start)
+        if end == -1:
+            end = len(data)
+        text = data.find(b'<TEXT>', start, end)
+        header_end = end if text == -1 else text
+        fields = {key.decode('ascii'): value.decode('latin-1').strip()
+                  for key, value in _HEADER_FIELD.findall(view[start:header_end])}
+
+        if text == -1:
+            body_start = body_end = end
+            is_xml = False
+        else:
+            body_start = text + len(b'<TEXT>')
+            body_end = data.rfind(b'</TEXT>', body_start, end)
+            body_start, body_end, is_xml = _body_bounds(data, body_start, end if body_end == -1 else body_end)
+        body = view[body_start:body_end]
+        if not is_xml:
+            is_xml = parsers.looks_like_xml(body[:256])
+
+        yield Document(fields.get('TYPE', '').upper(), fields.get('FILENAME') or None, fields.get('SEQUENCE') or None,
+                       fields.get('DESCRIPTION') or None, body, is_xml)
+        pos = end + len(b'</DOCUMENT>')
+
+def parse_13f_submission(data, file_path_str: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Parses a 13F-HR submission document by document, with the same return
+    convention as parsers.parse_13f_hr: the holdings, [] if there are none, or
+    None for a cover page without a data table.
+
+    XML information tables are streamed from their slice; a malformed one is
+    logged and contributes no rows. Text and HTML documents only go through
+    lxml if they mention a CUSIP, so cover pages and exhibits are never parsed.
+    """
+    holdings: List[Dict[str, Any]] = []
+    found_table = cover_page = False
+    for document in iter_documents(data):
+        body = document.body
+        if document.is_xml:
+            if _INFOTABLE_ROOT.search(body, 0, 4096):
+                found_table = True
+                try:
+                    holdings.extend(list(parsers.iter_13f_xml_buffer(body)))
+                except etree.XMLSyntaxError as e:
+                    # Like parse_13f_hr, keep none of a malformed table's rows rather than the part before the error.
+                    logging.warning(f"Skipping malformed information table {document.filename or ''} in {file_path_str}: {e}")
+            continue
+        if not _CUSIP.search(body):
+            cover_page = cover_page or _COVER_PAGE.search(body) is not None
+            continue
+        rows = parsers.parse_13f_hr(body, file_path_str)
+        if rows is None:
+            cover_page = True
+        elif rows:
+            holdings.extend(rows)
+            found_table = True
+    if holdings or found_table or not cover_page:
+        return holdings
+    return None
+
+def parse_form4_submission(data) -> List[Dict[str, Any]]:
+    """Parses the Form 4 (or 4/A) document of a submission, skipping its exhibits."""
+    for document in iter_documents(data):
+        if document.type not in ('4', '4/A'):
+            continue
+        if not document.is_xml:
+            return parsers.parse_form4(document.body)
+        try:
+            root = etree.fromstring(document.body.tobytes())
+        except etree.XMLSyntaxError:
+            return []
+        return parsers.parse_form4(document.body, root)
+    return []
@@ -0,0 +1,174 @@
+from datetime import date
+from pathlib import Path
+from typing import Optional, List, Union, Iterable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# --- CONFIGURATION ---
+# Holdings are partitioned by fund and quarter, insider transactions by the
+# month they were filed. Each filing is written as its own file inside its
+# partition (named after the accession number), so writes are append-only and
+# re-writing a filing replaces its file, wherever the filing was stored before.
+HOLDINGS_PARTITIONING = ds.partitioning(
+    pa.schema([('fund_cik', pa.string()), ('report_date', pa.date32())]), flavor='hive')
+TRANSACTIONS_PARTITIONING = ds.partitioning(
+    pa.schema([('filing_month', pa.string())]), flavor='hive')
+
+HOLDINGS_SCHEMA = pa.schema([
+    ('fund_cik', pa.string()),
+    ('report_date', pa.date32()),
+    ('filing_date', pa.timestamp('ns')),
+    ('cusip', pa.string()),
+    ('company_name', pa.string()),
+    ('shares', pa.int64()),
+    ('value_usd', pa.int64()),
+    ('share_type', pa.string()),
+    ('put_call', pa.string()),
+    ('accession_no', pa.string()),
+    ('raw_json', pa.string()),
+    ('raw_sha256', pa.string()),
+    ('raw_offset', pa.int32()),
+    ('raw_parser_version', pa.int16()),
+])
+
+TRANSACTIONS_SCHEMA = pa.schema([
+    ('accession_no', pa.string()),
+    ('transaction_no', pa.int32()),
+    ('issuer_cik', pa.string()),
+    ('issuer_ticker', pa.string()),
+    ('issuer_name', pa.string()),
+    ('insider_cik', pa.string()),
+    ('insider_name', pa.string()),
+    ('insider_relation', pa.string()),
+    ('filing_date', pa.timestamp('ns')),
+    ('transaction_date', pa.timestamp('ns')),
+    ('transaction_code', pa.string()),
+    ('shares', pa.int64()),
+    ('price_per_share', pa.float64()),
+    ('shares_owned_after', pa.int64()),
+    ('raw_json', pa.string()),
+    ('raw_sha256', pa.string()),
+    ('raw_offset', pa.int32()),
+    ('raw_parser_version', pa.int16()),
+    ('filing_month', pa.string()),
+])
+
+def _to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Converts a normalized DataFrame to the store's fixed schema (columns it lacks are null)."""
+    columns = {}
+    for field in schema:
+        if field.name in df.columns:
+            values = df[field.name]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            columns[field.name] = pa.array(values, from_pandas=True).cast(field.type)
+        else:
+            columns[field.name] = pa.nulls(len(df), field.type)
+    return pa.table(columns, schema=schema)
+
+def _remove_filing(root: Path, partitioning: ds.Partitioning, accession_no: str):
+    """
+    Deletes a filing's files from every partition, so a re-parse that moves it
+    (e.g. a corrected report or filing date) doesn't leave its old rows behind.
+    """
+    pattern = '/'.join(['*'] * len(partitioning.schema) + [f"{accession_no}-*.parquet"])
+    for path in root.glob(pattern):
+        path.unlink()
+
+def _write(table: pa.Table, root: Path, partitioning: ds.Partitioning, accession_no: str):
+    _remove_filing(root, partitioning, accession_no)
+    ds.write_dataset(
+        table, str(root), format='parquet', partitioning=partitioning,
+        basename_template=f"{accession_no}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+def write_holdings(df: pd.DataFrame, root: Union[str, Path], accession_no: str):
+    """Appends one 13F filing's normalized holdings to the store under `root`/holdings."""
+    if df.empty:
+        _remove_filing(Path(root) / 'holdings', HOLDINGS_PARTITIONING, accession_no)
+        return
+    _write(_to_table(df, HOLDINGS_SCHEMA), Path(root) / 'holdings', HOLDINGS_PARTITIONING, accession_no)
+
+def write_transactions(df: pd.DataFrame, root: Union[str, Path], accession_no: str):
+    """Appends one Form 4 filing's normalized transactions to the store under `root`/transactions."""
+    if df.empty:
+        _remove_filing(Path(root) / 'transactions', TRANSACTIONS_PARTITIONING, accession_no)
+        return
+    df = df.assign(filing_month=pd.to_datetime(df['filing_date']).dt.strftime('%Y-%m'))
+    _write(_to_table(df, TRANSACTIONS_SCHEMA), Path(root) / 'transactions', TRANSACTIONS_PARTITIONING, accession_no)
+
+def _as_list(value: Union[str, Iterable[str]]) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+def _date(value) -> date:
+    return pd.Timestamp(value).date()
+
+def _read(root: Path, schema: pa.Schema, partitioning: ds.Partitioning,
+          filter_expr: Optional[ds.Expression], columns: Optional[List[str]]) -> pd.DataFrame:
+    if not root.exists():
+        return pd.DataFrame(columns=columns or schema.names)
+    dataset = ds.dataset(str(root), format='parquet', schema=schema, partitioning=partitioning)
+    df = dataset.to_table(filter=filter_expr, columns=columns).to_pandas()
+    # Match the dtypes produced by utils.normalize_*.
+    for name in ('fund_cik', 'cusip', 'share_type', 'put_call', 'accession_no', 'insider_cik', 'transaction_code'):
+        if name in df.columns:
+            df[name] = df[name].astype('category')
+    for name in ('transaction_no', 'shares', 'value_usd', 'shares_owned_after', 'raw_offset', 'raw_parser_version'):
+        if name in df.columns:
+            df[name] = df[name].astype('Int64')
+    if 'report_date' in df.columns:
+        df['report_date'] = pd.to_datetime(df['report_date']).astype('datetime64[ns]')
+    return df
+
+def read_holdings(root: Union[str, Path], fund_cik: Optional[Union[str, Iterable[str]]] = None,
+                  start=None, end=None, cusips: Optional[Iterable[str]] = None,
+                  columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads holdings from the store. Filters are pushed down to the dataset:
+    `fund_cik` (one or several) and the inclusive report_date range
+    `start`..`end` prune whole partitions, `cusips` is applied as a row filter
+    inside the Parquet scan.
+    """
+    conditions = []
+    if fund_cik is not None:
+        conditions.append(ds.field('fund_cik').isin(_as_list(fund_cik)))
+    if start is not None:
+        conditions.append(ds.field('report_date') >= _date(start))
+    if end is not None:
+        conditions.append(ds.field('report_date') <= _date(end))
+    if cusips is not None:
+        conditions.append(ds.field('cusip').isin(_as_list(cusips)))
+    filter_expr = None
+    for condition in conditions:
+        filter_expr = condition if filter_expr is None else filter_expr & condition
+    return _read(Path(root) / 'holdings', HOLDINGS_SCHEMA, HOLDINGS_PARTITIONING, filter_expr, columns)
+
+def read_transactions(root: Union[str, Path], start=None, end=None,
+                      issuer_cik: Optional[Union[str, Iterable[str]]] = None,
+                      tickers: Optional[Iterable[str]] = None,
+                      columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads insider transactions filed between `start` and `end` (inclusive).
+    The date range prunes filing-month partitions before the row-level
+    filing_date filter; `issuer_cik` and `tickers` are row filters.
+    """
+    conditions = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field('filing_month') >= start.strftime('%Y-%m'))
+        conditions.append(ds.field('filing_date') >= start)
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field('filing_month') <= end.strftime('%Y-%m'))
+        conditions.append(ds.field('filing_date') <= end)
+    if issuer_cik is not None:
+        conditions.append(ds.field('issuer_cik').isin(_as_list(issuer_cik)))
+    if tickers is not None:
+        conditions.append(ds.field('issuer_ticker').isin(_as_list(tickers)))
+    filter_expr = None
+    for condition in conditions:
+        filter_expr = condition if filter_expr is None else filter_expr & condition
+    return _read(Path(root) / 'transactions', TRANSACTIONS_SCHEMA, TRANSACTIONS_PARTITIONING, filter_expr, columns)
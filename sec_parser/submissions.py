@@ -0,0 +1,185 @@
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable
+
+# --- CONFIGURATION ---
+# The "smart money" CIKs tracked by default.
+TRACKED_CIKS = [
+    '0000904495',
+    '0001517137',
+    '0001345471',
+    '0001336528',
+    '0001351069',
+    '0001067983',
+    '0001112520',
+    '0001571785',
+    '0001709323',
+    '0001061768',
+    '0000807985',
+    '0001720792',
+    '0000029440',
+    '0001325447',
+    '0001079114',
+    '0001582090',
+    '0001159159',
+    '0001559771',
+]
+# CIKs handed to a pool worker at a time.
+CIKS_PER_TASK = 64
+
+# A filings page in EDGAR's columnar layout: {'accessionNumber': [...], 'form': [...], ...}.
+Filings = Dict[str, List[Any]]
+
+def pad_cik(cik: Any) -> str:
+    return f"{int(cik):010d}"
+
+def cik_filename(cik: Any) -> str:
+    """Name of a CIK's submissions JSON in submissions.zip (e.g. CIK0000904495.json)."""
+    return f"CIK{pad_cik(cik)}.json"
+
+def merge_pages(submission: Dict[str, Any], read_page: Callable[[str], Optional[Dict[str, Any]]]) -> Filings:
+    """
+    All of a submission's filings as one columnar dict: filings.recent (the
+    latest 1,000 or so) followed by every overflow page listed in
+    filings.files, read with `read_page(name)`. Pages that can't be read are
+    skipped; columns missing from a page are padded with None.
+    """
+    filings = submission.get('filings', {})
+    merged: Filings = {key: list(values) for key, values in filings.get('recent', {}).items()}
+    rows = len(merged.get('accessionNumber', []))
+    for page_ref in filings.get('files', []):
+        page = read_page(page_ref['name'])
+        if not page:
+            continue
+        page_rows = len(page.get('accessionNumber', []))
+        for key in set(merged) | set(page):
+            merged.setdefault(key, [None] * rows).extend(page.get(key, [None] * page_rows))
+        rows += page_rows
+    return merged
+
+def filter_forms(filings: Filings, forms: Optional[Iterable[str]]) -> Filings:
+    """Only the rows whose form type is in `forms` (all of them if forms is None)."""
+    if forms is None:
+        return filings
+    forms = set(forms)
+    keep = [i for i, form in enumerate(filings.get('form', [])) if form in forms]
+    return {key: [values[i] for i in keep] for key, values in filings.items()}
+
+class SubmissionsArchive:
+    """
+    Reads EDGAR's bulk submissions.zip in place. Opening it reads the zip's
+    central directory once into ZipFile's name -> member dict, so finding a
+    CIK is a dictionary lookup however many (~900k) files the archive holds,
+    and its JSON is decompressed and parsed straight from the archive with no
+    temporary files.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.zf = zipfile.ZipFile(path)
+
+    def __enter__(self) -> 'SubmissionsArchive':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+
+    def __contains__(self, cik: Any) -> bool:
+        return self._info(cik_filename(cik)) is not None
+
+    def _info(self, name: str) -> Optional[zipfile.ZipInfo]:
+        try:
+            return self.zf.getinfo(name)
+        except KeyError:
+            return None
+
+    def read_json(self, name: str) -> Optional[Dict[str, Any]]:
+        info = self._info(name)
+        if info is None:
+            return None
+        return json.loads(self.zf.read(info))
+
+    def submission(self, cik: Any) -> Optional[Dict[str, Any]]:
+        """The CIK's submissions JSON as is, or None if it isn't in the archive."""
+        return self.read_json(cik_filename(cik))
+
+    def filings(self, cik: Any, forms: Optional[Iterable[str]] = None) -> Optional[Filings]:
+        """The CIK's complete filing history, overflow pages included, optionally limited to `forms`."""
+        submission = self.submission(cik)
+        if submission is None:
+            return None
+        return filter_forms(merge_pages(submission, self.read_json), forms)
+
+    def extract(self, cik: Any, output_dir: str) -> List[str]:
+        """Copies the CIK's JSON and its overflow pages to `output_dir`. Returns the files written."""
+        submission = self.submission(cik)
+        if submission is None:
+            return []
+        names = [cik_filename(cik)] + [page['name'] for page in submission.get('filings', {}).get('files', [])]
+        written = []
+        os.makedirs(output_dir, exist_ok=True)
+        for name in names:
+            info = self._info(name)
+            if info is None:
+                continue
+            path = os.path.join(output_dir, name)
+            with open(path, 'wb') as f:
+                f.write(self.zf.read(info))
+            written.append(path)
+        return written
+
+# Each pool worker opens the archive once and reuses it for every task.
+_worker_archive: Optional[SubmissionsArchive] = None
+
+def _init_worker(path: str):
+    global _worker_archive
+    _worker_archive = SubmissionsArchive(path)
+
+def _read_chunk(ciks: List[str], forms: Optional[List[str]]) -> List[Tuple[str, Optional[Filings]]]:
+    return [(cik, _worker_archive.filings(cik, forms)) for cik in ciks]
+
+def iter_filings(path: str, ciks: Iterable[Any], forms: Optional[Iterable[str]] = None,
+                 workers: Optional[int] = None) -> Iterator[Tuple[str, Optional[Filings]]]:
+    """
+    Yields (10-digit CIK, filings) for each CIK, in order; filings is None for
+    CIKs missing from the archive. Large CIK sets are read by a process pool in
+    chunks of CIKS_PER_TASK; `forms` is applied in the workers so only the
+    filings of interest travel back.
+    """
+    ciks = [pad_cik(cik) for cik in ciks]
+    forms = list(forms) if forms is not None else None
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(ciks) <= CIKS_PER_TASK:
+        with SubmissionsArchive(path) as archive:
+            for cik in ciks:
+                yield cik, archive.filings(cik, forms)
+        return
+
+    chunks = [ciks[i:i + CIKS_PER_TASK] for i in range(0, len(ciks), CIKS_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as executor:
+        for results in executor.map(_read_chunk, chunks, [forms] * len(chunks)):
+            yield from results
+
+def read_fund_data(fund_data_dir: str) -> Iterator[Tuple[str, Filings]]:
+    """
+    Yields (CIK, filings) for the CIK JSON files extracted to a directory,
+    following their overflow pages when those were extracted too.
+    """
+    def read_page(name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(fund_data_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    for json_file in sorted(os.listdir(fund_data_dir)):
+        # Overflow pages (CIK##########-submissions-001.json) are read with their CIK.
+        if not json_file.endswith('.json') or '-submissions-' in json_file:
+            continue
+        with open(os.path.join(fund_data_dir, json_file), 'r') as f:
+            submission = json.load(f)
+        yield json_file.replace('CIK', '').replace('.json', ''), merge_pages(submission, read_page)
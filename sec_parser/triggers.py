@@ -0,0 +1,262 @@
+import re
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+# Open-market purchase.
+PURCHASE_CODE = 'P'
+# Roles whose purchases trigger an alert on their own, matched against insider_relation.
+EXECUTIVE_ROLES = re.compile(
+    r'\b(?:CEO|CFO|COO|chief\s+(?:executive|financial|operating)\s+officer|'
+    r'principal\s+(?:executive|financial)\s+officer)\b', re.I)
+# A cluster buy: at least this many different insiders buying within the window.
+CLUSTER_MIN_INSIDERS = 3
+CLUSTER_WINDOW_DAYS = 30
+# Form 4s can be filed long after the transaction. Purchases are kept for this
+# long beyond the window, counted back from the issuer's latest transaction_date,
+# so a late filing is still matched with the purchases around its own date.
+LATE_FILING_DAYS = 365
+# Per-record latencies kept for the percentiles in stats().
+LATENCY_SAMPLES = 100_000
+
+# Alert kinds.
+EXECUTIVE_BUY = 'executive_buy'
+CLUSTER_BUY = 'cluster_buy'
+
+def normalize_cik(cik: Any) -> Optional[str]:
+    """CIKs appear both zero-padded and not; index them without the padding."""
+    if cik is None or cik is pd.NA or (isinstance(cik, float) and np.isnan(cik)):
+        return None
+    cik = str(cik).strip().lstrip('0')
+    return cik or None
+
+def normalize_ticker(ticker: Any) -> Optional[str]:
+    if ticker is None or ticker is pd.NA or (isinstance(ticker, float) and np.isnan(ticker)):
+        return None
+    ticker = str(ticker).strip().upper()
+    return ticker or None
+
+class WatchlistIndex:
+    """
+    The Whale Watchlist as hash maps from issuer CIK, ticker and CUSIP to the
+    watchlist entry, so checking a transaction is a dictionary lookup.
+
+    13F holdings only carry CUSIPs while Form 4s identify the issuer by CIK and
+    ticker, so entries should be added with whatever identifiers are known for
+    the security.
+    """
+    def __init__(self):
+        self.by_cik: Dict[str, Dict[str, Any]] = {}
+        self.by_ticker: Dict[str, Dict[str, Any]] = {}
+        self.by_cusip: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, cusip: Optional[str] = None, issuer_cik: Optional[str] = None,
+            ticker: Optional[str] = None, **info) -> Dict[str, Any]:
+        """Adds (or extends) a watchlist entry; extra keyword arguments are kept on the entry."""
+        issuer_cik, ticker = normalize_cik(issuer_cik), normalize_ticker(ticker)
+        entry = self.lookup(issuer_cik, ticker, cusip)
+        if entry is None:
+            entry = {}
+        for key, value in (('cusip', cusip), ('issuer_cik', issuer_cik), ('ticker', ticker)):
+            if value and not entry.get(key):
+                entry[key] = value
+        entry.update({key: value for key, value in info.items() if value is not None})
+        if entry.get('cusip'):
+            self.by_cusip[entry['cusip']] = entry
+        if entry.get('issuer_cik'):
+            self.by_cik[entry['issuer_cik']] = entry
+        if entry.get('ticker'):
+            self.by_ticker[entry['ticker']] = entry
+        return entry
+
+    def remove(self, cusip: Optional[str] = None, issuer_cik: Optional[str] = None, ticker: Optional[str] = None):
+        entry = self.lookup(normalize_cik(issuer_cik), normalize_ticker(ticker), cusip)
+        if entry is None:
+            return
+        self.by_cusip.pop(entry.get('cusip'), None)
+        self.by_cik.pop(entry.get('issuer_cik'), None)
+        self.by_ticker.pop(entry.get('ticker'), None)
+
+    def lookup(self, issuer_cik: Optional[str] = None, ticker: Optional[str] = None,
+               cusip: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Finds an entry by CIK, then ticker, then CUSIP. Expects normalized CIK/ticker."""
+        if issuer_cik and issuer_cik in self.by_cik:
+            return self.by_cik[issuer_cik]
+        if ticker and ticker in self.by_ticker:
+            return self.by_ticker[ticker]
+        if cusip and cusip in self.by_cusip:
+            return self.by_cusip[cusip]
+        return None
+
+    @classmethod
+    def from_frame(cls, watchlist: pd.DataFrame) -> 'WatchlistIndex':
+        """
+        Builds an index from a DataFrame with any of the columns cusip,
+        issuer_cik and ticker (e.g. HoldingsDiffEngine.watchlist() joined with
+        issuer identifiers); other columns are kept on the entries.
+        """
+        index = cls()
+        for row in watchlist.to_dict('records'):
+            row = {key: (None if value is pd.NA or (isinstance(value, float) and np.isnan(value)) else value)
+                   for key, value in row.items()}
+            index.add(**row)
+        return index
+
+class TriggerEngine:
+    """
+    Evaluates a stream of normalize_form4_data() records against a
+    WatchlistIndex and raises alerts for:
+
+    - executive buys: an open-market purchase (code 'P') by a CEO, CFO or COO
+      of a watchlisted issuer;
+    - cluster buys: purchases by at least `cluster_min_insiders` different
+      insiders of the same watchlisted issuer within `window_days`.
+
+    Each record costs a few dictionary lookups plus work on the issuer's
+    recent purchases, kept sorted by transaction_date (filing_date when that's
+    missing) with bisect. Records arrive in filing order, so a late filing can
+    land before purchases already seen: a cluster is any `window_days` span
+    around the purchase, not just the days up to it. Purchases older than the
+    issuer's latest one by more than the window plus `late_filing_days` are
+    dropped.
+    """
+    def __init__(self, index: WatchlistIndex, window_days: int = CLUSTER_WINDOW_DAYS,
+                 cluster_min_insiders: int = CLUSTER_MIN_INSIDERS, executive_roles=EXECUTIVE_ROLES,
+                 late_filing_days: int = LATE_FILING_DAYS):
+        self.index = index
+        self.window = pd.Timedelta(days=window_days)
+        self.retention = self.window + pd.Timedelta(days=late_filing_days)
+        self.cluster_min_insiders = cluster_min_insiders
+        self.executive_roles = executive_roles
+        # Per issuer, its purchases' dates (sorted) and the insiders at the same positions.
+        self._windows: Dict[str, Tuple[List[pd.Timestamp], List[str]]] = {}
+        self.counters = Counter()
+        self.latencies_ns = deque(maxlen=LATENCY_SAMPLES)
+        self.busy_seconds = 0.0
+
+    def process(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Evaluates one transaction and returns the alerts it raised (usually none)."""
+        start = time.perf_counter_ns()
+        try:
+            return self._process(record)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self.latencies_ns.append(elapsed)
+            self.busy_seconds += elapsed / 1e9
+            self.counters['records'] += 1
+
+    def _process(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        issuer_cik = normalize_cik(record.get('issuer_cik'))
+        ticker = normalize_ticker(record.get('issuer_ticker'))
+        entry = self.index.lookup(issuer_cik, ticker)
+        if entry is None:
+            return []
+        self.counters['on_watchlist'] += 1
+        if record.get('transaction_code') != PURCHASE_CODE:
+            return []
+        self.counters['purchases'] += 1
+
+        alerts = []
+        relation = record.get('insider_relation') or ''
+        if isinstance(relation, str) and self.executive_roles.search(relation):
+            alerts.append(self._alert(EXECUTIVE_BUY, entry, record))
+
+        date = record.get('transaction_date')
+        if date is None or date is pd.NaT or date is pd.NA:
+            date = record.get('filing_date')
+        if date is not None and date is not pd.NaT and date is not pd.NA:
+            insiders = self._slide(entry, pd.Timestamp(date), record)
+            if insiders is not None:
+                alert = self._alert(CLUSTER_BUY, entry, record)
+                alert['insiders'] = insiders
+                alerts.append(alert)
+
+        self.counters['alerts'] += len(alerts)
+        for alert in alerts:
+            self.counters[alert['kind']] += 1
+        return alerts
+
+    def _slide(self, entry: Dict[str, Any], date: pd.Timestamp, record: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        Adds a purchase to the issuer's window. Returns the insiders of a
+        `window` span containing this purchase when this purchase brought in
+        a new insider and the cluster is big enough, otherwise None.
+        """
+        key = entry.get('issuer_cik') or entry.get('ticker') or entry.get('cusip')
+        dates, insiders = self._windows.setdefault(key, ([], []))
+        if dates:
+            expired = bisect_left(dates, max(dates[-1], date) - self.retention)
+            if expired:
+                del dates[:expired], insiders[:expired]
+
+        insider = normalize_cik(record.get('insider_cik')) or record.get('insider_name') or '?'
+        first = bisect_left(dates, date - self.window)
+        last = bisect_right(dates, date + self.window)
+        is_new = insider not in insiders[first:last]
+        position = bisect_right(dates, date)
+        dates.insert(position, date)
+        insiders.insert(position, insider)
+        if not is_new:
+            return None
+
+        # Every span of `window` containing the purchase starts at a purchase
+        # between date - window and this one.
+        for start in range(first, position + 1):
+            end = bisect_right(dates, dates[start] + self.window, lo=position)
+            cluster = list(dict.fromkeys(insiders[start:end]))
+            if len(cluster) >= self.cluster_min_insiders:
+                return cluster
+        return None
+
+    @staticmethod
+    def _alert(kind: str, entry: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'kind': kind,
+            'issuer_cik': record.get('issuer_cik'),
+            'issuer_ticker': record.get('issuer_ticker'),
+            'cusip': entry.get('cusip'),
+            'company_name': entry.get('company_name'),
+            'accession_no': record.get('accession_no'),
+            'insider_name': record.get('insider_name'),
+            'insider_relation': record.get('insider_relation'),
+            'transaction_date': record.get('transaction_date'),
+            'filing_date': record.get('filing_date'),
+            'shares': record.get('shares'),
+            'price_per_share': record.get('price_per_share'),
+        }
+
+    def consume(self, transactions: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Processes every row of one normalize_form4_data() DataFrame, in order."""
+        alerts = []
+        if transactions.empty:
+            return alerts
+        for record in transactions.to_dict('records'):
+            alerts.extend(self.process(record))
+        return alerts
+
+    def run(self, stream: Iterable[pd.DataFrame]) -> Iterator[Dict[str, Any]]:
+        """Consumes a stream of per-filing DataFrames, yielding alerts as they're raised."""
+        for transactions in stream:
+            yield from self.consume(transactions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus throughput (records per second of evaluation time) and latency percentiles."""
+        stats = dict(self.counters)
+        stats['records_per_sec'] = self.counters['records'] / self.busy_seconds if self.busy_seconds else 0.0
+        if self.latencies_ns:
+            p50, p99, p_max = np.percentile(np.fromiter(self.latencies_ns, dtype=np.int64), [50, 99, 100])
+            stats.update(latency_p50_us=p50 / 1e3, latency_p99_us=p99 / 1e3, latency_max_us=p_max / 1e3)
+        return stats
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    line = (f"Evaluated {stats.get('records', 0)} transactions ({stats.get('on_watchlist', 0)} on the watchlist, "
+            f"{stats.get('purchases', 0)} purchases), raised {stats.get('alerts', 0)} alert(s); "
+            f"{stats.get('records_per_sec', 0.0):.0f} records/s")
+    if 'latency_p50_us' in stats:
+        line += f", p50 {stats['latency_p50_us']:.1f}us, p99 {stats['latency_p99_us']:.1f}us"
+    return line
@@ -2,6 +2,17 @@ import pandas as pd
 from typing import List, Dict, Any, Optional
 import json
 from datetime import datetime
+from functools import lru_cache
+
+from .parsers import PARSER_VERSION
+
+# --- CONFIGURATION ---
+# Up to this many records are normalized from plain Python lists. pandas'
+# vectorized string methods only pay for their per-call setup on larger
+# inputs, and most filings (Form 4s) hold a handful of records.
+SMALL_INPUT_ROWS = 64
+# Resolution of every date column, whichever path normalized it.
+DATE_DTYPE = 'datetime64[ns]'
 
 def to_int(value: Optional[str]) -> Optional[int]:
     """Safely convert a string to an integer, returning None on failure."""
@@ -44,60 +55,203 @@ def create_insider_relation(record: Dict[str, Any]) -> str:
         relations.append("10% Owner")
     return ', '.join(relations) if relations else "N/A"
 
-def normalize_13f_data(raw_data: List[Dict[str, Any]], metadata: Dict[str, Any]) -> pd.DataFrame:
+@lru_cache(maxsize=4096)
+def _cached_date(value: str) -> Optional[pd.Timestamp]:
+    """to_date for strings that repeat across filings (filing, report and transaction dates)."""
+    return to_date(value)
+
+def _column(records: pd.DataFrame, name: str) -> pd.Series:
+    """Returns a parser output column as nullable strings (all <NA> if the parser never set it)."""
+    if name not in records:
+        return pd.Series(pd.NA, index=records.index, dtype='string')
+    return records[name].astype('string')
+
+def _int_column(values: pd.Series) -> pd.Series:
+    """Vectorized to_int: strips commas, drops any decimal part, invalid values become <NA>."""
+    cleaned = values.str.replace(',', '', regex=False).str.split('.', n=1).str[0].str.strip()
+    return pd.to_numeric(cleaned, errors='coerce').astype('Int64')
+
+def _float_column(values: pd.Series) -> pd.Series:
+    """Vectorized to_float: strips commas, invalid values become <NA>."""
+    cleaned = values.str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(cleaned, errors='coerce').astype('Float64')
+
+def _stripped_date(value: Optional[str]) -> Optional[pd.Timestamp]:
+    """to_date with surrounding whitespace ignored, as every date column parses its values."""
+    value = value.strip() if value else value
+    return _cached_date(value) if value else None
+
+def _date_column(values: pd.Series) -> pd.Series:
+    """Vectorized to_date: each distinct value is parsed once, then mapped back."""
+    parsed = {value: _stripped_date(value) for value in values.dropna().unique()}
+    return pd.to_datetime(values.map(parsed), errors='coerce').astype(DATE_DTYPE)
+
+def _constant_date(value: Optional[str], length: int) -> pd.Series:
+    """A whole-file date (e.g. report_date) parsed once and broadcast to every row."""
+    return pd.Series(_stripped_date(value), index=pd.RangeIndex(length), dtype=DATE_DTYPE)
+
+def _repeated_category(value: Optional[str], length: int) -> pd.Categorical:
+    """A whole-file value (e.g. the fund CIK) as a single-category Categorical."""
+    if value is None:
+        return pd.Categorical.from_codes([-1] * length, dtype=pd.CategoricalDtype([]))
+    return pd.Categorical.from_codes([0] * length, dtype=pd.CategoricalDtype([value]))
+
+class _FrameColumns:
+    """Typed columns of parser records, converted in bulk through a DataFrame."""
+    def __init__(self, raw_data: List[Dict[str, Any]]):
+        self.records = pd.DataFrame.from_records(raw_data)
+
+    def text(self, name: str) -> pd.Series:
+        return _column(self.records, name)
+
+    def category(self, name: str) -> pd.Series:
+        return _column(self.records, name).astype('category')
+
+    def integer(self, name: str) -> pd.Series:
+        return _int_column(_column(self.records, name))
+
+    def number(self, name: str) -> pd.Series:
+        return _float_column(_column(self.records, name))
+
+    def date(self, name: str) -> pd.Series:
+        return _date_column(_column(self.records, name))
+
+class _ListColumns:
+    """
+    The same columns as _FrameColumns, with the same dtypes, converted value by
+    value. For up to SMALL_INPUT_ROWS records, where it's several times faster.
+    """
+    def __init__(self, raw_data: List[Dict[str, Any]]):
+        self.raw_data = raw_data
+
+    def _values(self, name: str) -> List[Optional[str]]:
+        return [None if record.get(name) is None else str(record[name]) for record in self.raw_data]
+
+    def text(self, name: str) -> pd.api.extensions.ExtensionArray:
+        return pd.array(self._values(name), dtype='string')
+
+    def category(self, name: str) -> pd.Categorical:
+        values = self._values(name)
+        categories = sorted({value for value in values if value is not None})
+        codes = {value: i for i, value in enumerate(categories)}
+        return pd.Categorical.from_codes([codes.get(value, -1) for value in values],
+                                         dtype=pd.CategoricalDtype(pd.Index(categories, dtype='string')))
+
+    def integer(self, name: str) -> pd.api.extensions.ExtensionArray:
+        return pd.array([to_int(value) for value in self._values(name)], dtype='Int64')
+
+    def number(self, name: str) -> pd.api.extensions.ExtensionArray:
+        return pd.array([to_float(value) for value in self._values(name)], dtype='Float64')
+
+    def date(self, name: str) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex([_stripped_date(value) for value in self._values(name)], dtype=DATE_DTYPE)
+
+def _columns(raw_data: List[Dict[str, Any]]):
+    return _ListColumns(raw_data) if len(raw_data) <= SMALL_INPUT_ROWS else _FrameColumns(raw_data)
+
+def _add_raw_ref(columns: Dict[str, Any], raw_ref: str, length: int):
+    """
+    Points each row at its parser record in the RawStore: the filing's hash,
+    the record's index and the parser version the index is valid for.
+    """
+    columns['raw_sha256'] = _repeated_category(raw_ref, length)
+    columns['raw_offset'] = pd.array(range(length), dtype='Int64')
+    columns['raw_parser_version'] = pd.array([PARSER_VERSION] * length, dtype='Int64')
+
+def normalize_13f_data(raw_data: List[Dict[str, Any]], metadata: Dict[str, Any],
+                       include_raw_json: bool = True, raw_ref: Optional[str] = None,
+                       accession_no: Optional[str] = None) -> pd.DataFrame:
     """
     Cleans and normalizes a list of dictionaries from a 13F parser
     and aligns it with the Quarterly_Holdings schema.
+
+    Works column-wise: numbers are converted in bulk and the file-level dates
+    are parsed once (small inputs are converted value by value into the same
+    dtypes). `cusip` and `fund_cik` are categorical, share and value
+    columns are nullable Int64. `share_type` (SH/PRN) and `put_call` tell
+    share positions from principal amounts and options, and `accession_no`
+    (when given) tells a filing from its amendments. Pass
+    include_raw_json=False to skip building the per-row `raw_json` column.
+    With `raw_ref` (the filing's RawStore hash), each row instead references
+    its record as `raw_sha256` plus `raw_offset`, its position in raw_data,
+    and `raw_parser_version`.
     """
     if not raw_data:
         return pd.DataFrame()
 
-    processed_data = []
-    for record in raw_data:
-        value_x1000 = to_int(record.get('value'))
-        
-        processed_record = {
-            'fund_cik': metadata.get('cik'),
-            'report_date': to_date(metadata.get('report_date')),
-            'filing_date': to_date(metadata.get('filing_date')),
-            'cusip': record.get('cusip'),
-            'company_name': record.get('nameOfIssuer'),
-            'shares': to_int(record.get('sshPrnamt')),
-            'value_usd': value_x1000 * 1000 if value_x1000 is not None else None,
-            'raw_json': json.dumps(record)
-        }
-        processed_data.append(processed_record)
-        
-    return pd.DataFrame(processed_data)
-
-def normalize_form4_data(raw_data: List[Dict[str, Any]], metadata: Dict[str, Any], accession_no: str) -> pd.DataFrame:
+    records = _columns(raw_data)
+    n = len(raw_data)
+
+    columns = {
+        'fund_cik': _repeated_category(metadata.get('cik'), n),
+        'report_date': _constant_date(metadata.get('report_date'), n),
+        'filing_date': _constant_date(metadata.get('filing_date'), n),
+        'cusip': records.category('cusip'),
+        'company_name': records.text('nameOfIssuer'),
+        'shares': records.integer('sshPrnamt'),
+        'value_usd': records.integer('value') * 1000,
+        'share_type': records.category('sshPrnamtType'),
+        'put_call': records.category('putCall'),
+        'accession_no': _repeated_category(accession_no, n),
+    }
+    if include_raw_json:
+        columns['raw_json'] = [json.dumps(record) for record in raw_data]
+    if raw_ref is not None:
+        _add_raw_ref(columns, raw_ref, n)
+    return pd.DataFrame(columns)
+
+def share_positions(holdings: pd.DataFrame) -> pd.Series:
+    """
+    The normalize_13f_data() lines that are share positions: not options
+    (put_call) and not principal amounts (share_type PRN), whose numbers
+    aren't share counts and mustn't be summed into a CUSIP's shares. Frames
+    without those columns are taken to hold share positions only.
+    """
+    mask = pd.Series(True, index=holdings.index)
+    if 'put_call' in holdings:
+        mask &= holdings['put_call'].isna()
+    if 'share_type' in holdings:
+        mask &= holdings['share_type'].astype('string').str.upper().ne('PRN').fillna(True).astype(bool)
+    return mask
+
+def normalize_form4_data(raw_data: List[Dict[str, Any]], metadata: Dict[str, Any], accession_no: str,
+                         include_raw_json: bool = True, raw_ref: Optional[str] = None) -> pd.DataFrame:
     """
     Cleans and normalizes a list of dictionaries from a Form 4 parser
     and aligns it with the Insider_Transactions schema.
+
+    Works column-wise like normalize_13f_data; pass include_raw_json=False to
+    skip building the per-row `raw_json` column, and `raw_ref` to reference
+    the filing's RawStore records instead.
     """
     if not raw_data:
         return pd.DataFrame()
 
-    processed_data = []
-    for record in raw_data:
-        processed_record = {
-            'accession_no': accession_no,
-            'issuer_cik': record.get('issuer_cik'),
-            'issuer_ticker': record.get('issuer_ticker'),
-            'insider_cik': metadata.get('cik'), # The CIK from the directory is the insider's
-            'insider_name': record.get('reporting_owner_name'),
-            'insider_relation': create_insider_relation(record),
-            'filing_date': to_date(metadata.get('filing_date')),
-            'transaction_date': to_date(record.get('transaction_date')),
-            'transaction_code': record.get('transaction_code'),
-            'shares': to_int(record.get('shares_transacted')),
-            'price_per_share': to_float(record.get('price_per_share')),
-            'shares_owned_after': to_int(record.get('shares_owned_after')),
-            'raw_json': json.dumps({k: v for k, v in record.items() if not isinstance(v, bool)})
-        }
-        processed_data.append(processed_record)
-
-    return pd.DataFrame(processed_data)
+    records = _columns(raw_data)
+    n = len(raw_data)
+
+    columns = {
+        'accession_no': _repeated_category(accession_no, n),
+        'transaction_no': pd.array(range(n), dtype='Int64'),  # Position in the filing, part of the row's key
+        'issuer_cik': records.text('issuer_cik'),
+        'issuer_ticker': records.text('issuer_ticker'),
+        'issuer_name': records.text('issuer_name'),
+        'insider_cik': _repeated_category(metadata.get('cik'), n), # The CIK from the directory is the insider's
+        'insider_name': records.text('reporting_owner_name'),
+        'insider_relation': [create_insider_relation(record) for record in raw_data],
+        'filing_date': _constant_date(metadata.get('filing_date'), n),
+        'transaction_date': records.date('transaction_date'),
+        'transaction_code': records.category('transaction_code'),
+        'shares': records.integer('shares_transacted'),
+        'price_per_share': records.number('price_per_share'),
+        'shares_owned_after': records.integer('shares_owned_after'),
+    }
+    if include_raw_json:
+        columns['raw_json'] = [json.dumps({k: v for k, v in record.items() if not isinstance(v, bool)})
+                               for record in raw_data]
+    if raw_ref is not None:
+        _add_raw_ref(columns, raw_ref, n)
+    return pd.DataFrame(columns)
 
 if __name__ == '__main__':
     # Example usage with updated function signatures and dummy data
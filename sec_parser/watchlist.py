@@ -0,0 +1,226 @@
+import argparse
+import bisect
+from collections import Counter
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import store
+from .utils import share_positions
+
+# --- CONFIGURATION ---
+# A position counts as a "significant increase" for the watchlist when its share
+# count grew by at least this many percent quarter over quarter.
+SIGNIFICANT_INCREASE_PCT = 25.0
+# "Whale clustering": a CUSIP held by at least this many tracked funds.
+MIN_CLUSTER_FUNDS = 2
+
+# Change types emitted by the diff.
+NEW = 'new'
+INCREASED = 'increased'
+REDUCED = 'reduced'
+EXITED = 'exited'
+
+EVENT_COLUMNS = ['fund_cik', 'report_date', 'previous_report_date', 'cusip', 'company_name', 'change',
+                 'shares_before', 'shares_after', 'shares_change', 'pct_change', 'value_before', 'value_after']
+
+def positions(holdings: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapses one fund's holdings for one quarter to a single row per CUSIP
+    (13Fs often list a CUSIP on several lines), indexed by cusip. Option and
+    principal-amount lines are left out (see utils.share_positions()).
+    """
+    holdings = holdings[share_positions(holdings)]
+    # Plain object strings: categories differ between filings and Arrow-backed strings make joins slow.
+    cusips = holdings['cusip'].astype('string').astype(object)
+    grouped = holdings.assign(cusip=cusips).dropna(subset=['cusip']).groupby('cusip', sort=True)
+    return pd.DataFrame({
+        'company_name': grouped['company_name'].first(),
+        'shares': grouped['shares'].sum(min_count=1),
+        'value_usd': grouped['value_usd'].sum(min_count=1),
+    })
+
+def diff_positions(previous: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compares two positions() snapshots of the same fund with one outer join
+    and returns a row per CUSIP whose position changed. Positions with an
+    unknown share count on either side are only reported as new or exited.
+    """
+    merged = previous.merge(current, how='outer', left_index=True, right_index=True,
+                            suffixes=('_before', '_after'), indicator=True)
+    held_before = (merged['_merge'] != 'right_only').to_numpy()
+    held_after = (merged['_merge'] != 'left_only').to_numpy()
+    before = merged['shares_before'].astype('Float64')
+    after = merged['shares_after'].astype('Float64')
+
+    change = np.select(
+        [~held_before, ~held_after, (after > before).fillna(False).to_numpy(bool),
+         (after < before).fillna(False).to_numpy(bool)],
+        [NEW, EXITED, INCREASED, REDUCED],
+        default='',
+    )
+    keep = change != ''
+    merged, before, after = merged[keep], before[keep], after[keep]
+    pct_change = ((after - before) / before.where(before > 0)) * 100
+
+    events = pd.DataFrame({
+        'cusip': merged.index.astype(str),
+        'company_name': merged['company_name_after'].fillna(merged['company_name_before']).to_numpy(),
+        'change': change[keep],
+        'shares_before': merged['shares_before'].to_numpy(),
+        'shares_after': merged['shares_after'].to_numpy(),
+        'shares_change': (after.fillna(0) - before.fillna(0)).astype('Int64').to_numpy(),
+        'pct_change': pct_change.to_numpy(),
+        'value_before': merged['value_usd_before'].to_numpy(),
+        'value_after': merged['value_usd_after'].to_numpy(),
+    })
+    for name in ('shares_before', 'shares_after', 'value_before', 'value_after'):
+        events[name] = events[name].astype('Int64')
+    return events
+
+class HoldingsDiffEngine:
+    """
+    Keeps every fund's quarterly snapshots and the change events between
+    consecutive ones, plus how many funds hold each CUSIP in their latest
+    snapshot ("whale clustering").
+
+    update() is incremental: a new 13F is diffed only against the fund's
+    neighbouring quarters, so adding a filing never recomputes history. A fund's
+    first snapshot has nothing to compare with and produces no events. A filing
+    for a quarter that's already known (e.g. a 13F-HR/A restatement) replaces
+    that quarter's snapshot.
+    """
+    def __init__(self):
+        self.snapshots: Dict[str, Dict[pd.Timestamp, pd.DataFrame]] = {}
+        self.dates: Dict[str, List[pd.Timestamp]] = {}
+        self.cluster_counts: Counter = Counter()
+        self._events: Dict[Tuple[str, pd.Timestamp], pd.DataFrame] = {}
+        self._names: Dict[str, str] = {}
+        self._latest_cusips: Dict[str, Tuple[str, ...]] = {}
+
+    @classmethod
+    def from_holdings(cls, holdings: pd.DataFrame) -> 'HoldingsDiffEngine':
+        engine = cls()
+        engine.update(holdings)
+        return engine
+
+    @classmethod
+    def from_store(cls, root: str, fund_cik=None, start=None, end=None) -> 'HoldingsDiffEngine':
+        """Builds an engine from the holdings in a Parquet store (see store.py)."""
+        columns = ['fund_cik', 'report_date', 'cusip', 'company_name', 'shares', 'value_usd', 'share_type', 'put_call']
+        return cls.from_holdings(store.read_holdings(root, fund_cik=fund_cik, start=start, end=end, columns=columns))
+
+    def update(self, holdings: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds normalize_13f_data() output (one or more filings) and returns the
+        change events it created or revised.
+        """
+        if holdings.empty:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        changed = []
+        holdings = holdings.dropna(subset=['fund_cik', 'report_date'])
+        for (fund_cik, report_date), group in holdings.groupby(['fund_cik', 'report_date'], sort=True, observed=True):
+            changed.extend(self._add_snapshot(str(fund_cik), pd.Timestamp(report_date), positions(group)))
+        frames = [self._events[key] for key in dict.fromkeys(changed) if not self._events[key].empty]
+        if not frames:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def _add_snapshot(self, fund_cik: str, report_date: pd.Timestamp, snapshot: pd.DataFrame) -> List[Tuple[str, pd.Timestamp]]:
+        snapshots = self.snapshots.setdefault(fund_cik, {})
+        dates = self.dates.setdefault(fund_cik, [])
+        old_latest = dates[-1] if dates else None
+        if report_date not in snapshots:
+            bisect.insort(dates, report_date)
+        snapshots[report_date] = snapshot
+        names = snapshot['company_name'].dropna()
+        self._names.update(zip(names.index, names.to_numpy()))
+
+        # Only this quarter and the one after it (if the filing arrived out of order) need re-diffing.
+        changed = []
+        i = dates.index(report_date)
+        for j in (i, i + 1):
+            if 0 < j < len(dates):
+                self._diff(fund_cik, dates[j - 1], dates[j])
+                changed.append((fund_cik, dates[j]))
+
+        if dates[-1] == report_date:
+            if old_latest is not None:
+                self._uncount(self._latest_cusips.pop(fund_cik, ()))
+            cusips = tuple(snapshot.index[snapshot['shares'].fillna(0).to_numpy() > 0])
+            self.cluster_counts.update(cusips)
+            self._latest_cusips[fund_cik] = cusips
+        return changed
+
+    def _uncount(self, cusips: Tuple[str, ...]):
+        for cusip in cusips:
+            self.cluster_counts[cusip] -= 1
+            if self.cluster_counts[cusip] <= 0:
+                del self.cluster_counts[cusip]
+
+    def _diff(self, fund_cik: str, previous_date: pd.Timestamp, report_date: pd.Timestamp):
+        events = diff_positions(self.snapshots[fund_cik][previous_date], self.snapshots[fund_cik][report_date])
+        events.insert(0, 'fund_cik', fund_cik)
+        events.insert(1, 'report_date', report_date)
+        events.insert(2, 'previous_report_date', previous_date)
+        self._events[(fund_cik, report_date)] = events
+
+    def events(self, fund_cik: Optional[str] = None, latest_only: bool = False) -> pd.DataFrame:
+        """All change events, or only those of each fund's most recent quarter."""
+        frames = []
+        for cik, dates in self.dates.items():
+            if fund_cik is not None and cik != fund_cik:
+                continue
+            for report_date in (dates[-1:] if latest_only else dates):
+                events = self._events.get((cik, report_date))
+                if events is not None and not events.empty:
+                    frames.append(events)
+        if not frames:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def watchlist(self, min_increase_pct: float = SIGNIFICANT_INCREASE_PCT,
+                  min_funds: int = MIN_CLUSTER_FUNDS) -> pd.DataFrame:
+        """
+        The "Whale Watchlist": CUSIPs where, in their latest quarter, a fund
+        opened a position or grew one by at least `min_increase_pct`, or that
+        at least `min_funds` funds currently hold.
+        """
+        latest = self.events(latest_only=True)
+        signals = latest[(latest['change'] == NEW) |
+                         ((latest['change'] == INCREASED) & (latest['pct_change'] >= min_increase_pct))]
+        counts = signals.groupby(['cusip', 'change'])['fund_cik'].nunique().unstack(fill_value=0)
+        counts = counts.reindex(columns=[NEW, INCREASED], fill_value=0)
+
+        holders = pd.Series(self.cluster_counts, dtype='int64').rename_axis('cusip')
+        cusips = counts.index.union(holders.index[holders >= min_funds])
+        result = pd.DataFrame({
+            'cusip': cusips,
+            'company_name': [self._names.get(cusip) for cusip in cusips],
+            'funds_holding': holders.reindex(cusips, fill_value=0).to_numpy(),
+            'new_positions': counts[NEW].reindex(cusips, fill_value=0).to_numpy(),
+            'significant_increases': counts[INCREASED].reindex(cusips, fill_value=0).to_numpy(),
+        })
+        return result.sort_values(['funds_holding', 'new_positions', 'significant_increases', 'cusip'],
+                                  ascending=[False, False, False, True], ignore_index=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the Whale Watchlist from a Parquet holdings store.")
+    parser.add_argument('--store', required=True, metavar='DIR', help="Store written by main.py --store")
+    parser.add_argument('--min-funds', type=int, default=MIN_CLUSTER_FUNDS,
+                        help="Funds that must hold a CUSIP for it to count as clustered")
+    parser.add_argument('--min-increase-pct', type=float, default=SIGNIFICANT_INCREASE_PCT,
+                        help="Share increase (in percent) that counts as significant")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = HoldingsDiffEngine.from_store(args.store)
+    watchlist = engine.watchlist(min_increase_pct=args.min_increase_pct, min_funds=args.min_funds)
+    print(f"Tracked {len(engine.dates)} fund(s); {len(watchlist)} CUSIP(s) on the watchlist.")
+    if not watchlist.empty:
+        print(watchlist.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
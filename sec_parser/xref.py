@@ -0,0 +1,369 @@
+import argparse
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from . import store
+
+# --- CONFIGURATION ---
+# Open-ended validity ranges use these bounds.
+MIN_DATE = np.datetime64('1900-01-01', 'D')
+MAX_DATE = np.datetime64('9999-12-31', 'D')
+
+RECORD_DTYPE = np.dtype([
+    ('cusip', 'U9'), ('cik', 'U10'), ('ticker', 'U10'),
+    ('valid_from', 'datetime64[D]'), ('valid_to', 'datetime64[D]'),
+    # Next record with the same key, per key kind (-1 ends the chain).
+    ('next_cusip', 'i4'), ('next_cik', 'i4'), ('next_ticker', 'i4'),
+])
+OBSERVATION_DTYPE = np.dtype([
+    ('source', 'U1'), ('cusip', 'U9'), ('cik', 'U10'), ('ticker', 'U10'),
+    ('name', 'U64'), ('date', 'datetime64[D]'),
+])
+KINDS = ('cusip', 'cik', 'ticker')
+
+_NAME_PUNCTUATION = re.compile(r'[^A-Z0-9 ]+')
+_NAME_SUFFIXES = re.compile(r'(?:\s+(?:INC|CORP|CORPORATION|CO|COMPANY|LTD|LIMITED|PLC|LLC|LP|NV|SA|AG|THE|NEW|DEL|CL\s+[A-Z]|COM))+$')
+
+def issuer_key(name: Optional[str]) -> str:
+    """
+    Canonical issuer name for exact matching between a 13F nameOfIssuer and a
+    Form 4 issuerName, e.g. "Apple Inc." and "APPLE INC" both become "APPLE".
+    """
+    if not isinstance(name, str):
+        return ''
+    name = _NAME_PUNCTUATION.sub(' ', name.upper().replace('&', ' AND '))
+    name = ' '.join(name.split())
+    if name.startswith('THE '):
+        name = name[4:]
+    return _NAME_SUFFIXES.sub('', name)
+
+def _cik(value) -> str:
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return str(value).strip().lstrip('0')
+
+def _hash(key: str) -> int:
+    return zlib.crc32(key.encode('utf-8'))
+
+def _build_table(keys: np.ndarray, order: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds an open-addressing (linear probing) table over the distinct keys.
+    Each slot holds the first record of that key's chain; `next` links the
+    remaining records in `order`. Returns (slots, next).
+    """
+    keys = keys.tolist()
+    size = 1
+    while size < 2 * max(len(set(keys)), 1):
+        size <<= 1
+    # Built in plain lists (numpy scalar access is slow in a loop) and converted at the end.
+    slots = [-1] * size
+    nxt = [-1] * len(keys)
+    tails: Dict[str, int] = {}
+    for i in order.tolist():
+        key = keys[i]
+        if not key:
+            continue
+        if key in tails:
+            nxt[tails[key]] = i
+        else:
+            slot = _hash(key) & (size - 1)
+            while slots[slot] != -1:
+                slot = (slot + 1) & (size - 1)
+            slots[slot] = i
+        tails[key] = i
+    return np.array(slots, dtype=np.int32), np.array(nxt, dtype=np.int32)
+
+class CrossReference:
+    """
+    CUSIP <-> issuer CIK <-> ticker index with validity date ranges.
+
+    Records live in a numpy structured array, with one crc32-keyed open
+    addressing table per key kind whose slots point at the first record of a
+    chain (latest validity first). Everything is saved as .npy files and
+    loaded with mmap_mode='r', so opening even a large index takes
+    milliseconds and lookups touch only the pages they need.
+    """
+    def __init__(self, records: np.ndarray, tables: Dict[str, np.ndarray]):
+        self.records = records
+        self.tables = tables
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> 'CrossReference':
+        records = np.array(records, dtype=RECORD_DTYPE)
+        order = np.argsort(-records['valid_from'].astype('int64'), kind='stable')
+        tables = {}
+        for kind in KINDS:
+            tables[kind], records[f'next_{kind}'] = _build_table(records[kind], order)
+        return cls(records, tables)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> 'CrossReference':
+        directory = Path(directory)
+        mode = 'r' if mmap else None
+        records = np.load(directory / 'xref_records.npy', mmap_mode=mode)
+        tables = {kind: np.load(directory / f'xref_{kind}.npy', mmap_mode=mode) for kind in KINDS}
+        return cls(records, tables)
+
+    def save(self, directory: Union[str, Path]):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / 'xref_records.npy', self.records)
+        for kind in KINDS:
+            np.save(directory / f'xref_{kind}.npy', self.tables[kind])
+
+    def _chain(self, kind: str, key: str):
+        table = self.tables[kind]
+        mask = len(table) - 1
+        slot = _hash(key) & mask
+        while True:
+            i = int(table[slot])
+            if i == -1:
+                return
+            record = self.records[i]
+            if record[kind] == key:
+                break
+            slot = (slot + 1) & mask
+        next_field = f'next_{kind}'
+        while True:
+            yield record
+            i = int(record[next_field])
+            if i == -1:
+                return
+            record = self.records[i]
+
+    def lookup_all(self, kind: str, key: str, date=None) -> List[Dict[str, Any]]:
+        """Every record for `key` (valid on `date`, if given), latest first."""
+        if kind == 'cik':
+            key = _cik(key)
+        elif kind == 'ticker':
+            key = (key or '').strip().upper()
+        if not key:
+            return []
+        day = None if date is None else np.datetime64(pd.Timestamp(date).date(), 'D')
+        results = []
+        for record in self._chain(kind, key):
+            if day is None or record['valid_from'] <= day < record['valid_to']:
+                results.append({
+                    'cusip': str(record['cusip']) or None, 'cik': str(record['cik']) or None,
+                    'ticker': str(record['ticker']) or None,
+                    'valid_from': record['valid_from'], 'valid_to': record['valid_to'],
+                })
+        return results
+
+    def lookup(self, kind: str, key: str, date=None) -> Optional[Dict[str, Any]]:
+        """The record for a CUSIP, CIK or ticker valid on `date` (the latest one if no date)."""
+        results = self.lookup_all(kind, key, date)
+        return results[0] if results else None
+
+    def cusip_to_issuer(self, cusip: str, date=None) -> Optional[Dict[str, Any]]:
+        return self.lookup('cusip', cusip, date)
+
+    def ticker_to_issuer(self, ticker: str, date=None) -> Optional[Dict[str, Any]]:
+        return self.lookup('ticker', ticker, date)
+
+    def cik_to_issuer(self, cik: str, date=None) -> Optional[Dict[str, Any]]:
+        return self.lookup('cik', cik, date)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({name: self.records[name] for name in ('cusip', 'cik', 'ticker', 'valid_from', 'valid_to')})
+
+    def annotate(self, watchlist: pd.DataFrame, date=None) -> pd.DataFrame:
+        """
+        Adds issuer_cik and ticker columns to a frame with a cusip column (e.g.
+        HoldingsDiffEngine.watchlist()), ready for triggers.WatchlistIndex.
+        """
+        matches = [self.cusip_to_issuer(cusip, date) or {} for cusip in watchlist['cusip'].astype(str)]
+        return watchlist.assign(issuer_cik=[m.get('cik') for m in matches],
+                                ticker=[m.get('ticker') for m in matches])
+
+def _ticker_ranges(observations: pd.DataFrame) -> List[Tuple[str, np.datetime64, np.datetime64]]:
+    """
+    (ticker, valid_from, valid_to) ranges: each ticker lasts until the next one
+    is first seen. A single ticker-less range when there are none.
+    """
+    seen = observations[observations['ticker'] != ''].groupby('ticker')['date'].min().sort_values()
+    if seen.empty:
+        return [('', MIN_DATE, MAX_DATE)]
+    starts = seen.to_numpy('datetime64[D]')
+    ends = np.append(starts[1:], MAX_DATE)
+    starts[0] = MIN_DATE
+    return list(zip(seen.index, starts, ends))
+
+class XrefBuilder:
+    """
+    Collects identifier observations from parsed filings and links them into a
+    CrossReference:
+
+    - Form 4s tie an issuer CIK to the ticker it traded under on a date, so a
+      ticker change becomes two validity ranges;
+    - 13Fs tie a CUSIP to nameOfIssuer, which is matched exactly (after
+      issuer_key() canonicalization) against Form 4 issuer names;
+    - a CUSIP's first six characters identify the issuer, so once one CUSIP of
+      an issuer is linked, its other share classes are too;
+    - add_link() records known mappings, which take precedence.
+
+    Tickers are kept per CUSIP (share class). An issuer's Form 4 tickers only
+    go to its CUSIP when it has a single one not linked to a ticker, so the
+    classes of a multi-class issuer need add_link() to get theirs.
+
+    Observations can be saved and reopened, so the index is extended as new
+    filings are parsed rather than rebuilt from every filing;
+    `python -m sec_parser.xref DIR --store STORE [--since DATE]` does that
+    from main.py's Parquet store.
+    """
+    def __init__(self, observations: Optional[np.ndarray] = None):
+        self._frames: List[np.ndarray] = [] if observations is None else [observations]
+
+    @classmethod
+    def open(cls, directory: Union[str, Path]) -> 'XrefBuilder':
+        path = Path(directory) / 'xref_observations.npy'
+        return cls(np.load(path) if path.exists() else None)
+
+    def save(self, directory: Union[str, Path]) -> CrossReference:
+        """Saves the observations and the CrossReference built from them."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / 'xref_observations.npy', self.observations())
+        xref = self.build()
+        xref.save(directory)
+        return xref
+
+    def observations(self) -> np.ndarray:
+        if not self._frames:
+            return np.empty(0, dtype=OBSERVATION_DTYPE)
+        observations = np.unique(np.concatenate(self._frames))
+        self._frames = [observations]
+        return observations
+
+    def _add(self, source: str, n: int, **columns):
+        observations = np.zeros(n, dtype=OBSERVATION_DTYPE)
+        observations['source'] = source
+        for name, values in columns.items():
+            observations[name] = values
+        self._frames.append(observations)
+
+    def add_holdings(self, holdings: pd.DataFrame):
+        """Adds CUSIP/issuer-name pairs from normalize_13f_data() output."""
+        if holdings.empty:
+            return
+        pairs = holdings[['cusip', 'company_name', 'report_date']].dropna(subset=['cusip', 'company_name'])
+        pairs = pairs.astype({'cusip': str, 'company_name': str}).drop_duplicates()
+        dates = pd.to_datetime(pairs['report_date']).to_numpy('datetime64[D]')
+        self._add('h', len(pairs), cusip=pairs['cusip'].str.upper().to_numpy(),
+                  name=[issuer_key(name)[:64] for name in pairs['company_name']], date=dates)
+
+    def add_transactions(self, transactions: pd.DataFrame):
+        """Adds issuer CIK/ticker (and issuer name, when parsed) from normalize_form4_data() output."""
+        if transactions.empty or 'issuer_cik' not in transactions:
+            return
+        names = transactions['issuer_name'] if 'issuer_name' in transactions else pd.Series(None, index=transactions.index)
+        dates = pd.to_datetime(transactions['transaction_date']).fillna(pd.to_datetime(transactions['filing_date']))
+        pairs = pd.DataFrame({
+            'cik': [_cik(cik) for cik in transactions['issuer_cik']],
+            'ticker': transactions['issuer_ticker'].astype('string').str.strip().str.upper().fillna('').to_numpy(),
+            'name': [issuer_key(name)[:64] for name in names],
+            'date': dates.to_numpy('datetime64[D]'),
+        })
+        pairs = pairs[pairs['cik'] != ''].drop_duplicates()
+        self._add('t', len(pairs), cik=pairs['cik'].to_numpy(), ticker=pairs['ticker'].to_numpy(),
+                  name=pairs['name'].to_numpy(), date=pairs['date'].to_numpy())
+
+    def add_link(self, cusip: Optional[str] = None, cik: Optional[str] = None,
+                 ticker: Optional[str] = None, date=None):
+        """Records a known mapping (e.g. from SEC's company_tickers.json)."""
+        day = MIN_DATE if date is None else np.datetime64(pd.Timestamp(date).date(), 'D')
+        self._add('l', 1, cusip=(cusip or '').upper(), cik=_cik(cik), ticker=(ticker or '').strip().upper(), date=day)
+
+    def build(self) -> CrossReference:
+        obs = pd.DataFrame(self.observations())
+        holdings = obs[obs['source'] == 'h']
+        issuers = obs[obs['source'] != 'h']
+        links = issuers[(issuers['source'] == 'l') & (issuers['cusip'] != '') & (issuers['cik'] != '')]
+
+        # CUSIP -> CIK: explicit links, then exact issuer-name matches, then the issuer prefix.
+        cusip_cik: Dict[str, str] = {}
+        name_ciks = issuers[(issuers['name'] != '') & (issuers['cik'] != '')].groupby('name')['cik'].unique()
+        name_to_cik = {name: ciks[0] for name, ciks in name_ciks.items() if len(ciks) == 1}
+        for cusip, names in holdings.groupby('cusip')['name']:
+            name = Counter(names).most_common(1)[0][0]
+            if name in name_to_cik:
+                cusip_cik[cusip] = name_to_cik[name]
+        cusip_cik.update(zip(links['cusip'], links['cik']))
+        prefixes: Dict[str, set] = {}
+        for cusip, cik in cusip_cik.items():
+            prefixes.setdefault(cusip[:6], set()).add(cik)
+        for cusip in holdings['cusip'].unique():
+            ciks = prefixes.get(cusip[:6])
+            if cusip not in cusip_cik and ciks and len(ciks) == 1:
+                cusip_cik[cusip] = next(iter(ciks))
+
+        # A ticker belongs to one share class, i.e. one CUSIP. Links give a
+        # CUSIP's tickers directly. Form 4s only give the issuer's, so those go
+        # to a CUSIP only when it is the issuer's one CUSIP without linked
+        # tickers; other classes get no ticker rather than another class's.
+        linked_tickers = {cusip: group for cusip, group in links[links['ticker'] != ''].groupby('cusip')}
+        issuer_tickers = issuers[(issuers['cik'] != '') & ~issuers.index.isin(links.index)]
+        cik_cusips: Dict[str, List[str]] = {}
+        for cusip, cik in sorted(cusip_cik.items()):
+            cik_cusips.setdefault(cik, []).append(cusip)
+        rows = []
+        for cik in sorted(set(cik_cusips) | set(issuer_tickers['cik'])):
+            cusips = cik_cusips.get(cik, [])
+            claimed = set()
+            for cusip in cusips:
+                if cusip in linked_tickers:
+                    claimed.update(linked_tickers[cusip]['ticker'])
+                    rows.extend((cusip, cik, *r, -1, -1, -1) for r in _ticker_ranges(linked_tickers[cusip]))
+            group = issuer_tickers[issuer_tickers['cik'] == cik]
+            ranges = _ticker_ranges(group[~group['ticker'].isin(claimed)])
+            unlinked = [cusip for cusip in cusips if cusip not in linked_tickers]
+            if len(unlinked) == 1:
+                rows.extend((unlinked[0], cik, *r, -1, -1, -1) for r in ranges)
+                continue
+            rows.extend((cusip, cik, '', MIN_DATE, MAX_DATE, -1, -1, -1) for cusip in unlinked)
+            if ranges[0][0] or not cusips:
+                # The issuer's tickers still resolve to its CIK.
+                rows.extend(('', cik, *r, -1, -1, -1) for r in ranges)
+        return CrossReference.from_records(np.array(rows, dtype=RECORD_DTYPE))
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build or update the CUSIP/ticker/issuer-CIK cross-reference from parsed filings.")
+    parser.add_argument('xref', metavar='DIR', help="Cross-reference directory; observations already there are kept")
+    parser.add_argument('--store', metavar='DIR', help="Parquet store (main.py --store) to read holdings and transactions from")
+    parser.add_argument('--since', help="Only read holdings reported and transactions filed from this date on")
+    parser.add_argument('--links', metavar='CSV',
+                        help="Known mappings, with any of the columns cusip, cik, ticker and date")
+    parser.add_argument('--rebuild', action='store_true', help="Discard the saved observations first")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    builder = XrefBuilder() if args.rebuild else XrefBuilder.open(args.xref)
+    if args.store:
+        builder.add_holdings(store.read_holdings(args.store, start=args.since,
+                                                 columns=['cusip', 'company_name', 'report_date']))
+        builder.add_transactions(store.read_transactions(
+            args.store, start=args.since,
+            columns=['issuer_cik', 'issuer_ticker', 'issuer_name', 'transaction_date', 'filing_date']))
+    if args.links:
+        links = pd.read_csv(args.links, dtype=str, keep_default_na=False)
+        for link in links.to_dict('records'):
+            builder.add_link(cusip=link.get('cusip'), cik=link.get('cik'), ticker=link.get('ticker'),
+                             date=link.get('date') or None)
+    xref = builder.save(args.xref)
+    records = xref.to_frame()
+    print(f"Saved {len(records)} records to {args.xref}: {(records['cusip'] != '').sum()} with a CUSIP, "
+          f"{(records['ticker'] != '').sum()} with a ticker")
+
+if __name__ == '__main__':
+    main()
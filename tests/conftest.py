@@ -0,0 +1,88 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+
+import pytest
+
+# sec_parser has no __init__.py and uses relative imports, so it is imported
+# as a package from the repository root, as `python -m sec_parser.X` does.
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from sec_parser import edgar_standin  # noqa: E402
+
+SAMPLE_ROOT = REPO_ROOT / 'sec_parser' / 'sampled_filings'
+
+@pytest.fixture
+def sample_root(tmp_path: Path) -> Path:
+    """A small copy of sampled_filings: two Form 4s and one 13F-HR information table."""
+    root = tmp_path / 'samples'
+    picks = sorted(SAMPLE_ROOT.glob('*/4/*.xml'))[:2] + sorted(SAMPLE_ROOT.glob('*/13F-HR/*.xml'))[:1]
+    for path in picks:
+        target = root / path.relative_to(SAMPLE_ROOT)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+    return root
+
+@pytest.fixture
+def standin():
+    """
+    Starts edgar_standin servers on free ports: call it with make_server()'s
+    keyword arguments, get back (base URL, server). All are shut down after the test.
+    """
+    servers = []
+
+    def start(**kwargs):
+        server = edgar_standin.make_server(port=0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def _admin_dsn():
+    """A DSN allowed to create databases: $TEST_DATABASE_URL, else a local pgserver if installed."""
+    if os.environ.get('TEST_DATABASE_URL'):
+        return os.environ['TEST_DATABASE_URL']
+    try:
+        import pgserver
+    except ImportError:
+        return None
+    return pgserver.get_server(str(Path(tempfile.gettempdir()) / 'sec_parser_pgdata'), cleanup_mode=None).get_uri()
+
+@pytest.fixture
+def empty_database():
+    """The DSN of a new, empty PostgreSQL database, dropped after the test. Skips without PostgreSQL."""
+    psycopg2 = pytest.importorskip('psycopg2')
+    admin_dsn = _admin_dsn()
+    if admin_dsn is None:
+        pytest.skip("needs TEST_DATABASE_URL or pgserver")
+    name = f"sec_parser_test_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(admin_dsn)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f'CREATE DATABASE "{name}"')
+    try:
+        yield psycopg2.extensions.make_dsn(admin_dsn, dbname=name)
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        admin.close()
+
+@pytest.fixture
+def database(empty_database):
+    """A connection to a new database created from schema.sql."""
+    from sec_parser import loader
+    conn = loader.connect(empty_database)
+    with conn.cursor() as cursor:
+        cursor.execute((REPO_ROOT / 'schema.sql').read_text())
+    conn.commit()
+    yield conn
+    conn.close()
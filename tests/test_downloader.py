@@ -0,0 +1,112 @@
+import hashlib
+import os
+import time
+from email.utils import formatdate
+
+import requests
+
+from sec_parser import downloader, edgar_standin
+from sec_parser.manifest import DownloadManifest, DONE, FAILED
+
+def _jobs(sample_root, output_dir):
+    """run_downloads() jobs for every sample, saved under output_dir."""
+    jobs = []
+    for (cik, accession), (path, form_type) in sorted(edgar_standin.index_samples(sample_root).items()):
+        save_dir = output_dir / cik / form_type.replace('/', '_A')
+        save_dir.mkdir(parents=True, exist_ok=True)
+        jobs.append({'cik': cik, 'form_type': form_type, 'accession_number': accession,
+                     'filing_date': '2024-01-01', 'primary_document': 'primary_doc.xml',
+                     'save_path': str(save_dir / f"{accession}.xml"), 'sample': path})
+    return jobs
+
+def _response(retry_after):
+    res = requests.Response()
+    res.status_code = 429
+    if retry_after is not None:
+        res.headers['Retry-After'] = retry_after
+    return res
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    client = downloader.EdgarClient()
+    assert client._retry_after(_response('7')) == 7.0
+    assert 25 <= client._retry_after(_response(formatdate(time.time() + 30, usegmt=True))) <= 30
+    assert client._retry_after(_response(formatdate(time.time() - 30, usegmt=True))) == 0.0
+    assert client._retry_after(_response('soon')) is None
+    assert client._retry_after(_response(None)) is None
+
+def test_429_is_retried_after_retry_after(standin, sample_root, tmp_path):
+    # Every second request is answered 429 with Retry-After: 1.
+    base_url, _ = standin(sample_root=sample_root, throttle_every=2)
+    jobs = [job for job in _jobs(sample_root, tmp_path / 'out') if job['form_type'] == '4']
+    manifest = DownloadManifest(str(tmp_path / 'manifest.sqlite'))
+    client = downloader.EdgarClient(rate=1000, max_per_host=1, backoff_factor=0.01)
+
+    start = time.monotonic()
+    downloaded = downloader.run_downloads(manifest, jobs, base_url=f"{base_url}/Archives/edgar/data",
+                                          max_workers=1, client=client)
+    elapsed = time.monotonic() - start
+
+    assert downloaded == len(jobs)
+    # At least one 429 was hit, and the client waited the full second it asked for.
+    assert elapsed >= 1.0
+    for job in jobs:
+        record = manifest.get(job['accession_number'])
+        assert record['status'] == DONE
+        assert record['sha256'] == hashlib.sha256(job['sample'].read_bytes()).hexdigest()
+    manifest.close()
+
+def test_filing_still_throttled_after_retries_is_recorded_as_failed(standin, sample_root, tmp_path):
+    base_url, _ = standin(sample_root=sample_root, throttle_every=1)
+    jobs = [job for job in _jobs(sample_root, tmp_path / 'out') if job['form_type'] == '4'][:1]
+    manifest = DownloadManifest(str(tmp_path / 'manifest.sqlite'))
+    client = downloader.EdgarClient(rate=1000, retries=2, max_backoff=0.05)
+
+    assert downloader.run_downloads(manifest, jobs, base_url=f"{base_url}/Archives/edgar/data",
+                                    max_workers=1, client=client) == 0
+    record = manifest.get(jobs[0]['accession_number'])
+    assert record['status'] == FAILED
+    assert record['error'] == 'no response'
+    manifest.close()
+
+def _download(base_url, fund_data, output_dir, **kwargs):
+    downloader.download_filings(str(fund_data), str(output_dir), base_url=f"{base_url}/Archives/edgar/data",
+                                max_workers=2, rate=1000, **kwargs)
+
+def test_rerun_resumes_from_the_manifest(standin, sample_root, tmp_path, capsys):
+    base_url, _ = standin(sample_root=sample_root)
+    fund_data, output_dir = tmp_path / 'fund_data', tmp_path / 'out'
+    edgar_standin.write_fund_data(str(fund_data), sample_root)
+    samples = edgar_standin.index_samples(sample_root)
+
+    _download(base_url, fund_data, output_dir)
+    assert "Downloaded 3/3 filings" in capsys.readouterr().out
+    manifest = DownloadManifest(str(output_dir / 'manifest.sqlite'))
+    assert manifest.summary() == {DONE: 3}
+    records = {accession: manifest.get(accession) for _, accession in samples}
+    for (cik, accession), (path, _) in samples.items():
+        assert records[accession]['sha256'] == hashlib.sha256(path.read_bytes()).hexdigest()
+
+    # An interrupted download (left pending) and a deleted file are fetched again; nothing else is.
+    interrupted, deleted, untouched = sorted(records)
+    manifest.conn.execute("UPDATE downloads SET status = 'pending' WHERE accession_no = ?", (interrupted,))
+    manifest.conn.commit()
+    os.remove(records[deleted]['path'])
+    _download(base_url, fund_data, output_dir)
+    assert "Downloaded 2/2 filings" in capsys.readouterr().out
+    attempts = {accession: manifest.get(accession)['attempts'] for accession in records}
+    assert attempts == {interrupted: 2, deleted: 2, untouched: 1}
+
+    # --retry-failed only picks up failures.
+    manifest.mark_failed(untouched, 'HTTP 500')
+    _download(base_url, fund_data, output_dir, retry_failed_only=True)
+    assert "Downloaded 1/1 filings" in capsys.readouterr().out
+    assert manifest.summary() == {DONE: 3}
+
+    # Files downloaded before there was a manifest are recorded, not fetched again.
+    manifest.close()
+    for suffix in ('', '-wal', '-shm'):
+        (output_dir / f"manifest.sqlite{suffix}").unlink(missing_ok=True)
+    _download(base_url, fund_data, output_dir)
+    out = capsys.readouterr().out
+    assert "Recorded 3 previously downloaded filings" in out
+    assert "Downloading 0 filings" in out
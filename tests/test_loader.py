@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from sec_parser import loader, utils
+
+FUND = '0001067983'
+APPLE = '037833100'
+QUARTER = {'cik': FUND, 'report_date': '2024-03-31', 'filing_date': '2024-05-14'}
+
+def _line(shares, cusip=APPLE, name='APPLE INC', **extra):
+    return dict({'nameOfIssuer': name, 'cusip': cusip, 'value': str(shares * 10), 'sshPrnamt': str(shares),
+                 'sshPrnamtType': 'SH'}, **extra)
+
+def _filing(lines, accession_no, **metadata):
+    return utils.normalize_13f_data(lines, dict(QUARTER, **metadata), include_raw_json=False,
+                                    accession_no=accession_no, raw_ref=accession_no[-1] * 64)
+
+@pytest.fixture
+def conn(database):
+    with database.cursor() as cursor:
+        cursor.execute("""INSERT INTO "Funds" ("cik", "fund_name") VALUES (%s, 'Berkshire')""", (FUND,))
+    database.commit()
+    return database
+
+def _holdings(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT "cusip", "shares", "filing_date"::date::text FROM "Quarterly_Holdings" ORDER BY 1')
+        return cursor.fetchall()
+
+def _original():
+    return _filing([_line(10)], 'acc-original')
+
+def _amendment():
+    return _filing([_line(20)], 'acc-amendment', filing_date='2024-06-01')
+
+@pytest.mark.parametrize('batches', [
+    pytest.param(lambda: [_original(), _amendment()], id='original-then-amendment'),
+    pytest.param(lambda: [_amendment(), _original()], id='amendment-then-original'),
+    pytest.param(lambda: [pd.concat([_original(), _amendment()], ignore_index=True)], id='same-batch'),
+    pytest.param(lambda: [pd.concat([_amendment(), _original()], ignore_index=True)], id='same-batch-reversed'),
+])
+def test_the_latest_filing_of_a_quarter_wins_whatever_the_load_order(conn, batches):
+    for df in batches():
+        loader.load_holdings(conn, df)
+    assert _holdings(conn) == [(APPLE, 20, '2024-06-01')]
+
+def test_lines_of_one_cusip_are_summed_and_option_and_principal_lines_left_out(conn):
+    lines = [_line(10), _line(5), _line(900, putCall='Put'), _line(70000, cusip='123456789', name='BOND',
+                                                                  sshPrnamtType='PRN')]
+    stats = loader.load_holdings(conn, _filing(lines, 'acc-a'))
+    assert stats['rows_skipped'] == 2
+    assert _holdings(conn) == [(APPLE, 15, '2024-05-14')]
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT "raw_offsets" FROM "Quarterly_Holdings"')
+        assert cursor.fetchone()[0] == [0, 1]
+
+def test_rows_of_unknown_funds_are_counted_as_skipped(conn):
+    df = pd.concat([_original(), _filing([_line(10)], 'acc-other', cik='0000000009')], ignore_index=True)
+    stats = loader.load_holdings(conn, df)
+    assert (stats['rows_staged'], stats['rows_skipped'], stats['rows_merged']) == (1, 1, 1)
+    assert _holdings(conn) == [(APPLE, 10, '2024-05-14')]
+
+def _form4(shares, **metadata):
+    records = [{'issuer_cik': '111', 'reporting_owner_name': 'A', 'transaction_date': '01/02/2025',
+                'shares_transacted': str(n)} for n in shares]
+    return utils.normalize_form4_data(records, dict({'cik': '222', 'filing_date': '2025-01-03'}, **metadata),
+                                      'acc-1', include_raw_json=False, raw_ref='b' * 64)
+
+def _transactions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT "transaction_no", "shares" FROM "Insider_Transactions" ORDER BY 1')
+        return cursor.fetchall()
+
+def test_each_transaction_of_a_filing_is_a_row_and_reloads_replace_them(conn):
+    # The same filing staged twice (e.g. under the issuer's and the owner's CIK) is loaded once.
+    stats = loader.load_transactions(conn, pd.concat([_form4([10, 20, 30])] * 2, ignore_index=True))
+    assert stats['rows_merged'] == 3
+    assert _transactions(conn) == [(0, 10), (1, 20), (2, 30)]
+
+    # A re-parse with fewer transactions drops the ones past its last.
+    loader.load_transactions(conn, _form4([10, 25]))
+    assert _transactions(conn) == [(0, 10), (1, 25)]
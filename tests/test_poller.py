@@ -0,0 +1,66 @@
+import asyncio
+
+from sec_parser import poller
+from sec_parser.downloader import EdgarClient
+
+def _poller(base_url, client=None, **kwargs):
+    feed_url = (f"{base_url}/cgi-bin/browse-edgar?action=getcurrent&type=4&owner=include"
+                "&start={start}&count={count}&output=atom")
+    return poller.Form4Poller(client or EdgarClient(rate=1000), feed_url=feed_url,
+                              archives_url=f"{base_url}/Archives", interval=0, **kwargs)
+
+class FlakyClient(EdgarClient):
+    """Fails the filing fetches of the accessions in `failures`, that many times each (None: always)."""
+    def __init__(self, failures):
+        super().__init__(rate=1000)
+        self.failures = failures
+        self.filing_requests = []
+
+    def get(self, url, **kwargs):
+        if '/Archives/' in url:
+            accession_no = url.rsplit('/', 1)[1][:-len('.txt')]
+            self.filing_requests.append(accession_no)
+            remaining = self.failures.get(accession_no, 0)
+            if remaining is None or remaining > 0:
+                if remaining is not None:
+                    self.failures[accession_no] = remaining - 1
+                return None
+        return super().get(url, **kwargs)
+
+def _accessions(sample_root):
+    return sorted(path.stem for path in sample_root.glob('*/4/*.xml'))
+
+def test_each_filing_is_parsed_once_and_an_unchanged_feed_is_a_304(standin, sample_root):
+    base_url, _ = standin(sample_root=sample_root)
+    records = []
+    form4_poller = _poller(base_url, on_records=records.append)
+
+    asyncio.run(form4_poller.run(polls=2))
+    stats = form4_poller.stats()
+    # The feed lists each Form 4 twice (reporting owner and issuer); each is fetched once.
+    assert stats['filings'] == len(_accessions(sample_root)) == 2
+    assert stats['not_modified'] == 1
+    assert stats['records'] == sum(len(df) for df in records) > 0
+    assert sorted(df['accession_no'].iloc[0] for df in records) == _accessions(sample_root)
+
+    # A full (non-304) feed doesn't bring already parsed accessions back.
+    form4_poller._etag = form4_poller._last_modified = None
+    assert asyncio.run(form4_poller.poll_once()) == []
+    assert form4_poller.stats()['filings'] == 2
+
+def test_failed_filings_are_retried_then_dropped(standin, sample_root):
+    base_url, _ = standin(sample_root=sample_root)
+    flaky, broken = _accessions(sample_root)
+    client = FlakyClient({flaky: 1, broken: None})
+    form4_poller = _poller(base_url, client=client, max_attempts=3)
+
+    asyncio.run(form4_poller.run(polls=4))
+    stats = form4_poller.stats()
+    # The retries go ahead although the feed is unchanged (304) after the first poll.
+    assert stats['not_modified'] == 3
+    assert stats['filings'] == 1 and stats['errors'] == 1 + 3 and stats['dropped'] == 1
+    assert client.filing_requests.count(flaky) == 2
+    assert client.filing_requests.count(broken) == 3
+    # Both are done with: one parsed, one given up on, and neither is fetched again.
+    assert flaky in form4_poller.seen and broken in form4_poller.seen
+    assert not form4_poller._retries